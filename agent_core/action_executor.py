@@ -0,0 +1,149 @@
+# agent_core/action_executor.py
+# Runs the network actions decided for each email on a bounded worker pool,
+# so the main loop can keep classifying while earlier emails are being acted on.
+
+import contextvars
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from agent_core.ledger import FAILED, OK
+from agent_core.metrics import ACTION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# One step of a message's action chain, e.g. Action('gmail', send_email, (), {...}).
+# `api` names the concurrency limit the step is counted against. Steps with a
+# `ledger_key` are recorded in the processed-message ledger and never repeated
+# for the same message once they have succeeded.
+Action = namedtuple('Action', ['api', 'func', 'args', 'kwargs', 'ledger_key'], defaults=(None,))
+
+
+def action(api, func, *args, **kwargs):
+    """Shorthand for building an Action."""
+    return Action(api, func, args, kwargs)
+
+
+def once(ledger_key, api, func, *args, **kwargs):
+    """Builds an Action that runs at most once per message (see ProcessedLedger)."""
+    return Action(api, func, args, kwargs, ledger_key)
+
+
+class ActionExecutor:
+    """
+    Executes per-message action chains concurrently.
+
+    The actions of one message always run in order, one after another (e.g. the
+    escalation is sent before the message is marked as read). A step that raises
+    or returns a falsy result ends its message's chain. Chains of
+    different messages run in parallel on the worker pool, and no more than
+    `api_limits[api]` actions against the same API are in flight at once.
+
+    Args:
+        max_workers (int): Size of the worker pool.
+        api_limits (dict, optional): Maximum concurrent calls per API name.
+        ledger (ProcessedLedger, optional): Used to skip steps that already succeeded.
+        pool (ThreadPoolExecutor, optional): A worker pool shared with other executors
+            (e.g. of other mailboxes); max_workers is then ignored.
+        max_pending (int, optional): Chains that may be submitted but not yet finished;
+            submit() blocks beyond that, so a fast producer cannot run far ahead
+            of the actions. None for no limit.
+    """
+
+    def __init__(self, max_workers=8, api_limits=None, ledger=None, pool=None, max_pending=None):
+        self.ledger = ledger
+        self._owns_pool = pool is None
+        self._pool = pool or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='agent-action')
+        self._limits = {api: threading.BoundedSemaphore(limit)
+                        for api, limit in (api_limits or {}).items()}
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+        self._pending = []
+
+    def _run_chain(self, message_id, actions):
+        results = []
+        for step in actions:
+            guarded = self.ledger is not None and step.ledger_key is not None
+            if guarded and self.ledger.has(message_id, step.ledger_key):
+                logger.info("Skipping %s for message %s: already done.", step.ledger_key, message_id)
+                results.append(None)
+                continue
+
+            limit = self._limits.get(step.api)
+            started = time.perf_counter()
+            try:
+                if limit is None:
+                    result = step.func(*step.args, **step.kwargs)
+                else:
+                    with limit:
+                        result = step.func(*step.args, **step.kwargs)
+            except Exception as e:
+                # Later steps depend on earlier ones, so stop this message's chain.
+                ACTION_SECONDS.observe(time.perf_counter() - started, action=step.func.__name__,
+                                       outcome='error')
+                logger.error("Action %s failed for message %s: %s", step.func.__name__, message_id, e)
+                if guarded:
+                    self.ledger.record(message_id, step.ledger_key, FAILED)
+                results.append(e)
+                break
+
+            ACTION_SECONDS.observe(time.perf_counter() - started, action=step.func.__name__,
+                                   outcome='ok' if result else 'failed')
+            if guarded:
+                self.ledger.record(message_id, step.ledger_key, OK if result else FAILED)
+            results.append(result)
+            if not result:
+                # A step that reports failure (e.g. send_email returning None) stops the
+                # chain like an exception, so the message is not marked read after it.
+                logger.error("Action %s failed for message %s.", step.func.__name__, message_id)
+                break
+        return results
+
+    def submit(self, message_id, actions):
+        """
+        Schedules a message's actions to run in order on the worker pool.
+        Blocks while `max_pending` chains are still unfinished.
+
+        Args:
+            message_id (str): The message the actions belong to (used in error reports).
+            actions (list): Action tuples, run first to last.
+
+        Returns:
+            Future: Resolves to the list of step results.
+        """
+        # Run in the caller's context, so the steps act on the caller's mailbox.
+        context = contextvars.copy_context()
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            future = self._pool.submit(context.run, self._run_chain, message_id, list(actions))
+        except BaseException:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        if self._slots is not None:
+            future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append((message_id, future))
+        return future
+
+    @property
+    def pending(self):
+        """The number of submitted chains not yet collected by wait()."""
+        return len(self._pending)
+
+    def wait(self):
+        """
+        Blocks until every submitted chain has finished.
+
+        Returns:
+            dict: message_id -> list of step results.
+        """
+        pending, self._pending = self._pending, []
+        wait([future for _, future in pending])
+        return {message_id: future.result() for message_id, future in pending}
+
+    def shutdown(self):
+        if self._owns_pool:
+            self._pool.shutdown(wait=True)
+        else:
+            self.wait()
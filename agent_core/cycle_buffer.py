@@ -0,0 +1,87 @@
+# agent_core/cycle_buffer.py
+# Columnar storage for a large set of emails held at once.
+# The agent's cycle streams its emails batch by batch, but a batch job over a
+# whole mailbox (e.g. re-classifying or re-indexing a full resync) holds tens of
+# thousands of messages, and as separate record objects every one of them stays
+# alive, and is tracked by the garbage collector, until the job ends. A
+# CycleBuffer keeps their text fields in one UTF-8 arena instead, with an array
+# of offsets into it: a handful of objects however many emails it holds. Batch
+# stages read the emails back one record at a time.
+
+from array import array
+from collections.abc import Sequence
+from integrations.email_message import EmailRecord, intern_labels
+
+
+class CycleBuffer(Sequence):
+    """
+    A read-only sequence of emails stored column-wise in a single bytes arena.
+
+    Indexing or iterating returns an EmailRecord decoded from the arena, which
+    can be dropped as soon as the caller is done with it. Bodies are decoded
+    when the buffer is filled, so it never holds on to raw Gmail payloads.
+
+    Args:
+        emails (iterable, optional): EmailRecords or email dictionaries to store.
+    """
+
+    # The text fields kept in the arena, in the order they are stored per email.
+    FIELDS = ('id', 'threadId', 'snippet', 'sender', 'recipient', 'subject', 'body')
+
+    def __init__(self, emails=()):
+        self._arena = bytearray()
+        # Where each field of each email ends; field k of email i spans
+        # offsets[i * len(FIELDS) + k] to offsets[i * len(FIELDS) + k + 1].
+        self._offsets = array('Q', [0])
+        # The interned label tuples, shared between emails with the same labels.
+        self._labels = []
+        for email in emails:
+            self.append(email)
+
+    def append(self, email):
+        """Adds an email (an EmailRecord or an email dictionary) to the end of the buffer."""
+        arena, offsets = self._arena, self._offsets
+        for field in self.FIELDS:
+            # 'surrogatepass' lets any Python string through and back unchanged.
+            arena += (email.get(field) or '').encode('utf-8', 'surrogatepass')
+            offsets.append(len(arena))
+        self._labels.append(intern_labels(email.get('labelIds')))
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _fields(self, index):
+        arena, offsets = self._arena, self._offsets
+        start = index * len(self.FIELDS)
+        return [arena[offsets[k]:offsets[k + 1]].decode('utf-8', 'surrogatepass')
+                for k in range(start, start + len(self.FIELDS))]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('CycleBuffer index out of range')
+        message_id, thread_id, snippet, sender, recipient, subject, body = self._fields(index)
+        return EmailRecord.from_fields(message_id, thread_id or None, snippet or None, sender, recipient,
+                                       subject, body, self._labels[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def column(self, name):
+        """
+        Iterates over one field of every email, e.g. column('id'), without building records.
+
+        Returns:
+            iterator: The field's values (strings), in order.
+        """
+        field = self.FIELDS.index(name)
+        arena, offsets = self._arena, self._offsets
+        for start in range(field, len(offsets) - 1, len(self.FIELDS)):
+            yield arena[offsets[start]:offsets[start + 1]].decode('utf-8', 'surrogatepass')
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the buffer, in bytes (the label tuples are shared and not counted)."""
+        return len(self._arena) + self._offsets.itemsize * len(self._offsets) + 8 * len(self._labels)
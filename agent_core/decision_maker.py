@@ -1,10 +1,19 @@
 # agent_core/decision_maker.py
 # This module contains the core logic for classifying emails and deciding on actions.
 
-import re
-
-# --- Configuration for Classification Rules ---
-# These lists can be expanded or moved to a config file later.
+import logging
+import os
+import threading
+from collections.abc import Sequence
+from config import CLASSIFIER_MIN_CONFIDENCE, CLASSIFIER_MODEL_FILE, RULES_FILE, RULES_RELOAD_SECONDS
+from agent_core.rule_engine import DEFAULT_CLASSIFICATION, Classification
+from agent_core.rule_store import RuleStore
+
+logger = logging.getLogger(__name__)
+
+# --- Default Classification Rules ---
+# These lists are used unless the rules file (RULES_FILE in config.py) overrides them.
+# Sender entries are exact addresses or whole domains (e.g. "example.com").
 IMPORTANT_SENDERS = [
     "k.g.binath@gmail.com",
     "uniginura@gmail.com"
@@ -20,6 +29,92 @@ SPAM_KEYWORDS = [
 
 MEETING_KEYWORDS = ["meeting", "schedule", "calendar invite", "zoom link"]
 
+BLOCKED_SENDERS = []
+
+
+# The rule lists used for any list a rules file does not define.
+DEFAULT_RULES = {
+    'important_senders': IMPORTANT_SENDERS,
+    'blocked_senders': BLOCKED_SENDERS,
+    'important_keywords': IMPORTANT_KEYWORDS,
+    'meeting_keywords': MEETING_KEYWORDS,
+    'spam_keywords': SPAM_KEYWORDS,
+}
+
+# The active rules, compiled once and swapped atomically when the rules file changes.
+rule_store = RuleStore(RULES_FILE, defaults=DEFAULT_RULES, check_interval=RULES_RELOAD_SECONDS)
+
+
+# The trained fallback classifier (nlp_utils.classifier), loaded on first use.
+_model = None
+_model_checked = False
+_model_lock = threading.Lock()
+
+
+def load_model(path=CLASSIFIER_MODEL_FILE):
+    """
+    Loads the fallback classifier model, replacing the current one.
+
+    Args:
+        path (str): The model file; if it does not exist, no model is used.
+
+    Returns:
+        HashedNaiveBayes: The loaded model, or None.
+    """
+    global _model, _model_checked
+    model = None
+    if path and os.path.exists(path):
+        try:
+            from nlp_utils.classifier import HashedNaiveBayes
+            model = HashedNaiveBayes.load(path)
+            logger.info("Loaded classifier model %s (%s).", path, ', '.join(model.classes))
+        except ImportError as e:
+            logger.warning("The classifier model needs NumPy (%s); using the rules only.", e)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load classifier model %s: %s", path, e)
+    with _model_lock:
+        _model, _model_checked = model, True
+    return model
+
+
+def _get_model():
+    if not _model_checked:
+        return load_model()
+    return _model
+
+
+def _apply_model(emails, classifications):
+    """
+    Gives the emails that no rule matched to the trained model, in one batch.
+    A model prediction is only used when it is confident and not NORMAL.
+    """
+    model = _get_model()
+    if model is None:
+        return classifications
+    undecided = [i for i, c in enumerate(classifications) if c is DEFAULT_CLASSIFICATION]
+    if not undecided:
+        return classifications
+    predictions = model.predict_many([emails[i] for i in undecided])
+    for i, prediction in zip(undecided, predictions):
+        if prediction.category != "NORMAL" and prediction.confidence >= CLASSIFIER_MIN_CONFIDENCE:
+            classifications[i] = Classification(prediction.category, f"model:{prediction.confidence:.2f}")
+    return classifications
+
+
+def classify_email_with_rule(email_data):
+    """
+    Classifies an email and reports which rule decided the category.
+
+    Args:
+        email_data (dict): An EmailRecord, or a dictionary containing parsed email
+                           details (sender, subject, body, etc.).
+
+    Returns:
+        Classification: A (category, rule) named tuple, e.g. ("SPAM", "spam:winner").
+            Emails no rule matched may be classified by the trained model ("model:0.97").
+    """
+    return _apply_model([email_data], [rule_store.engine.classify(email_data)])[0]
+
 
 def classify_email(email_data):
     """
@@ -32,37 +127,24 @@ def classify_email(email_data):
     Returns:
         str: The classification category (e.g., "IMPORTANT", "SPAM", "MEETING_REQUEST", "NORMAL").
     """
-    sender = email_data.get('sender', '').lower()
-    subject = email_data.get('subject', '').lower()
-    body = email_data.get('body', '').lower()
-
-    # Rule 1: Check for important senders (Highest Priority)
-    for important_sender in IMPORTANT_SENDERS:
-        if important_sender in sender:
-            print(f"Classification: IMPORTANT (sender is {important_sender})")
-            return "IMPORTANT"
-
-    # Rule 2: Check for important keywords in the subject
-    for keyword in IMPORTANT_KEYWORDS:
-        if keyword in subject:
-            print(f"Classification: IMPORTANT (found keyword: '{keyword}')")
-            return "IMPORTANT"
-
-    # Rule 3: Check for meeting-related keywords
-    for keyword in MEETING_KEYWORDS:
-        if keyword in subject or keyword in body:
-            print(f"Classification: MEETING_REQUEST (found keyword: '{keyword}')")
-            return "MEETING_REQUEST"
-
-    # Rule 4: Check for spam keywords
-    for keyword in SPAM_KEYWORDS:
-        if keyword in subject or keyword in body:
-            print(f"Classification: SPAM (found keyword: '{keyword}')")
-            return "SPAM"
-
-    # If no specific rules match, classify as NORMAL
-    print("Classification: NORMAL (no specific rules matched)")
-    return "NORMAL"
+    return classify_email_with_rule(email_data).category
+
+
+def classify_many(emails, rules=None):
+    """
+    Classifies a batch of emails, e.g. during a mailbox backfill.
+
+    Args:
+        emails (iterable): EmailRecords or email dictionaries, or a CycleBuffer.
+        rules (RuleStore, optional): The rule set to apply; defaults to the shared rule_store.
+
+    Returns:
+        list: One Classification (category, rule) per email, in the same order.
+    """
+    # A sequence such as a CycleBuffer is read one email at a time rather than copied.
+    if not isinstance(emails, Sequence):
+        emails = list(emails)
+    return _apply_model(emails, (rules or rule_store).engine.classify_many(emails))
 
 # This block allows for direct testing of the classification logic.
 if __name__ == '__main__':
@@ -101,6 +183,6 @@ if __name__ == '__main__':
     for i, email in enumerate(test_emails):
         print(f"\n--- Testing Email {i+1} ---")
         print(f"From: {email['sender']}\nSubject: {email['subject']}")
-        classification = classify_email(email)
-        print(f"Final Classification Result: {classification}")
+        classification = classify_email_with_rule(email)
+        print(f"Final Classification Result: {classification.category} ({classification.rule})")
         print("-" * 20)
@@ -0,0 +1,340 @@
+# agent_core/escalation.py
+# Escalation of important emails to the supervisor, with duplicate suppression.
+# Ten replies in one thread, or the same urgent blast from many senders, become
+# one digest email instead of ten escalations. After a digest has gone out,
+# further emails of the same thread or cluster are held and sent together once
+# the digest window has passed, so a busy thread costs at most one send per window.
+
+import logging
+import threading
+import time
+from config import ESCALATION_DIGEST_WINDOW_SECONDS, ESCALATION_NEAR_DUPLICATE_BITS, SUPERVISOR_EMAIL
+from agent_core.metrics import registry
+from integrations.email_service import send_email
+from nlp_utils.simhash import SimHashIndex, simhash
+
+logger = logging.getLogger(__name__)
+
+ESCALATED_EMAILS = registry.counter(
+    'agent_escalated_emails_total', 'Important emails escalated, by how: alone, in a digest, or held.')
+ESCALATIONS_SENT = registry.counter('agent_escalations_sent_total', 'Escalation emails sent to the supervisor.')
+
+# State store key of the open digest windows.
+STATE_KEY = 'escalation_windows'
+
+# Bodies with fewer shingles than this only count as duplicates when identical;
+# SimHash fingerprints of very short texts are too noisy to compare by distance.
+MIN_NEAR_DUPLICATE_SHINGLES = 8
+
+# Bodies in digests (and in held emails kept in the state file) are cut to this length.
+DIGEST_BODY_CHARS = 2000
+
+# Similar earlier emails (from the knowledge index) listed with each escalated email.
+SIMILAR_EMAILS = 3
+
+
+def _precedent_text(email):
+    """The similar earlier emails and prior reply found for an escalated email, as text ('' if none)."""
+    lines = []
+    if email.get('similar'):
+        lines.append("\n--- Similar earlier emails ---")
+        lines.extend(f"- {item}" for item in email['similar'])
+    if email.get('reply'):
+        lines.append("\n--- Reply given to a similar earlier email ---")
+        lines.append(email['reply'])
+    return '\n'.join(lines)
+
+
+def escalation_message(email):
+    """Returns the (subject, body) of the escalation of a single email."""
+    subject = f"URGENT: Agent Escalation - {email.get('subject')}"
+    body = (
+        "This email was flagged as important by the Intelligent Agent.\n\n"
+        f"Original Sender: {email.get('sender')}\n"
+        f"Original Subject: {email.get('subject')}\n\n"
+        "--- Original Email Body ---\n"
+        f"{email.get('body')}"
+    )
+    precedents = _precedent_text(email)
+    if precedents:
+        body += f"\n{precedents}"
+    return subject, body
+
+
+def digest_message(emails, follow_up=False):
+    """Returns the (subject, body) of one escalation covering several related emails."""
+    if len(emails) == 1 and not follow_up:
+        return escalation_message(emails[0])
+    count = f"{len(emails)} {'more ' if follow_up else ''}related email{'s' if len(emails) != 1 else ''}"
+    subject = f"URGENT: Agent Escalation - {count}: {emails[0].get('subject')}"
+    if follow_up:
+        intro = (f"The Intelligent Agent flagged {count} as important since its last escalation "
+                 "of this thread or of emails with near-identical content.")
+    else:
+        intro = (f"The Intelligent Agent flagged {count} as important. They belong to the same "
+                 "thread or have near-identical content.")
+    lines = [intro]
+    for i, email in enumerate(emails, 1):
+        body = email.get('body') or ''
+        if len(body) > DIGEST_BODY_CHARS:
+            body = body[:DIGEST_BODY_CHARS] + "\n[...]"
+        lines.append(
+            f"\n--- Email {i} of {len(emails)} ---\n"
+            f"Original Sender: {email.get('sender')}\n"
+            f"Original Subject: {email.get('subject')}\n\n"
+            f"{body}"
+        )
+        precedents = _precedent_text(email)
+        if precedents:
+            lines.append(precedents)
+    return subject, '\n'.join(lines)
+
+
+def _summary(email):
+    return {'id': email['id'], 'threadId': email.get('threadId'), 'sender': email.get('sender'),
+            'subject': email.get('subject'), 'body': email.get('body') or ''}
+
+
+def _precedents(knowledge, email):
+    """Looks up similar earlier emails, and the reply given to the closest one, in the knowledge index."""
+    matches = knowledge.similar(email, limit=SIMILAR_EMAILS * 2)
+    similar = [f"{m.subject} (from {m.sender}, {m.category or 'unclassified'})"
+               for m in matches if m.thread_id != email.get('threadId')][:SIMILAR_EMAILS]
+    reply = knowledge.find_reply(email)
+    return {'similar': similar, 'reply': reply.snippet if reply else None}
+
+
+def _fingerprint(email):
+    """
+    Returns the body's SimHash (None for an empty body), and whether the body is
+    long enough for near-duplicates to be found by distance.
+    """
+    fingerprint, shingles = simhash(email['body'])
+    if not shingles:
+        return None, False
+    return fingerprint, shingles >= MIN_NEAR_DUPLICATE_SHINGLES
+
+
+class _Clusters:
+    """
+    Union-find over groups of emails that share a thread or a body fingerprint.
+    A group can carry a tag (the open window it belongs to), which survives merges.
+    """
+
+    def __init__(self, max_distance):
+        self._parent = []
+        self._tags = {}
+        self._threads = {}
+        self._exact = {}
+        self._near = SimHashIndex(max_distance)
+
+    def new(self, tag=None):
+        group = len(self._parent)
+        self._parent.append(group)
+        if tag is not None:
+            self._tags[group] = tag
+        return group
+
+    def find(self, group):
+        parent = self._parent
+        while parent[group] != group:
+            parent[group] = parent[parent[group]]
+            group = parent[group]
+        return group
+
+    def tag(self, group):
+        return self._tags.get(self.find(group))
+
+    def _union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        # The older group survives, so digests keep their first email first, and an
+        # open window keeps the emails that join it.
+        keep, drop = min(a, b), max(a, b)
+        self._parent[drop] = keep
+        if keep not in self._tags and drop in self._tags:
+            self._tags[keep] = self._tags[drop]
+
+    def link(self, group, thread_id=None, fingerprint=None, comparable=False):
+        """Merges the group with every group sharing the thread or a (near-)identical fingerprint."""
+        if thread_id:
+            if thread_id in self._threads:
+                self._union(group, self._threads[thread_id])
+            else:
+                self._threads[thread_id] = group
+        if fingerprint is None:
+            return
+        if fingerprint in self._exact:
+            self._union(group, self._exact[fingerprint])
+        else:
+            self._exact[fingerprint] = group
+        if comparable:
+            for other in self._near.near(fingerprint):
+                self._union(group, other)
+            self._near.add(fingerprint, group)
+
+
+class EscalationQueue:
+    """
+    Collects the escalations decided during a cycle and sends them as digests.
+
+    On flush, emails of the same thread or with near-duplicate bodies (by SimHash)
+    are merged into one escalation. An email matching a digest sent within the
+    last `window_seconds` is held instead, and all the held emails of that thread
+    or cluster go out together once the window has passed. Open windows and held
+    emails are kept in the state store, so a restart neither loses nor repeats them.
+
+    Args:
+        supervisor (str): Where escalations are sent.
+        state_store (StateStore, optional): Persists the open digest windows.
+        window_seconds (float): Minimum time between two digests of one thread or cluster.
+        max_distance (int): Fingerprints differing in at most this many bits are near-duplicates.
+        ledger (ProcessedLedger, optional): Emails already escalated (the 'escalation'
+            step) are not queued again.
+        knowledge (KnowledgeIndex, optional): If given, each escalated email is sent
+            with the similar emails seen before and the reply given to the closest one.
+    """
+
+    def __init__(self, supervisor=SUPERVISOR_EMAIL, state_store=None,
+                 window_seconds=ESCALATION_DIGEST_WINDOW_SECONDS,
+                 max_distance=ESCALATION_NEAR_DUPLICATE_BITS, ledger=None, knowledge=None):
+        self.supervisor = supervisor
+        self.state_store = state_store
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self.ledger = ledger
+        self.knowledge = knowledge
+        self._lock = threading.Lock()
+        self._queued = []
+        # Each window: {'sent_at', 'threads', 'fingerprints': [[fingerprint, comparable]], 'held'}
+        self._windows = list(state_store.get(STATE_KEY, [])) if state_store is not None else []
+
+    def __len__(self):
+        with self._lock:
+            return len(self._queued)
+
+    @property
+    def held(self):
+        """The number of emails waiting for their digest window to pass."""
+        return sum(len(window['held']) for window in self._windows)
+
+    def queue(self, key, email):
+        """
+        Queues an email for escalation at the next flush.
+
+        Args:
+            key (str): Identifies the email in the flush results (its message ID).
+            email (dict): The email to escalate.
+
+        Returns:
+            bool: Always True; the outcome is reported by flush().
+        """
+        if self.ledger is not None and self.ledger.has(key, 'escalation'):
+            logger.info("Message %s was already escalated; not escalating it again.", key)
+            return True
+        summary = _summary(email)
+        if self.knowledge is not None:
+            summary.update(_precedents(self.knowledge, email))
+        with self._lock:
+            self._queued.append((key, summary))
+        return True
+
+    def flush(self, now=None):
+        """
+        Sends the digests that are due: one per new thread or cluster, plus
+        follow-ups of held emails whose window has passed.
+
+        Args:
+            now (float, optional): The current time.time(), for tests and replays.
+
+        Returns:
+            dict: key -> bool, whether the email was escalated or held for a later digest.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            queued, self._queued = self._queued, []
+
+        # Windows that have passed with nothing held are closed.
+        windows = [w for w in self._windows if w['held'] or now - w['sent_at'] < self.window_seconds]
+        changed = len(windows) != len(self._windows)
+
+        # Open windows come first in the clusters, so a new email joins an open window when it can.
+        clusters = _Clusters(self.max_distance)
+        for index, window in enumerate(windows):
+            group = clusters.new(tag=index)
+            for thread_id in window['threads']:
+                clusters.link(group, thread_id=thread_id)
+            for fingerprint, comparable in window['fingerprints']:
+                clusters.link(group, fingerprint=fingerprint, comparable=comparable)
+
+        members = []
+        for key, email in queued:
+            fingerprint, comparable = _fingerprint(email)
+            group = clusters.new()
+            clusters.link(group, email['threadId'], fingerprint, comparable)
+            members.append((group, key, email, fingerprint, comparable))
+
+        results = {}
+        fresh = {}
+        for group, key, email, fingerprint, comparable in members:
+            index = clusters.tag(group)
+            if index is not None:
+                window = windows[index]
+                window['held'].append(_trimmed(email))
+                _remember(window, email, fingerprint, comparable)
+                results[key] = True
+                changed = True
+                ESCALATED_EMAILS.inc(how='held')
+            else:
+                fresh.setdefault(clusters.find(group), []).append((key, email, fingerprint, comparable))
+
+        # Follow-up digests of the windows that have passed.
+        for window in windows:
+            if window['held'] and now - window['sent_at'] >= self.window_seconds:
+                if self._send(window['held'], follow_up=True):
+                    window['held'] = []
+                    window['sent_at'] = now
+                    changed = True
+
+        # One escalation per new thread or cluster.
+        for group in fresh.values():
+            ok = self._send([email for _, email, _, _ in group])
+            for key, *_ in group:
+                results[key] = ok
+            if ok:
+                ESCALATED_EMAILS.inc(len(group), how='alone' if len(group) == 1 else 'digest')
+                window = {'sent_at': now, 'threads': [], 'fingerprints': [], 'held': []}
+                for _, email, fingerprint, comparable in group:
+                    _remember(window, email, fingerprint, comparable)
+                windows.append(window)
+                changed = True
+
+        self._windows = windows
+        if changed and self.state_store is not None:
+            self.state_store.set(STATE_KEY, windows)
+        return results
+
+    def _send(self, emails, follow_up=False):
+        subject, body = digest_message(emails, follow_up)
+        if send_email(to=self.supervisor, subject=subject, body_text=body) is None:
+            logger.error("Failed to escalate %d email(s): %s",
+                         len(emails), ', '.join(e['id'] for e in emails))
+            return False
+        ESCALATIONS_SENT.inc()
+        if len(emails) > 1:
+            logger.info("Escalated %d related emails in one digest.", len(emails))
+        return True
+
+
+def _trimmed(email):
+    if len(email['body']) <= DIGEST_BODY_CHARS:
+        return email
+    return dict(email, body=email['body'][:DIGEST_BODY_CHARS] + "\n[...]")
+
+
+def _remember(window, email, fingerprint, comparable):
+    if email['threadId'] and email['threadId'] not in window['threads']:
+        window['threads'].append(email['threadId'])
+    if fingerprint is not None and [fingerprint, comparable] not in window['fingerprints']:
+        window['fingerprints'].append([fingerprint, comparable])
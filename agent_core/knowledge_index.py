@@ -0,0 +1,344 @@
+# agent_core/knowledge_index.py
+# A local full-text index of the mail the agent has processed, so it can look up
+# similar past threads, and the reply given to them, without asking Gmail again.
+# It is a SQLite FTS5 table ranked with BM25, filled incrementally each cycle.
+#
+# Search from the command line with:
+#     python -m agent_core.knowledge_index "text to look for" [index.sqlite3]
+
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from config import KNOWLEDGE_INDEX_FILE, KNOWLEDGE_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+MESSAGE = 'message'
+REPLY = 'reply'
+
+# Only the start of a body is indexed; it is where the question usually is, and
+# it keeps the index small.
+MAX_BODY_CHARS = 4000
+
+# A lookup searches for the email's rarest words, weighed by how often the email
+# uses them: at most QUERY_TERMS of them, and only as many as occur in
+# MAX_QUERY_POSTINGS documents together (but always at least one). The cost of
+# a full-text query grows with the number of documents its words occur in, so
+# this keeps lookups at a few milliseconds however large the index grows; and
+# rare words are what make two emails similar anyway.
+QUERY_TERMS = 16
+MAX_QUERY_POSTINGS = 800
+
+# Message IDs looked up per statement when checking which emails are already indexed.
+LOOKUP_CHUNK = 500
+
+# Words too common to say anything about what an email is about.
+STOPWORDS = frozenset("""
+    a about after all also am an and any are as at be been but by can could do does for from had has
+    have he her hi hello his how i if in into is it its just me my no not of on or our please re fwd
+    she so than thanks thank that the their them then there these they this to too up us was we were
+    what when where which who will with would you your
+""".split())
+
+# Splits text into words the way the index's unicode61 tokenizer does (letters and digits).
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+# One search result. `score` is the BM25 rank: lower (more negative) is more relevant.
+Match = namedtuple('Match', ['message_id', 'thread_id', 'sender', 'subject', 'category', 'kind',
+                             'snippet', 'score'])
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " id INTEGER PRIMARY KEY,"
+    " message_id TEXT NOT NULL UNIQUE,"
+    " thread_id TEXT,"
+    " sender TEXT,"
+    " category TEXT,"
+    " kind TEXT NOT NULL,"
+    " indexed_at REAL NOT NULL,"
+    " subject TEXT,"
+    " body TEXT"
+    ")",
+    "CREATE INDEX IF NOT EXISTS documents_thread ON documents (thread_id, kind)",
+    "CREATE INDEX IF NOT EXISTS documents_indexed_at ON documents (indexed_at)",
+    # In how many documents each word occurs, to pick the rarest words of a query.
+    "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, documents INTEGER NOT NULL) WITHOUT ROWID",
+    # The full-text index reads its text from the documents table (external content),
+    # so nothing is stored twice. Triggers keep it in step with the table.
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+    " subject, body, content='documents', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 0')",
+    "CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN"
+    " INSERT INTO documents_fts (rowid, subject, body) VALUES (new.id, new.subject, new.body);"
+    " END",
+    "CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN"
+    " INSERT INTO documents_fts (documents_fts, rowid, subject, body)"
+    " VALUES ('delete', old.id, old.subject, old.body);"
+    " END",
+)
+
+# BM25 rank, with subject matches weighing twice as much as body matches.
+_RANK = "bm25(documents_fts, 2.0, 1.0)"
+
+
+def _body_text(body):
+    """The indexed part of a body: quoted lines of earlier messages are left out."""
+    lines = [line for line in (body or '')[:MAX_BODY_CHARS].splitlines() if not line.startswith('>')]
+    return '\n'.join(lines)
+
+
+def _terms(subject, body):
+    """The distinct words of a document, as counted in the terms table."""
+    return set(_WORD_RE.findall(f"{subject}\n{body}".lower()))
+
+
+def query_words(email_data):
+    """
+    The words of an email worth searching for, with their weight: how often they
+    occur, subject words counting twice.
+    """
+    weights = {}
+    for text, weight in ((email_data.get('subject') or '', 2), (_body_text(email_data.get('body')), 1)):
+        for word in _WORD_RE.findall(text.lower()):
+            if len(word) > 1 and word not in STOPWORDS and not word.isdigit():
+                weights[word] = weights.get(word, 0) + weight
+    return weights
+
+
+class KnowledgeIndex:
+    """
+    A SQLite FTS5 index of processed emails and of the replies they received.
+
+    Emails are added in one transaction per cycle with `add_many()`. `similar()`
+    finds the past emails closest to a new one, and `find_reply()` the reply that
+    was given in the most similar past thread. If the SQLite library lacks FTS5,
+    the index disables itself and lookups return nothing.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        retention_days (float): How long documents are kept before compaction drops them.
+    """
+
+    def __init__(self, path=KNOWLEDGE_INDEX_FILE, retention_days=KNOWLEDGE_RETENTION_DAYS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.retention_seconds = retention_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._count = 0
+        try:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            self.enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning("Knowledge index disabled; this SQLite build has no FTS5 support: %s", e)
+            self.enabled = False
+            return
+        self._count = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    def add_many(self, emails, categories=None, kind=MESSAGE, decode=False):
+        """
+        Indexes emails in one transaction. Emails already in the index are skipped.
+
+        Args:
+            emails (list): Email dictionaries ('id', 'threadId', 'sender', 'subject', 'body').
+            categories (list, optional): The classification of each email.
+            kind (str): MESSAGE for received mail, REPLY for answers.
+            decode (bool): Whether to decode bodies of lazily decoded emails (EmailRecord)
+                that nothing has read yet. By default only their subject is indexed, so
+                indexing never costs a decode the agent did not need anyway.
+
+        Returns:
+            int: The number of emails added.
+        """
+        if not self.enabled or not emails:
+            return 0
+        categories = categories or [None] * len(emails)
+        now = time.time()
+        with self._lock:
+            message_ids = [email['id'] for email in emails]
+            known = set()
+            # In chunks, as SQLite limits the number of parameters of a statement.
+            for start in range(0, len(message_ids), LOOKUP_CHUNK):
+                chunk = message_ids[start:start + LOOKUP_CHUNK]
+                known.update(row[0] for row in self._conn.execute(
+                    f"SELECT message_id FROM documents WHERE message_id IN ({','.join('?' * len(chunk))})", chunk))
+            rows = []
+            term_counts = {}
+            for email, category in zip(emails, categories):
+                if email['id'] in known:
+                    continue
+                known.add(email['id'])
+                body = email.get('body') if decode or getattr(email, 'body_loaded', True) else ''
+                subject, body = email.get('subject') or '', _body_text(body)
+                rows.append((email['id'], email.get('threadId'), email.get('sender'), category, kind, now,
+                             subject, body))
+                for term in _terms(subject, body):
+                    term_counts[term] = term_counts.get(term, 0) + 1
+            if not rows:
+                return 0
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO documents"
+                    " (message_id, thread_id, sender, category, kind, indexed_at, subject, body)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.executemany(
+                    "INSERT INTO terms (term, documents) VALUES (?, ?)"
+                    " ON CONFLICT (term) DO UPDATE SET documents = documents + excluded.documents",
+                    term_counts.items())
+            self._count += len(rows)
+        return len(rows)
+
+    def add_reply(self, reply_id, thread_id, body, subject=None, sender=None):
+        """Indexes a reply given in a thread, so find_reply() can offer it for similar emails."""
+        return self.add_many([{'id': reply_id, 'threadId': thread_id, 'sender': sender,
+                               'subject': subject, 'body': body}], kind=REPLY)
+
+    def _query(self, email_data):
+        """
+        Builds the full-text query of an email from its rarest indexed words.
+        Must be called with the lock held. Returns '' if none of its words is indexed.
+        """
+        weights = query_words(email_data)
+        if not weights:
+            return ''
+        words = list(weights)
+        placeholders = ','.join('?' * len(words))
+        counts = self._conn.execute(
+            f"SELECT term, documents FROM terms WHERE term IN ({placeholders})", words).fetchall()
+        # Rare words first; a word the email repeats, or has in its subject, counts as rarer.
+        terms = []
+        postings = 0
+        for _, documents, term in sorted((documents / weights[term], documents, term) for term, documents in counts):
+            if len(terms) == QUERY_TERMS or (terms and postings + documents > MAX_QUERY_POSTINGS):
+                break
+            terms.append(term)
+            postings += documents
+        # Quoted, so words like NOT or NEAR are not read as query syntax.
+        return ' OR '.join(f'"{term}"' for term in terms)
+
+    def similar(self, email_data, limit=5, kind=MESSAGE):
+        """
+        Finds the indexed documents most similar to an email (never the email itself).
+
+        Args:
+            email_data (dict): The email to match.
+            limit (int): Maximum number of matches.
+            kind (str, optional): Only return documents of this kind; None for all.
+
+        Returns:
+            list: Match tuples, most relevant first.
+        """
+        if not self.enabled:
+            return []
+        with self._lock:
+            query = self._query(email_data)
+            if not query:
+                return []
+            # The ranked search only looks at the full-text table; the few best
+            # documents are then joined and filtered.
+            rows = self._conn.execute(
+                "SELECT d.message_id, d.thread_id, d.sender, d.subject, d.category, d.kind,"
+                " substr(d.body, 1, 200), f.score"
+                f" FROM (SELECT rowid, {_RANK} AS score FROM documents_fts WHERE documents_fts MATCH ?"
+                "       ORDER BY score LIMIT ?) f"
+                " JOIN documents d ON d.id = f.rowid"
+                " WHERE d.message_id != ? AND (? IS NULL OR d.kind = ?)"
+                " ORDER BY f.score LIMIT ?",
+                (query, limit * 4 + 1, email_data.get('id') or '', kind, kind, limit)).fetchall()
+        return [Match(*row) for row in rows]
+
+    def find_reply(self, email_data, candidates=20):
+        """
+        Finds the reply given in the past thread most similar to an email.
+
+        Args:
+            email_data (dict): The email to answer.
+            candidates (int): How many of the most similar past emails to consider.
+
+        Returns:
+            Match: The reply (its snippet is the start of the reply), or None.
+        """
+        if not self.enabled:
+            return None
+        thread_id = email_data.get('threadId')
+        with self._lock:
+            query = self._query(email_data)
+            if not query:
+                return None
+            row = self._conn.execute(
+                "SELECT r.message_id, r.thread_id, r.sender, r.subject, m.category, r.kind,"
+                " substr(r.body, 1, 200), f.score"
+                f" FROM (SELECT rowid, {_RANK} AS score FROM documents_fts WHERE documents_fts MATCH ?"
+                "       ORDER BY score LIMIT ?) f"
+                " JOIN documents m ON m.id = f.rowid AND m.kind = ?"
+                " JOIN documents r ON r.thread_id = m.thread_id AND r.kind = ?"
+                " WHERE m.message_id != ? AND (? IS NULL OR m.thread_id != ?)"
+                " ORDER BY f.score LIMIT 1",
+                (query, candidates, MESSAGE, REPLY, email_data.get('id') or '', thread_id, thread_id)).fetchone()
+        return Match(*row) if row else None
+
+    def compact(self):
+        """
+        Drops documents older than the retention period and merges the index segments.
+
+        Returns:
+            int: The number of documents removed.
+        """
+        if not self.enabled:
+            return 0
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = self._conn.execute(
+                "SELECT subject, body FROM documents WHERE indexed_at < ?", (cutoff,)).fetchall()
+            term_counts = {}
+            for subject, body in expired:
+                for term in _terms(subject, body):
+                    term_counts[term] = term_counts.get(term, 0) + 1
+            with self._conn:
+                self._conn.execute("BEGIN")
+                if expired:
+                    self._conn.execute("DELETE FROM documents WHERE indexed_at < ?", (cutoff,))
+                    self._conn.executemany("UPDATE terms SET documents = documents - ? WHERE term = ?",
+                                           [(count, term) for term, count in term_counts.items()])
+                    self._conn.execute("DELETE FROM terms WHERE documents <= 0")
+                self._conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._count -= len(expired)
+        if expired:
+            logger.info("Knowledge index compacted: removed %d expired documents.", len(expired))
+        return len(expired)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Manual search of an existing index.
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python -m agent_core.knowledge_index "text to look for" [index.sqlite3]')
+        sys.exit(2)
+    index = KnowledgeIndex(sys.argv[2] if len(sys.argv) > 2 else KNOWLEDGE_INDEX_FILE)
+    probe = {'subject': '', 'body': sys.argv[1]}
+    print(f"--- {len(index)} documents indexed ---")
+    for match in index.similar(probe, limit=10, kind=None):
+        print(f"{match.score:8.2f}  [{match.kind}/{match.category}] {match.subject} ({match.sender})")
+        print(f"          {match.snippet[:100]!r}")
+    reply = index.find_reply(probe)
+    if reply:
+        print(f"\nBest prior reply (thread {reply.thread_id}):\n{reply.snippet}")
+    index.close()
@@ -0,0 +1,110 @@
+# agent_core/ledger.py
+# A persistent record of what the agent has already done for each message.
+# It makes cycles idempotent: after a crash or restart, actions that already
+# succeeded (an escalation email, a calendar event) are not repeated.
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Outcome stored for an action that completed successfully.
+OK = 'ok'
+FAILED = 'failed'
+
+
+class ProcessedLedger:
+    """
+    A SQLite-backed (WAL mode) ledger mapping (message_id, action) to an outcome.
+
+    All successful entries are also kept in an in-memory set, so `has()` is a
+    single hash lookup and never touches the disk. Old entries are removed by
+    `compact()`.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        retention_days (float): How long entries are kept before compaction drops them.
+    """
+
+    def __init__(self, path, retention_days=30):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.retention_seconds = retention_days * 24 * 3600
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL is durable across application crashes.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ledger ("
+            " message_id TEXT NOT NULL,"
+            " action TEXT NOT NULL,"
+            " outcome TEXT NOT NULL,"
+            " recorded_at REAL NOT NULL,"
+            " PRIMARY KEY (message_id, action)"
+            ") WITHOUT ROWID"
+        )
+        self._done = {
+            (message_id, action)
+            for message_id, action in self._conn.execute(
+                "SELECT message_id, action FROM ledger WHERE outcome = ?", (OK,))
+        }
+
+    def __len__(self):
+        return len(self._done)
+
+    def has(self, message_id, action):
+        """Returns True if the action already succeeded for the message."""
+        return (message_id, action) in self._done
+
+    def record(self, message_id, action, outcome=OK):
+        """Records the outcome of an action for a message."""
+        self.record_many([message_id], action, outcome)
+
+    def record_many(self, message_ids, action, outcome=OK):
+        """Records the same action outcome for many messages in one transaction."""
+        now = time.time()
+        rows = [(message_id, action, outcome, now) for message_id in message_ids]
+        if not rows:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO ledger (message_id, action, outcome, recorded_at)"
+                    " VALUES (?, ?, ?, ?)", rows)
+            for message_id in message_ids:
+                if outcome == OK:
+                    self._done.add((message_id, action))
+                else:
+                    self._done.discard((message_id, action))
+
+    def compact(self):
+        """
+        Drops entries older than the retention period and shrinks the WAL file.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = self._conn.execute(
+                "SELECT message_id, action FROM ledger WHERE recorded_at < ?", (cutoff,)).fetchall()
+            if expired:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.execute("DELETE FROM ledger WHERE recorded_at < ?", (cutoff,))
+                self._done.difference_update(expired)
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if expired:
+            logger.info("Ledger compacted: removed %d expired entries.", len(expired))
+        return len(expired)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,61 @@
+# agent_core/logging_config.py
+# Sets up the agent's logging: plain text for a terminal, or one JSON object
+# per line for log collectors.
+
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# LogRecord attributes that are not user-supplied `extra` fields.
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as a single-line JSON object.
+
+    Structured fields passed as `extra={'fields': {...}}` (or as other extra
+    attributes) are merged into the object.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != 'fields':
+                entry[key] = value
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level='INFO', log_format='text', stream=None):
+    """
+    Configures the root logger.
+
+    Args:
+        level (str): The minimum level, e.g. "INFO" or "DEBUG".
+        log_format (str): "text" for human-readable lines, "json" for structured logs.
+        stream (optional): Where to write; defaults to stderr.
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if log_format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # Client libraries are chatty at DEBUG; keep them at WARNING.
+    for name in ('googleapiclient', 'google', 'urllib3'):
+        logging.getLogger(name).setLevel(logging.WARNING)
@@ -1,93 +1,471 @@
 # agent_core/main_agent.py
 # This is the central control script that runs the agent's main loop.
 
+import logging
 import time
-from config import SUPERVISOR_EMAIL, SLEEP_TIME_SECONDS
-from agent_core.decision_maker import classify_email
-from agent_core.text_parser import parse_meeting_details
+from concurrent.futures import wait
+from config import (
+    SUPERVISOR_EMAIL,
+    SLEEP_TIME_SECONDS,
+    POLL_MIN_SECONDS,
+    POLL_MAX_SECONDS,
+    WAKEUP_PORT,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    METRICS_PORT,
+    TRACE_SAMPLE_RATE,
+    GMAIL_BATCH_SIZE,
+    MAX_BODY_BYTES,
+    PIPELINE_FETCH_QUEUE_BATCHES,
+    PIPELINE_MAX_PENDING_ACTIONS,
+    PRIORITY_AGING_SECONDS,
+    PRIORITY_CHUNK_EMAILS,
+    STATE_FILE,
+    LEDGER_FILE,
+    LEDGER_RETENTION_DAYS,
+    LEDGER_COMPACT_EVERY_CYCLES,
+    KNOWLEDGE_INDEX_ENABLED,
+    KNOWLEDGE_INDEX_FILE,
+    MAX_ACTION_WORKERS,
+    API_CONCURRENCY_LIMITS,
+)
+from agent_core.action_executor import ActionExecutor, action, once
+from agent_core.decision_maker import classify_many, rule_store
+from agent_core.escalation import EscalationQueue, escalation_message
+from agent_core.knowledge_index import REPLY, KnowledgeIndex
+from agent_core.ledger import ProcessedLedger
+from agent_core.logging_config import configure_logging
+from agent_core.metrics import CYCLE_SECONDS, EMAILS_TOTAL, QUEUE_DEPTH, MetricsServer, registry, tracer
+from agent_core.pipeline import Prefetcher
+from agent_core.scheduler import PollScheduler, WakeupListener
+from agent_core.state_store import StateStore
+from agent_core.text_parser import meeting_text, parse_meeting_details
+from agent_core.work_queue import PriorityWorkQueue
 from integrations.email_service import (
-    fetch_unread_emails, 
-    send_email, 
-    mark_as_read, 
+    MAX_BATCH_MODIFY_IDS,
+    LabelChangeQueue,
+    send_email,
+    mark_as_read,
     move_to_spam
 )
-from integrations.calendar_service import create_calendar_event
+from integrations.calendar_service import (
+    CONFLICT as EVENT_CONFLICT,
+    FAILED as EVENT_FAILED,
+    CalendarCache,
+    EventInsertQueue,
+    create_calendar_event,
+)
+from integrations.auth_service import mailbox_context
+from integrations.email_sync import MailboxSync
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = registry.gauge('agent_poll_interval_seconds', 'Current wait between mailbox polls.')
+
+# Priority level of each category (0 first). Fetched emails are queued by what their
+# sender and subject alone decide (RuleEngine.classify_headers); emails whose category
+# depends on the body wait with the NORMAL ones.
+PRIORITIES = {'IMPORTANT': 0, 'MEETING_REQUEST': 1, 'NORMAL': 2, 'SPAM': 3}
+
+
+def plan_actions(email, classification, label_queue=None, event_queue=None, supervisor=SUPERVISOR_EMAIL,
+                 escalation_queue=None):
+    """
+    Decides which actions to take for a classified email.
+
+    Args:
+        email (dict): The parsed email.
+        classification (str): The category returned by the decision maker.
+        label_queue (LabelChangeQueue, optional): If given, read/spam label changes
+            are queued on it instead of being sent one request per message.
+        event_queue (EventInsertQueue, optional): If given, calendar events are queued
+            on it, checked for duplicates and conflicts, and created in batches.
+        supervisor (str): Where important emails are escalated.
+        escalation_queue (EscalationQueue, optional): If given, escalations are queued
+            on it and sent as one digest per thread or cluster of near-duplicates.
+
+    Returns:
+        list: Action steps to run in order (see agent_core.action_executor).
+    """
+    if classification == "IMPORTANT":
+        logger.info("ACTION: This is an important email. Escalating to supervisor.")
+        if escalation_queue is not None:
+            escalate = action('gmail', escalation_queue.queue, email['id'], email)
+        else:
+            escalation_subject, escalation_body = escalation_message(email)
+            escalate = once('escalation', 'gmail', send_email, to=supervisor,
+                            subject=escalation_subject, body_text=escalation_body)
+        return [
+            escalate,
+            action('gmail', mark_as_read, email['id'], label_queue=label_queue),
+        ]
+
+    if classification == "MEETING_REQUEST":
+        logger.info("ACTION: This is a meeting request. Attempting to parse details.")
+        # Combine subject and body for better parsing context
+        with tracer.span('parse'):
+            event_details = parse_meeting_details(meeting_text(email))
+
+        steps = []
+        if event_details:
+            logger.info("Parsed event details: %s at %s", event_details['summary'], event_details['start_time'])
+            event = dict(
+                summary=event_details['summary'],
+                description=f"Created from an email request.\n\n--- Original Email Snippet ---\n{email.get('snippet')}",
+                start_time=event_details['start_time'],
+                end_time=event_details['end_time'],
+                attendees=[email.get('sender')]  # Automatically invite the sender
+            )
+            # Create the calendar event
+            if event_queue is not None:
+                # The queue's duplicate check keeps this from creating the event twice.
+                steps.append(action('calendar', event_queue.queue, email['id'], **event))
+            else:
+                steps.append(once('calendar_event', 'calendar', create_calendar_event, **event))
+        else:
+            logger.warning("Could not automatically parse meeting details. Manual action may be required.")
+
+        steps.append(action('gmail', mark_as_read, email['id'], label_queue=label_queue))
+        return steps
+
+    if classification == "SPAM":
+        return [action('gmail', move_to_spam, email['id'], label_queue=label_queue)]
+
+    # NORMAL
+    return [action('gmail', mark_as_read, email['id'], label_queue=label_queue)]
+
+
+class Agent:
+    """
+    The agent's processing pipeline for one mailbox: poll, classify, act.
+
+    Each call to `run_cycle()` handles the mail that arrived since the previous
+    one. Within a cycle the stages overlap: emails are classified and their
+    actions started batch by batch, while later batches are still being
+    fetched, and bounded queues between the stages keep a fast stage from
+    running far ahead of a slow one. Fetched emails wait in a priority queue,
+    so important mail and meeting requests are handled, and escalations
+    sent, ahead of bulk mail. The live loop (run_main_loop) and the offline replay harness
+    (agent_core.replay) both drive an Agent; they differ only in when they call it.
+
+    Args:
+        state_file (str): Where the Gmail sync position is kept.
+        ledger_file (str): The processed-message ledger database.
+        mailbox (str, optional): A mailbox registered with auth_service.register_mailbox();
+            None uses the default token.
+        rules (RuleStore, optional): The mailbox's classification rules; defaults to the shared ones.
+        supervisor (str): Where important emails are escalated.
+        action_pool (ThreadPoolExecutor, optional): A worker pool shared with other agents.
+        knowledge_file (str, optional): The full-text index of processed mail; None (or
+            KNOWLEDGE_INDEX_ENABLED off) disables it.
+    """
+
+    def __init__(self, state_file=STATE_FILE, ledger_file=LEDGER_FILE, mailbox=None, rules=None,
+                 supervisor=SUPERVISOR_EMAIL, action_pool=None, knowledge_file=KNOWLEDGE_INDEX_FILE):
+        self.mailbox = mailbox
+        self.name = mailbox or 'default'
+        self.rules = rules or rule_store
+        self.supervisor = supervisor
+
+        self.state = StateStore(state_file)
+
+        # Only messages that arrived since the last committed sync are fetched each cycle.
+        self.mailbox_sync = MailboxSync(self.state, batch_size=GMAIL_BATCH_SIZE,
+                                        max_body_bytes=MAX_BODY_BYTES)
+
+        # Remembers what was already done per message, so a restart never repeats it.
+        self.ledger = ProcessedLedger(ledger_file, retention_days=LEDGER_RETENTION_DAYS)
+        self.ledger.compact()
+
+        # Network actions run on a worker pool while classification keeps going.
+        self.executor = ActionExecutor(max_workers=MAX_ACTION_WORKERS, api_limits=API_CONCURRENCY_LIMITS,
+                                       ledger=self.ledger, pool=action_pool,
+                                       max_pending=PIPELINE_MAX_PENDING_ACTIONS)
+
+        # Read/spam label changes are collected during a cycle and sent with batchModify.
+        self.label_queue = LabelChangeQueue()
+
+        # Meeting events are checked against a local calendar cache and created in batches.
+        self.event_queue = EventInsertQueue(CalendarCache())
+
+        # Processed mail and the user's replies are indexed locally, so similar past
+        # threads and their replies can be looked up without asking Gmail.
+        self.knowledge = KnowledgeIndex(knowledge_file) if knowledge_file and KNOWLEDGE_INDEX_ENABLED else None
+
+        # Escalations are merged into one digest per thread or cluster of near-duplicates,
+        # and list the similar emails seen before.
+        self.escalation_queue = EscalationQueue(supervisor, state_store=self.state, ledger=self.ledger,
+                                                knowledge=self.knowledge)
+
+        self.cycle = 0
+
+    def run_cycle(self):
+        """
+        Fetches, classifies and acts on the emails that are new since the last cycle.
+
+        Returns:
+            int: The number of new emails found.
+        """
+        with mailbox_context(self.mailbox):
+            return self._run_cycle()
+
+    def _fetch(self, cycle):
+        with tracer.span('fetch', cycle=cycle):
+            yield from self.mailbox_sync.stream()
+
+    def _schedule(self, emails, work, cycle):
+        """Queues fetched emails by the priority their headers give them."""
+        ledger, engine = self.ledger, self.rules.engine
+        with tracer.span('prioritize', cycle=cycle, emails=len(emails)):
+            for email in emails:
+                if ledger.has(email['id'], 'handled'):
+                    logger.info("Skipping message %s: already handled.", email['id'])
+                    continue
+                # Only the sender and subject rules run here; the body is not read yet.
+                classification = engine.classify_headers(email)
+                category = classification.category if classification is not None else 'NORMAL'
+                work.push(email, PRIORITIES[category])
+
+    def _process_batch(self, emails, cycle):
+        """
+        Classifies emails, indexes them and submits their actions.
+
+        Returns:
+            list: The futures of the IMPORTANT emails' action chains.
+        """
+        executor = self.executor
+        # 2. Decision Making: Classify the emails in one batch
+        with tracer.span('classify', cycle=cycle, emails=len(emails)):
+            classifications = classify_many(emails, self.rules)
+
+        if self.knowledge is not None:
+            with tracer.span('index', cycle=cycle, emails=len(emails)):
+                self.knowledge.add_many(emails, [classification for classification, _ in classifications])
+
+        urgent = []
+        for email, (classification, rule) in zip(emails, classifications):
+            with tracer.span('email', message_id=email['id']):
+                EMAILS_TOTAL.inc(category=classification, mailbox=self.name)
+                logger.info("Message %s from %s: %s (%s)", email['id'], email.get('sender'),
+                            classification, rule)
+                logger.debug("Subject of message %s: %s", email['id'], email.get('subject'))
+
+                # 3. Action: Perform actions based on classification. Blocks while
+                # PIPELINE_MAX_PENDING_ACTIONS messages are still being acted on.
+                future = executor.submit(email['id'], plan_actions(email, classification, self.label_queue,
+                                                                   self.event_queue, self.supervisor,
+                                                                   self.escalation_queue))
+                if classification == "IMPORTANT":
+                    urgent.append(future)
+        QUEUE_DEPTH.set(executor.pending, queue='actions', mailbox=self.name)
+        return urgent
+
+    def _flush_escalations(self, cycle, results):
+        """Sends the queued escalations as digests and records them; results collects the outcomes."""
+        QUEUE_DEPTH.set(len(self.escalation_queue), queue='escalations', mailbox=self.name)
+        with tracer.span('flush_escalations', cycle=cycle):
+            flushed = self.escalation_queue.flush()
+        QUEUE_DEPTH.set(0, queue='escalations', mailbox=self.name)
+        self.ledger.record_many([message_id for message_id, ok in flushed.items() if ok], 'escalation')
+        # An email whose escalation failed stays unread, so it is not lost while it waits for a retry.
+        self.label_queue.discard([message_id for message_id, ok in flushed.items() if not ok])
+        results.update(flushed)
+
+    def _index_replies(self, cycle):
+        """Indexes the replies the user sent since the last cycle (not the agent's escalations)."""
+        with tracer.span('index_replies', cycle=cycle):
+            replies = [email for email in self.mailbox_sync.fetch_sent()
+                       if self.supervisor not in (email.get('recipient') or '')]
+            self.knowledge.add_many(replies, kind=REPLY, decode=True)
+
+    def _run_cycle(self):
+        self.cycle += 1
+        cycle = self.cycle
+        ledger, executor = self.ledger, self.executor
+        label_queue, event_queue, escalation_queue = self.label_queue, self.event_queue, self.escalation_queue
+        cycle_started = time.perf_counter()
+        logger.info("--- [%s] Checking for unread emails (cycle %d)... ---", self.name, cycle)
+
+        # 1. Perception: Fetch the emails that are new since the last sync. Batches are
+        # fetched in the background while the ones before them are classified and acted on.
+        found = 0
+        work = PriorityWorkQueue(levels=len(PRIORITIES), aging_seconds=PRIORITY_AGING_SECONDS)
+        label_results, escalation_results = {}, {}
+        with Prefetcher(self._fetch(cycle), PIPELINE_FETCH_QUEUE_BATCHES, name=f'agent-fetch-{self.name}') as batches:
+            for emails in batches:
+                found += len(emails)
+                self._schedule(emails, work, cycle)
+                while work:
+                    # Batches fetched in the meantime compete for the next chunk too.
+                    for more in batches.ready():
+                        found += len(more)
+                        self._schedule(more, work, cycle)
+                    QUEUE_DEPTH.set(len(work), queue='scheduled_emails', mailbox=self.name)
+                    urgent = self._process_batch(work.pop_many(PRIORITY_CHUNK_EMAILS), cycle)
+                    if urgent:
+                        # Escalate as soon as the chains have queued them, not at the end of the cycle.
+                        wait(urgent)
+                        self._flush_escalations(cycle, escalation_results)
+                    # A long backlog has its label changes applied as it goes, a full batchModify at a time,
+                    # once the unread listing is complete (marking mail read would shift its pages).
+                    # Meeting requests stay unread until their events are known to be created.
+                    if len(label_queue) >= MAX_BATCH_MODIFY_IDS and self.mailbox_sync.listed:
+                        with tracer.span('flush_labels', cycle=cycle):
+                            label_results.update(label_queue.flush(hold=event_queue.keys()))
+                QUEUE_DEPTH.set(len(batches), queue='fetched_batches', mailbox=self.name)
+        QUEUE_DEPTH.set(0, queue='fetched_batches', mailbox=self.name)
+        QUEUE_DEPTH.set(0, queue='scheduled_emails', mailbox=self.name)
+
+        if not found:
+            logger.info("No new emails to process.")
+            if escalation_queue.held:
+                # Held escalations go out once their digest window has passed, even in quiet cycles.
+                escalation_queue.flush()
+        else:
+            logger.info("Found %d new email(s). Finishing their actions...", found)
+
+            # The cycle ends when the slowest outstanding action chain has finished.
+            with tracer.span('act', cycle=cycle):
+                executor.wait()
+            QUEUE_DEPTH.set(0, queue='actions', mailbox=self.name)
+
+            # Create the queued calendar events; a message whose event failed is not handled.
+            QUEUE_DEPTH.set(len(event_queue), queue='calendar_events', mailbox=self.name)
+            with tracer.span('flush_events', cycle=cycle):
+                event_results = event_queue.flush()
+            QUEUE_DEPTH.set(0, queue='calendar_events', mailbox=self.name)
+            ledger.record_many([message_id for message_id, result in event_results.items()
+                                if result.status not in (EVENT_FAILED, EVENT_CONFLICT)], 'calendar_event')
+            not_handled = {message_id for message_id, result in event_results.items()
+                           if result.status == EVENT_FAILED}
+
+            # A meeting request that clashes with the calendar needs a person. It is left
+            # unread, and handled as far as the agent is concerned: trying again would clash again.
+            conflicts = [message_id for message_id, result in event_results.items()
+                         if result.status == EVENT_CONFLICT]
+            if conflicts:
+                label_queue.discard(conflicts)
+                ledger.record_many(conflicts, 'handled')
+                logger.warning("Left %d meeting request(s) that conflict with the calendar unread: %s",
+                               len(conflicts), ', '.join(conflicts))
+
+            # Send the remaining escalations as digests; a message whose escalation failed is not handled.
+            self._flush_escalations(cycle, escalation_results)
+            not_handled.update(message_id for message_id, ok in escalation_results.items() if not ok)
+
+            # Messages that are not handled keep their labels: they stay unread for a later cycle.
+            label_queue.discard(not_handled)
+
+            # Apply the coalesced label changes and report any message that was missed.
+            QUEUE_DEPTH.set(len(label_queue), queue='label_changes', mailbox=self.name)
+            with tracer.span('flush_labels', cycle=cycle):
+                label_results.update(label_queue.flush())
+            QUEUE_DEPTH.set(0, queue='label_changes', mailbox=self.name)
+            failed = [message_id for message_id, ok in label_results.items() if not ok]
+            if failed:
+                logger.error("Label changes failed for %d message(s): %s", len(failed), ', '.join(failed))
+            ledger.record_many([message_id for message_id, ok in label_results.items()
+                                if ok and message_id not in not_handled], 'handled')
+
+        if self.knowledge is not None and self.mailbox_sync.sent_ids:
+            self._index_replies(cycle)
+
+        if cycle % LEDGER_COMPACT_EVERY_CYCLES == 0:
+            ledger.compact()
+            if self.knowledge is not None:
+                self.knowledge.compact()
+
+        # Advance the sync position; what this cycle could not finish is fetched again next time.
+        self.mailbox_sync.commit(unfinished=[message_id for message_id in self.mailbox_sync.listed_ids
+                                             if not ledger.has(message_id, 'handled')])
+        CYCLE_SECONDS.observe(time.perf_counter() - cycle_started, mailbox=self.name)
+        return found
+
+    def close(self):
+        self.executor.shutdown()
+        self.ledger.close()
+        if self.knowledge is not None:
+            self.knowledge.close()
+
+
+def run_once():
+    """
+    Runs a single cycle and returns, e.g. for a cron job. Rules are read once,
+    and no metrics server or wake-up listener is started.
+
+    Returns:
+        int: The number of new emails found.
+    """
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    tracer.sample_rate = TRACE_SAMPLE_RATE
+    agent = Agent()
+    try:
+        return agent.run_cycle()
+    finally:
+        agent.close()
+
 
 def run_main_loop():
     """
     Runs the main operational loop of the intelligent agent.
     """
-    print("--- Intelligent Agent is now running. Press Ctrl+C to stop. ---")
-    print(f"Checking for new emails every {SLEEP_TIME_SECONDS} seconds.")
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    tracer.sample_rate = TRACE_SAMPLE_RATE
+    logger.info("--- Intelligent Agent is now running. Press Ctrl+C to stop. ---")
+    logger.info("Checking for new emails every %s-%s seconds, depending on traffic.",
+                POLL_MIN_SECONDS, POLL_MAX_SECONDS)
+
+    # Pick up edits to the rules file in the background, without pausing the loop.
+    rule_store.start_watching()
+
+    agent = Agent()
+
+    # Polls often while mail is arriving, rarely while idle, and at once when woken.
+    scheduler = PollScheduler(POLL_MIN_SECONDS, POLL_MAX_SECONDS, initial_interval=SLEEP_TIME_SECONDS)
+    listener = None
+    if WAKEUP_PORT:
+        listener = WakeupListener(scheduler, WAKEUP_PORT)
+        try:
+            listener.start()
+        except OSError as e:
+            logger.warning("Could not listen for wake-up triggers on port %s: %s", WAKEUP_PORT, e)
+            listener = None
+
+    # Prometheus-style metrics at http://127.0.0.1:METRICS_PORT/metrics
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = MetricsServer(METRICS_PORT)
+        try:
+            metrics_server.start()
+        except OSError as e:
+            logger.warning("Could not serve metrics on port %s: %s", METRICS_PORT, e)
+            metrics_server = None
 
     try:
         while True:
-            print("\n----------------------------------------------------")
-            print(f"[{time.ctime()}] --- Checking for unread emails... ---")
+            found = 0
+            try:
+                found = agent.run_cycle()
+            except Exception:
+                # One failed cycle must not stop the agent; the next one starts over.
+                logger.exception("Agent cycle failed.")
 
-            # 1. Perception: Fetch unread emails
-            unread_emails = fetch_unread_emails()
-
-            if not unread_emails:
-                print("No new emails to process.")
-            else:
-                print(f"Found {len(unread_emails)} new email(s). Processing...")
-                
-                # 2. Decision Making: Process each email
-                for email in unread_emails:
-                    print(f"\n--- Analyzing Email ---")
-                    print(f"From: {email.get('sender')}")
-                    print(f"Subject: {email.get('subject')}")
-
-                    classification = classify_email(email)
-
-                    # 3. Action: Perform actions based on classification
-                    if classification == "IMPORTANT":
-                        print("ACTION: This is an important email. Escalating to supervisor.")
-                        escalation_subject = f"URGENT: Agent Escalation - {email.get('subject')}"
-                        escalation_body = (
-                            "This email was flagged as important by the Intelligent Agent.\n\n"
-                            f"Original Sender: {email.get('sender')}\n"
-                            f"Original Subject: {email.get('subject')}\n\n"
-                            "--- Original Email Body ---\n"
-                            f"{email.get('body')}"
-                        )
-                        send_email(to=SUPERVISOR_EMAIL, subject=escalation_subject, body_text=escalation_body)
-                        mark_as_read(email['id'])
-
-                    elif classification == "MEETING_REQUEST":
-                        print("ACTION: This is a meeting request. Attempting to parse details.")
-                        # Combine subject and body for better parsing context
-                        full_text = f"{email.get('subject', '')}\n{email.get('body', '')}"
-                        event_details = parse_meeting_details(full_text)
-                        
-                        if event_details:
-                            print(f"Parsed event details: {event_details['summary']} at {event_details['start_time']}")
-                            # Create the calendar event
-                            create_calendar_event(
-                                summary=event_details['summary'],
-                                description=f"Created from an email request.\n\n--- Original Email Snippet ---\n{email.get('snippet')}",
-                                start_time=event_details['start_time'],
-                                end_time=event_details['end_time'],
-                                attendees=[email.get('sender')] # Automatically invite the sender
-                            )
-                        else:
-                            print("Could not automatically parse meeting details. Manual action may be required.")
-                        
-                        mark_as_read(email['id'])
-
-                    elif classification == "SPAM":
-                        move_to_spam(email['id'])
-                        
-                    else: # NORMAL
-                        mark_as_read(email['id'])
-            
             # Wait for the next cycle
-            print("\n--- Cycle complete. Waiting for next check... ---")
-            time.sleep(SLEEP_TIME_SECONDS)
+            interval = scheduler.record(found)
+            POLL_INTERVAL.set(interval)
+            logger.info("--- Cycle complete. Next check in %.0f seconds... ---", interval)
+            reason = scheduler.wait()
+            if reason:
+                logger.info("Woken early: %s", reason)
 
     except KeyboardInterrupt:
-        print("\n--- Agent stopped by user. Goodbye! ---")
+        logger.info("--- Agent stopped by user. Goodbye! ---")
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
+        if listener is not None:
+            listener.stop()
+        agent.close()
 
 if __name__ == '__main__':
     run_main_loop()
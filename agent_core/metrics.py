@@ -0,0 +1,313 @@
+# agent_core/metrics.py
+# Low-overhead instrumentation for the agent: counters, gauges and histograms
+# rendered in the Prometheus text format, an HTTP endpoint that serves them,
+# and sampled trace spans written to the log as structured records.
+
+import bisect
+import logging
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) from 1 ms to 1 minute.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. the number of API calls."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(key)} {_format_value(v)}"
+                                 for key, v in values]
+
+
+class Gauge(Counter):
+    """A value that can go up and down, e.g. a queue depth."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Counts observations (e.g. durations in seconds) into cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count.
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._values.get(_label_key(labels))
+            return series[2] if series else 0
+
+    def total(self, **labels):
+        with self._lock:
+            series = self._values.get(_label_key(labels))
+            return series[1] if series else 0.0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds named metrics; asking twice for the same name returns the same metric."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}.")
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# The registry the agent and its integrations report to.
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'agent_stage_seconds', 'Time spent per processing stage (fetch, parse, classify, act, ...).')
+CYCLE_SECONDS = registry.histogram('agent_cycle_seconds', 'Duration of a whole polling cycle.')
+EMAILS_TOTAL = registry.counter('agent_emails_total', 'Emails processed, by category.')
+ACTION_SECONDS = registry.histogram('agent_action_seconds', 'Duration of each action, by action and outcome.')
+QUEUE_DEPTH = registry.gauge('agent_queue_depth', 'Items waiting in the agent queues, by queue.')
+API_CALLS_TOTAL = registry.counter('google_api_calls_total', 'Google API call attempts, by endpoint and status.')
+API_LATENCY_SECONDS = registry.histogram('google_api_latency_seconds', 'Google API call latency, by endpoint.')
+
+
+class _Span:
+    __slots__ = ('trace_id', 'name', 'fields', 'sampled')
+
+    def __init__(self, trace_id, name, fields, sampled):
+        self.trace_id = trace_id
+        self.name = name
+        self.fields = fields
+        self.sampled = sampled
+
+
+class Tracer:
+    """
+    Writes timed spans as structured log records, for a sample of traces.
+
+    A trace (e.g. the handling of one email) is sampled or not as a whole, so
+    a sampled trace is always complete. Stage timings are recorded in
+    STAGE_SECONDS for every span, sampled or not.
+
+    Args:
+        sample_rate (float): Fraction of traces that are logged (0 to 1).
+    """
+
+    def __init__(self, sample_rate=0.1):
+        self.sample_rate = sample_rate
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        return getattr(self._local, 'span', None)
+
+    @contextmanager
+    def span(self, name, **fields):
+        """
+        Times the with-block as the stage `name`.
+
+        A span opened outside any other span starts a new trace. Spans started
+        in another thread can join a trace through `trace_id`.
+        """
+        parent = self.current
+        trace_id = fields.pop('trace_id', None)
+        if parent is not None and trace_id is None:
+            trace_id, sampled = parent.trace_id, parent.sampled
+        else:
+            sampled = random.random() < self.sample_rate
+            trace_id = trace_id or uuid.uuid4().hex[:16]
+        span = _Span(trace_id, name, fields, sampled)
+        self._local.span = span
+        started = time.perf_counter()
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._local.span = parent
+            STAGE_SECONDS.observe(elapsed, stage=name)
+            if sampled and logger.isEnabledFor(logging.DEBUG):
+                record = {'trace_id': trace_id, 'span': name, 'duration_ms': round(elapsed * 1000, 3)}
+                record.update(fields)
+                if error:
+                    record['error'] = error
+                logger.debug("span %s", name, extra={'fields': record})
+
+
+# The tracer used by the agent loop; its sample rate comes from TRACE_SAMPLE_RATE.
+tracer = Tracer()
+
+
+def _metrics_handler():
+    # http.server is only imported when a metrics server is created; it is slow to
+    # import and most short-lived runs (e.g. a single --once cycle) never need it.
+    from http.server import BaseHTTPRequestHandler
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics request: " + format, *args)
+
+    return _MetricsHandler
+
+
+class MetricsServer:
+    """
+    Serves the registry at http://host:port/metrics for Prometheus to scrape.
+
+    Args:
+        port (int): The TCP port; 0 picks a free one (see `address`).
+        host (str): The interface to bind to.
+        metrics (MetricsRegistry): The registry to serve.
+    """
+
+    def __init__(self, port, host='127.0.0.1', metrics=registry):
+        from http.server import ThreadingHTTPServer
+        self._server = ThreadingHTTPServer((host, port), _metrics_handler(), bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.registry = metrics
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server',
+                                        daemon=True)
+        self._thread.start()
+        logger.info("Serving metrics on http://%s:%s/metrics", *self.address[:2])
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
@@ -0,0 +1,126 @@
+# agent_core/pipeline.py
+# Runs one stage of the agent's pipeline in a background thread.
+# The fetch stage is a generator that yields batches of emails as Gmail returns
+# them; a Prefetcher keeps it running ahead of the classify stage, through a
+# bounded queue: when classification falls behind, fetching pauses until it
+# has caught up, so a large backlog never piles up in memory.
+
+import contextvars
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# How often a producer blocked on a full queue checks whether it was closed, in seconds.
+_PUT_POLL_SECONDS = 0.1
+
+_DONE = object()
+_EMPTY = object()
+
+
+class _Failure:
+    """Carries an exception raised by the producer over to the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class Prefetcher:
+    """
+    Iterates over `iterable` in a background thread, up to `max_items` ahead of the consumer.
+
+    Iterating over the Prefetcher returns the items in order; an exception
+    raised by the producer is raised again in the consumer. The producer runs
+    in a copy of the creating thread's context (e.g. its mailbox_context).
+    Always close() it, or use it as a context manager, so a consumer that
+    stops early also stops the producer.
+
+    Args:
+        iterable: The stage to run, e.g. a generator.
+        max_items (int): Items that may wait in the queue; the producer blocks beyond that.
+        name (str, optional): Name of the background thread.
+    """
+
+    def __init__(self, iterable, max_items=4, name='agent-prefetch'):
+        self._queue = queue.Queue(maxsize=max(1, max_items))
+        self._closed = threading.Event()
+        self._finished = False
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._produce, iterable),
+                                        name=name, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=_PUT_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, iterable):
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    break
+        except Exception as e:
+            self._put(_Failure(e))
+            return
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        self._put(_DONE)
+
+    def __len__(self):
+        """The number of items waiting for the consumer."""
+        return self._queue.qsize()
+
+    def _next(self, block):
+        if self._finished:
+            return _DONE
+        try:
+            item = self._queue.get(block)
+        except queue.Empty:
+            return _EMPTY
+        if item is _DONE:
+            self._finished = True
+        elif isinstance(item, _Failure):
+            self._finished = True
+            raise item.error
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self._next(block=True)
+            if item is _DONE:
+                return
+            yield item
+
+    def ready(self):
+        """Iterates over the items the producer has already delivered, without waiting for more."""
+        while True:
+            item = self._next(block=False)
+            if item is _DONE or item is _EMPTY:
+                return
+            yield item
+
+    def close(self):
+        """Stops the producer and waits for its thread to finish."""
+        self._closed.set()
+        # Make room in case the producer is waiting to put its last item.
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,371 @@
+# agent_core/replay.py
+# Offline replay of a mailbox through the full agent pipeline.
+# Recorded or synthetic messages are read from a JSONL fixture file and served
+# by the fake Gmail, Calendar and Drive endpoints (with optional latency and
+# random errors), while an Agent runs its normal cycles against them.
+#
+# Run with: python -m agent_core.replay FIXTURES.jsonl [--latency-ms N] [--error-rate R]
+#      or:  python -m agent_core.replay --synthetic 1000 [--cycles 10]
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict, namedtuple
+from config import API_RATE_LIMITS
+from agent_core.logging_config import configure_logging
+from agent_core.main_agent import Agent
+from integrations.auth_service import override_service
+from integrations.fake_transport import (
+    FakeCalendarHttp,
+    FakeDriveHttp,
+    FakeGmailHttp,
+    build_fake_service,
+    make_fake_message,
+)
+from integrations.governor import governor
+
+# (api name, version) of each fake endpoint the replay installs.
+REPLAY_APIS = {
+    'gmail': 'v1',
+    'calendar': 'v3',
+    'drive': 'v3',
+}
+
+
+def load_fixtures(path):
+    """
+    Reads replay fixtures from a JSONL file, one record per line.
+
+    A record is one of:
+        {"cycle": 1, "id": ..., "from": ..., "subject": ..., "body": ...}
+            A synthetic message, delivered before the given cycle (default 1).
+            Optional keys: "labels", "thread_id".
+        {"cycle": 1, "message": {...}}
+            A recorded Gmail message resource, as returned by messages.get.
+        {"event": {...}, "calendar": "primary"}
+            An event that is already in the calendar when the replay starts.
+
+    Blank lines and lines starting with '#' are ignored.
+
+    Returns:
+        list: The records, in file order.
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid fixture record: {e}") from None
+    return records
+
+
+def write_fixtures(records, path):
+    """Writes fixture records to a JSONL file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+
+_TOPICS = ['the quarterly budget', 'the product launch', 'hiring plans', 'the vendor contract',
+           'the roadmap', 'onboarding', 'the security review', 'the team offsite']
+_WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+def synthetic_fixtures(count, cycles=10, seed=0):
+    """
+    Generates a mixed mailbox: mostly ordinary mail, plus meeting requests,
+    urgent mail that is escalated, and spam.
+
+    Args:
+        count (int): Number of messages.
+        cycles (int): The messages are spread evenly over this many cycles.
+        seed (int): Seed for the random mix, so runs are comparable.
+
+    Returns:
+        list: Fixture records (see load_fixtures).
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        kind = rng.choices(['normal', 'meeting', 'important', 'spam'], weights=[60, 15, 10, 15])[0]
+        topic = rng.choice(_TOPICS)
+        if kind == 'meeting':
+            hour = rng.randint(9, 16)
+            subject = f"Meeting request: {topic}"
+            body = (f"Hi, can we have a meeting about {topic} on {rng.choice(_WEEKDAYS)} "
+                    f"at {hour}:00 for 30 minutes?\nThanks")
+        elif kind == 'important':
+            subject = f"URGENT: action required on {topic}"
+            body = f"Please look at {topic} today, it is critical."
+        elif kind == 'spam':
+            subject = "Congratulations, you are a winner!"
+            body = "Claim your prize now, click here. Limited time offer, 100% free."
+        else:
+            subject = f"Notes on {topic}"
+            body = f"Here are my notes on {topic}. " * rng.randint(1, 20)
+        records.append({
+            'cycle': 1 + i * cycles // max(count, 1),
+            'id': f"replay{i:06d}",
+            'from': f"sender{rng.randint(1, 200)}@example.com",
+            'subject': subject,
+            'body': body,
+        })
+    return records
+
+
+def _fixture_message(record):
+    if 'message' in record:
+        return record['message']
+    return make_fake_message(record['id'], record.get('from', 'unknown@example.com'),
+                             record.get('subject', ''), record.get('body', ''),
+                             label_ids=record.get('labels'), thread_id=record.get('thread_id'))
+
+
+class ReplayEnvironment:
+    """
+    Fake Google endpoints loaded with fixtures, installed in place of the real services.
+
+    Use it as a context manager; inside the block every integration talks to the
+    fakes. Messages are only delivered into the mailbox by `deliver(cycle)`, so
+    each cycle of the agent sees the mail that "arrived" since the previous one.
+
+    Args:
+        fixtures (list): Records as returned by load_fixtures().
+        latency (float): Seconds of simulated latency per HTTP round trip.
+        error_rate (float): Fraction of API calls that fail with `error_status`.
+        error_status (int): HTTP status of the random failures (e.g. 503 or 429).
+        seed (int, optional): Seed for the random failures.
+    """
+
+    def __init__(self, fixtures, latency=0.0, error_rate=0.0, error_status=503, seed=None):
+        events = defaultdict(list)
+        self._deliveries = defaultdict(list)
+        for record in fixtures:
+            if 'event' in record:
+                events[record.get('calendar', 'primary')].append(record['event'])
+            else:
+                self._deliveries[int(record.get('cycle', 1))].append(_fixture_message(record))
+
+        self.gmail = FakeGmailHttp(latency=latency)
+        self.calendar = FakeCalendarHttp(events, latency=latency)
+        self.drive = FakeDriveHttp(latency=latency)
+        self.transports = {'gmail': self.gmail, 'calendar': self.calendar, 'drive': self.drive}
+        for offset, http in enumerate(self.transports.values()):
+            http.set_error_rate(error_rate, error_status, None if seed is None else seed + offset)
+
+    @property
+    def cycles(self):
+        """The last cycle that has messages to deliver."""
+        return max(self._deliveries, default=0)
+
+    @property
+    def message_ids(self):
+        return [m['id'] for cycle in sorted(self._deliveries) for m in self._deliveries[cycle]]
+
+    def deliver(self, cycle):
+        """Adds the messages scheduled for `cycle` to the mailbox and returns how many there were."""
+        messages = self._deliveries.get(cycle, [])
+        for message in messages:
+            # A copy, so a replay never changes the fixture data.
+            self.gmail.add_message(json.loads(json.dumps(message)))
+        return len(messages)
+
+    def api_calls(self):
+        """API calls per endpoint, counting each call inside a batch."""
+        return {api: http.call_count for api, http in self.transports.items()}
+
+    def http_requests(self):
+        """HTTP round trips per endpoint."""
+        return {api: http.request_count for api, http in self.transports.items()}
+
+    def install(self):
+        for api, http in self.transports.items():
+            override_service(api, REPLAY_APIS[api], build_fake_service(api, REPLAY_APIS[api], http))
+
+    def uninstall(self):
+        for api in self.transports:
+            override_service(api, REPLAY_APIS[api], None)
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of `values` (fraction between 0 and 1)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+_ReplayReport = namedtuple('ReplayReport', [
+    'messages', 'handled', 'cycles', 'seconds', 'cycle_seconds', 'api_calls', 'http_requests',
+    'emails_sent', 'events_created',
+])
+
+
+class ReplayReport(_ReplayReport):
+    """The outcome of a replay: throughput, cycle latency and API usage."""
+
+    __slots__ = ()
+
+    @property
+    def messages_per_second(self):
+        return self.messages / self.seconds if self.seconds else 0.0
+
+    @property
+    def p50_cycle_seconds(self):
+        return percentile(self.cycle_seconds, 0.50)
+
+    @property
+    def p99_cycle_seconds(self):
+        return percentile(self.cycle_seconds, 0.99)
+
+    @property
+    def api_calls_per_message(self):
+        return sum(self.api_calls.values()) / self.messages if self.messages else 0.0
+
+    @property
+    def http_requests_per_message(self):
+        return sum(self.http_requests.values()) / self.messages if self.messages else 0.0
+
+    def as_dict(self):
+        """A flat summary, e.g. for storing benchmark results as JSON."""
+        return {
+            'messages': self.messages,
+            'handled': self.handled,
+            'cycles': self.cycles,
+            'seconds': round(self.seconds, 4),
+            'messages_per_second': round(self.messages_per_second, 1),
+            'p50_cycle_ms': round(self.p50_cycle_seconds * 1000, 2),
+            'p99_cycle_ms': round(self.p99_cycle_seconds * 1000, 2),
+            'api_calls_per_message': round(self.api_calls_per_message, 3),
+            'http_requests_per_message': round(self.http_requests_per_message, 3),
+            'api_calls': dict(self.api_calls),
+            'emails_sent': self.emails_sent,
+            'events_created': self.events_created,
+        }
+
+
+def replay(fixtures, latency=0.0, error_rate=0.0, error_status=503, seed=None, state_dir=None,
+           rate_limits=None):
+    """
+    Runs the agent over a fixture mailbox, one cycle per fixture cycle, without sleeping between them.
+
+    After the last fixture cycle, cycles without new mail follow while messages
+    are waiting to be retried (as the live loop would keep polling), up to the
+    agent's retry limit.
+
+    Args:
+        fixtures (list): Records as returned by load_fixtures() or synthetic_fixtures().
+        latency (float): Seconds of simulated latency per HTTP round trip.
+        error_rate (float): Fraction of API calls that fail.
+        error_status (int): HTTP status of those failures.
+        seed (int, optional): Seed for the random failures.
+        state_dir (str, optional): Where the agent keeps its sync state, ledger and knowledge index.
+                                   Defaults to a temporary directory that is removed afterwards.
+        rate_limits (dict, optional): Governor rate limits to apply; by default the
+                                      fakes are not rate limited.
+
+    Returns:
+        ReplayReport: What the replay measured.
+    """
+    environment = ReplayEnvironment(fixtures, latency, error_rate, error_status, seed)
+    with tempfile.TemporaryDirectory(prefix='agent-replay-') as temp_dir:
+        state_dir = state_dir or temp_dir
+        governor.reset()
+        governor.set_rate_limits(rate_limits or {})
+        try:
+            with environment:
+                agent = Agent(state_file=os.path.join(state_dir, 'state.json'),
+                              ledger_file=os.path.join(state_dir, 'ledger.sqlite3'),
+                              knowledge_file=os.path.join(state_dir, 'knowledge.sqlite3'))
+                cycle_seconds = []
+                try:
+                    last_cycle = environment.cycles + agent.mailbox_sync.retry_cycles
+                    for cycle in range(1, last_cycle + 1):
+                        if cycle > environment.cycles and not agent.mailbox_sync.retry_ids:
+                            break
+                        environment.deliver(cycle)
+                        started = time.perf_counter()
+                        agent.run_cycle()
+                        cycle_seconds.append(time.perf_counter() - started)
+                    message_ids = environment.message_ids
+                    handled = sum(1 for message_id in message_ids if agent.ledger.has(message_id, 'handled'))
+                finally:
+                    agent.close()
+        finally:
+            governor.set_rate_limits(API_RATE_LIMITS)
+            governor.reset()
+
+    return ReplayReport(
+        messages=len(message_ids),
+        handled=handled,
+        cycles=len(cycle_seconds),
+        seconds=sum(cycle_seconds),
+        cycle_seconds=cycle_seconds,
+        api_calls=environment.api_calls(),
+        http_requests=environment.http_requests(),
+        emails_sent=len(environment.gmail.sent),
+        events_created=len(environment.calendar.inserted),
+    )
+
+
+def format_report(report):
+    """Returns a short human-readable summary of a ReplayReport."""
+    calls = ', '.join(f"{api} {count}" for api, count in report.api_calls.items())
+    return (
+        f"{report.handled}/{report.messages} messages handled in {report.cycles} cycles, "
+        f"{report.seconds:.3f}s ({report.messages_per_second:,.0f} msgs/s)\n"
+        f"cycle latency p50 {report.p50_cycle_seconds * 1000:.1f} ms, "
+        f"p99 {report.p99_cycle_seconds * 1000:.1f} ms\n"
+        f"{report.api_calls_per_message:.2f} API calls/message ({calls}), "
+        f"{report.http_requests_per_message:.2f} HTTP requests/message\n"
+        f"{report.emails_sent} escalation(s) sent, {report.events_created} event(s) created"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a fixture mailbox through the agent offline.")
+    parser.add_argument('fixtures', nargs='?', help="JSONL fixture file.")
+    parser.add_argument('--synthetic', type=int, metavar='COUNT',
+                        help="Generate COUNT synthetic messages instead of reading a file.")
+    parser.add_argument('--cycles', type=int, default=10, help="Cycles for synthetic fixtures.")
+    parser.add_argument('--save', metavar='PATH', help="Write the synthetic fixtures to PATH.")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latency per HTTP round trip.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of API calls that fail.")
+    parser.add_argument('--error-status', type=int, default=503, help="HTTP status of injected failures.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+    parser.add_argument('--log-level', default='ERROR', help="The agent logs every message at INFO.")
+    args = parser.parse_args(argv)
+
+    if args.synthetic is not None:
+        fixtures = synthetic_fixtures(args.synthetic, args.cycles, args.seed)
+        if args.save:
+            write_fixtures(fixtures, args.save)
+    elif args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        parser.error("give a fixture file or --synthetic COUNT")
+
+    configure_logging(args.log_level)
+    report = replay(fixtures, latency=args.latency_ms / 1000.0, error_rate=args.error_rate,
+                    error_status=args.error_status, seed=args.seed)
+    print(json.dumps(report.as_dict(), indent=2) if args.json else format_report(report))
+
+
+if __name__ == '__main__':
+    main()
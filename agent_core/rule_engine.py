@@ -0,0 +1,259 @@
+# agent_core/rule_engine.py
+# A precompiled rule engine for email classification.
+# Keyword lists are normalised once at load time, and large lists are compiled
+# into a single regular expression so the cost of a scan stays flat as they grow.
+
+import re
+from collections import namedtuple
+
+# The result of classifying one email: the category and the rule that decided it
+# (e.g. "sender:boss@example.com", "meeting:schedule" or "default").
+Classification = namedtuple('Classification', ['category', 'rule'])
+
+DEFAULT_CLASSIFICATION = Classification("NORMAL", "default")
+
+
+def _trie_pattern(node):
+    """Renders a character trie as a regex, factoring out shared prefixes."""
+    is_end = '' in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ''
+    if len(branches) == 1 and not is_end:
+        return branches[0]
+    pattern = '(?:' + '|'.join(branches) + ')'
+    return pattern + '?' if is_end else pattern
+
+
+def compile_keywords(keywords):
+    """
+    Compiles a list of literal keywords into one regex that finds any of them.
+
+    The keywords are lowercased and arranged as a prefix trie, so the regex
+    engine tries each character position once however many keywords share a
+    prefix. Matching is done against lowercased text. Returns None for an
+    empty list.
+    """
+    trie = {}
+    for keyword in keywords:
+        if not keyword:
+            continue
+        node = trie
+        for ch in keyword.lower():
+            node = node.setdefault(ch, {})
+        node[''] = True
+    if not trie:
+        return None
+    return re.compile(_trie_pattern(trie))
+
+
+# Below this many keywords, CPython's substring search (`in`) beats a single regex
+# scan; above it the regex wins and keeps getting relatively faster.
+# See benchmarks/bench_classifier.py.
+REGEX_THRESHOLD = 48
+
+
+class KeywordMatcher:
+    """
+    Finds the first of a fixed set of keywords in lowercased text.
+
+    Small keyword sets are checked with C-level substring searches in list
+    order; large sets are compiled into a single trie-shaped regex so the
+    text is scanned once regardless of how many keywords there are.
+    """
+
+    def __init__(self, keywords, threshold=REGEX_THRESHOLD):
+        # dict.fromkeys keeps the first occurrence of each keyword, in order.
+        self.keywords = tuple(dict.fromkeys(k.lower() for k in keywords if k))
+        self._regex = compile_keywords(self.keywords) if len(self.keywords) > threshold else None
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def search(self, text):
+        """Returns the matched keyword, or None."""
+        if self._regex is not None:
+            match = self._regex.search(text)
+            return match.group() if match else None
+        for keyword in self.keywords:
+            if keyword in text:
+                return keyword
+        return None
+
+
+def extract_address(sender):
+    """
+    Pulls the lowercased address out of a From header such as "Boss <boss@example.com>".
+
+    This is a cheap string slice rather than a full RFC 5322 parse, which is far
+    too slow to run on every message.
+    """
+    start = sender.rfind('<')
+    if start != -1:
+        end = sender.find('>', start)
+        sender = sender[start + 1:end] if end != -1 else sender[start + 1:]
+    return sender.strip().lower()
+
+
+class SenderIndex:
+    """
+    Hashed lookup of sender addresses and domains.
+
+    Entries containing a local part (e.g. "boss@example.com") match that exact
+    address. Entries without one ("example.com" or "@example.com") match the
+    domain and all of its subdomains. A lookup costs one hash probe for the
+    address plus one per domain label, however many entries there are.
+    """
+
+    def __init__(self, entries):
+        self.addresses = set()
+        self.domains = set()
+        for entry in entries:
+            entry = entry.strip().lower()
+            if not entry:
+                continue
+            local, _, domain = entry.rpartition('@')
+            if local:
+                self.addresses.add(entry)
+            else:
+                self.domains.add(domain)
+
+    def __bool__(self):
+        return bool(self.addresses or self.domains)
+
+    def __len__(self):
+        return len(self.addresses) + len(self.domains)
+
+    def lookup(self, sender):
+        """
+        Matches a From header (e.g. "Boss <boss@example.com>") against the index.
+
+        Returns:
+            str: The matching address or domain entry, or None.
+        """
+        return self.lookup_address(extract_address(sender))
+
+    def lookup_address(self, address):
+        """Like lookup(), for an already parsed and lowercased address."""
+        if not address:
+            return None
+        if address in self.addresses:
+            return address
+        domain = address.rpartition('@')[2]
+        # Walk the domain suffixes: mail.corp.example.com -> corp.example.com -> example.com
+        while domain:
+            if domain in self.domains:
+                return domain
+            domain = domain.partition('.')[2]
+        return None
+
+
+class RuleEngine:
+    """
+    Classifies emails using the agent's rule cascade, compiled at load time.
+
+    Rules are applied in priority order:
+      1. important sender             -> IMPORTANT
+      2. blocked sender               -> SPAM
+      3. important keyword in subject -> IMPORTANT
+      4. meeting keyword in subject or body -> MEETING_REQUEST
+      5. spam keyword in subject or body    -> SPAM
+      6. otherwise                    -> NORMAL
+
+    Args:
+        important_senders (list): VIP addresses or domains (see SenderIndex).
+        important_keywords (list): Keywords that mark the subject as important.
+        meeting_keywords (list): Keywords that indicate a meeting request.
+        spam_keywords (list): Keywords that indicate spam.
+        blocked_senders (list, optional): Blocklisted addresses or domains.
+    """
+
+    def __init__(self, important_senders, important_keywords, meeting_keywords, spam_keywords,
+                 blocked_senders=()):
+        self._senders = SenderIndex(important_senders)
+        self._blocked_senders = SenderIndex(blocked_senders)
+        self._subject_keywords = KeywordMatcher(important_keywords)
+        self._meeting_keywords = KeywordMatcher(meeting_keywords)
+        self._spam_keywords = KeywordMatcher(spam_keywords)
+
+    def _header_rules(self, email_data, subject):
+        """Rules 1-3, which only need the sender and the (lowercased) subject."""
+        if self._senders or self._blocked_senders:
+            # An EmailRecord carries its sender's address already parsed.
+            address = getattr(email_data, 'sender_address', None)
+            if address is None:
+                address = extract_address(email_data.get('sender') or '')
+            entry = self._senders.lookup_address(address)
+            if entry:
+                return Classification("IMPORTANT", f"sender:{entry}")
+            entry = self._blocked_senders.lookup_address(address)
+            if entry:
+                return Classification("SPAM", f"blocked:{entry}")
+
+        keyword = self._subject_keywords.search(subject)
+        if keyword:
+            return Classification("IMPORTANT", f"subject:{keyword}")
+        return None
+
+    def classify_headers(self, email_data):
+        """
+        The cheap part of classify(): the sender and subject rules, without reading the body.
+
+        Rules 1-3 give the same result as classify(). A meeting keyword in the
+        subject gives MEETING_REQUEST, the category classify() returns too,
+        though classify() may name a different keyword as the rule.
+
+        Args:
+            email_data (dict): An EmailRecord, or a dictionary with 'sender' and 'subject' keys.
+
+        Returns:
+            Classification: The category the headers decide, or None if it depends on the body.
+        """
+        subject = (email_data.get('subject') or '').lower()
+        classification = self._header_rules(email_data, subject)
+        if classification is not None:
+            return classification
+        keyword = self._meeting_keywords.search(subject)
+        if keyword:
+            return Classification("MEETING_REQUEST", f"meeting:{keyword}")
+        return None
+
+    def classify(self, email_data):
+        """
+        Classifies a single email.
+
+        Args:
+            email_data (dict): An EmailRecord, or a dictionary with 'sender', 'subject' and 'body' keys.
+
+        Returns:
+            Classification: The category and the rule that matched.
+        """
+        subject = (email_data.get('subject') or '').lower()
+        classification = self._header_rules(email_data, subject)
+        if classification is not None:
+            return classification
+
+        if self._meeting_keywords or self._spam_keywords:
+            # The body is only read and lowercased once the header rules have not decided.
+            text = f"{subject}\n{(email_data.get('body') or '').lower()}"
+            keyword = self._meeting_keywords.search(text)
+            if keyword:
+                return Classification("MEETING_REQUEST", f"meeting:{keyword}")
+            keyword = self._spam_keywords.search(text)
+            if keyword:
+                return Classification("SPAM", f"spam:{keyword}")
+
+        return DEFAULT_CLASSIFICATION
+
+    def classify_many(self, emails):
+        """
+        Classifies a batch of emails.
+
+        Args:
+            emails (iterable): EmailRecords or email dictionaries.
+
+        Returns:
+            list: One Classification per email, in the same order.
+        """
+        classify = self.classify
+        return [classify(email_data) for email_data in emails]
@@ -0,0 +1,118 @@
+# agent_core/rule_store.py
+# Loads the classification rules (VIP senders, blocklist, keyword lists) from a
+# JSON file and hot-reloads them when the file changes, without a restart.
+#
+# Example rules file:
+# {
+#     "important_senders": ["boss@example.com", "vip-client.com"],
+#     "blocked_senders": ["@spammy-domain.biz"],
+#     "important_keywords": ["urgent", "action required"],
+#     "meeting_keywords": ["meeting", "schedule"],
+#     "spam_keywords": ["winner", "claim your prize"]
+# }
+
+import json
+import logging
+import os
+import threading
+from agent_core.rule_engine import RuleEngine
+
+logger = logging.getLogger(__name__)
+
+RULE_LISTS = ('important_senders', 'blocked_senders', 'important_keywords',
+              'meeting_keywords', 'spam_keywords')
+
+
+def build_engine(rules):
+    """Compiles a rules dictionary (see RULE_LISTS) into a RuleEngine."""
+    return RuleEngine(
+        important_senders=rules.get('important_senders', []),
+        important_keywords=rules.get('important_keywords', []),
+        meeting_keywords=rules.get('meeting_keywords', []),
+        spam_keywords=rules.get('spam_keywords', []),
+        blocked_senders=rules.get('blocked_senders', []),
+    )
+
+
+class RuleStore:
+    """
+    Holds the current RuleEngine and swaps in a new one when the rules file changes.
+
+    Reloading parses and compiles the new rules completely before replacing the
+    engine reference, so classifiers always see either the old or the new rule
+    set, never a mix. A broken file is reported and the previous rules are kept.
+
+    Args:
+        path (str): Path of the JSON rules file. It does not need to exist.
+        defaults (dict): Rule lists used for any list the file does not define.
+        check_interval (float): Seconds between mtime checks of the watcher thread.
+    """
+
+    def __init__(self, path, defaults=None, check_interval=5.0):
+        self.path = path
+        self.defaults = dict(defaults or {})
+        self.check_interval = check_interval
+        self._signature = None
+        self._engine = build_engine(self.defaults)
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self.maybe_reload()
+
+    @property
+    def engine(self):
+        """The RuleEngine compiled from the latest successfully loaded rules."""
+        return self._engine
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def maybe_reload(self):
+        """
+        Reloads the rules if the file's mtime or size changed since the last load.
+
+        Returns:
+            bool: True if a new rule set was swapped in.
+        """
+        with self._reload_lock:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+
+            rules = dict(self.defaults)
+            if signature is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        loaded = json.load(f)
+                    rules.update({name: loaded[name] for name in RULE_LISTS if name in loaded})
+                except (OSError, ValueError) as e:
+                    logger.warning("Could not load rules from %s: %s. Keeping current rules.", self.path, e)
+                    return False
+
+            self._engine = build_engine(rules)
+            self._signature = signature
+            if signature is not None:
+                counts = ', '.join(f"{name}={len(rules.get(name, []))}" for name in RULE_LISTS)
+                logger.info("Loaded classification rules from %s (%s).", self.path, counts)
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            self.maybe_reload()
+
+    def start_watching(self):
+        """Starts a background thread that reloads the rules whenever the file changes."""
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name='rule-store-watcher', daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
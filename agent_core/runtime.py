@@ -0,0 +1,279 @@
+# agent_core/runtime.py
+# Hosts many mailboxes in one process, or spread over a few worker processes.
+# Each mailbox has its own OAuth token, sync state, ledger, knowledge index and rule
+# set; the mailboxes of a process share one action worker pool, the request governor
+# and the discovery cache, and take turns on a fixed number of cycle workers.
+#
+# Example mailboxes file:
+# {
+#     "mailboxes": [
+#         {"name": "support", "supervisor": "lead@example.com"},
+#         {"name": "sales", "token_file": "credentials/sales.json", "rules_file": "rules/sales.json"}
+#     ]
+# }
+#
+# Run with: python -m agent_core.runtime [mailboxes.json] [--processes N]
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    SUPERVISOR_EMAIL,
+    RULES_FILE,
+    RULES_RELOAD_SECONDS,
+    POLL_MIN_SECONDS,
+    POLL_MAX_SECONDS,
+    WAKEUP_PORT,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    METRICS_PORT,
+    TRACE_SAMPLE_RATE,
+    MAX_ACTION_WORKERS,
+    MAILBOXES_FILE,
+    MAILBOX_TOKEN_DIR,
+    MAILBOX_STATE_DIR,
+    MAILBOX_CYCLE_WORKERS,
+    RUNTIME_PROCESSES,
+)
+from agent_core.decision_maker import DEFAULT_RULES
+from agent_core.logging_config import configure_logging
+from agent_core.main_agent import Agent
+from agent_core.metrics import MetricsServer, tracer
+from agent_core.rule_store import RuleStore
+from agent_core.scheduler import PollScheduler, WakeupListener
+from integrations.auth_service import register_mailbox
+
+logger = logging.getLogger(__name__)
+
+# One hosted mailbox. Paths left out of the mailboxes file get per-mailbox defaults.
+Mailbox = namedtuple('Mailbox', ['name', 'token_file', 'rules_file', 'supervisor', 'state_dir'])
+
+# Mailbox names become file names, so they are kept to a safe character set.
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._@-]*$")
+
+
+def load_mailboxes(path=MAILBOXES_FILE):
+    """
+    Reads the mailboxes file.
+
+    Args:
+        path (str): A JSON file with a "mailboxes" list (or just the list).
+
+    Returns:
+        list: Mailbox tuples.
+
+    Raises:
+        ValueError: If a mailbox has no valid name or a name is used twice.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    entries = data.get('mailboxes', []) if isinstance(data, dict) else data
+
+    mailboxes = []
+    seen = set()
+    for entry in entries:
+        name = entry.get('name', '')
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid mailbox name in {path}: {name!r}")
+        if name in seen:
+            raise ValueError(f"Mailbox {name} is listed twice in {path}.")
+        seen.add(name)
+        mailboxes.append(Mailbox(
+            name=name,
+            token_file=entry.get('token_file') or os.path.join(MAILBOX_TOKEN_DIR, f"{name}.json"),
+            rules_file=entry.get('rules_file') or RULES_FILE,
+            supervisor=entry.get('supervisor') or SUPERVISOR_EMAIL,
+            state_dir=entry.get('state_dir') or os.path.join(MAILBOX_STATE_DIR, name),
+        ))
+    return mailboxes
+
+
+class MailboxRuntime:
+    """
+    Runs the cycles of many mailboxes on a bounded number of worker threads.
+
+    Every mailbox keeps its own adaptive poll interval (see PollScheduler).
+    Whenever a worker is free, the mailbox that has been due the longest runs
+    next, so a busy mailbox polled every few seconds cannot starve a quiet one,
+    and no mailbox ever runs two cycles at once.
+
+    Args:
+        mailboxes (list): Mailbox tuples, e.g. from load_mailboxes().
+        workers (int): Mailbox cycles that may run at the same time.
+        action_workers (int): Size of the action worker pool all mailboxes share.
+    """
+
+    def __init__(self, mailboxes, workers=MAILBOX_CYCLE_WORKERS, action_workers=MAX_ACTION_WORKERS):
+        self.workers = max(1, workers)
+        self._action_pool = ThreadPoolExecutor(max_workers=action_workers, thread_name_prefix='agent-action')
+        self.agents = {}
+        self.rules = {}
+        self.schedulers = {}
+        # Rule sets are shared by mailboxes that use the same rules file.
+        rule_stores = {}
+        for mailbox in mailboxes:
+            register_mailbox(mailbox.name, mailbox.token_file)
+            os.makedirs(mailbox.state_dir, exist_ok=True)
+            rules = rule_stores.get(mailbox.rules_file)
+            if rules is None:
+                rules = rule_stores[mailbox.rules_file] = RuleStore(
+                    mailbox.rules_file, defaults=DEFAULT_RULES, check_interval=RULES_RELOAD_SECONDS)
+            self.rules[mailbox.name] = rules
+            self.agents[mailbox.name] = Agent(
+                state_file=os.path.join(mailbox.state_dir, 'state.json'),
+                ledger_file=os.path.join(mailbox.state_dir, 'ledger.sqlite3'),
+                knowledge_file=os.path.join(mailbox.state_dir, 'knowledge.sqlite3'),
+                mailbox=mailbox.name, rules=rules, supervisor=mailbox.supervisor,
+                action_pool=self._action_pool)
+            self.schedulers[mailbox.name] = PollScheduler(POLL_MIN_SECONDS, POLL_MAX_SECONDS,
+                                                          initial_interval=POLL_MIN_SECONDS)
+
+        self._condition = threading.Condition()
+        # Monotonic time each mailbox is next due; everything is due at start-up.
+        self._due = {name: 0.0 for name in self.agents}
+        self._running = set()
+        self._stopping = False
+
+    def wake(self, reason='wake-up', mailbox=None):
+        """
+        Makes one mailbox (or all of them) due at once. Safe to call from any thread,
+        and usable as the `scheduler` of a WakeupListener.
+        """
+        with self._condition:
+            for name in ([mailbox] if mailbox is not None else list(self._due)):
+                if name in self._due:
+                    self._due[name] = 0.0
+                    # Something is waiting; poll at the short interval until things quieten down.
+                    self.schedulers[name].interval = self.schedulers[name].min_interval
+            self._condition.notify_all()
+        logger.info("Woken %s: %s", mailbox or 'all mailboxes', reason)
+
+    def stop(self):
+        """Makes run() return once the cycles in progress have finished."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def _next_batch(self):
+        """Blocks until at least one mailbox is due and a worker is free; returns the mailboxes to start."""
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                free = self.workers - len(self._running)
+                idle = sorted((due, name) for name, due in self._due.items() if name not in self._running)
+                ready = [name for due, name in idle if due <= now][:max(free, 0)]
+                if ready:
+                    self._running.update(ready)
+                    return ready
+                timeout = idle[0][0] - now if idle and free > 0 else None
+                self._condition.wait(timeout)
+            return []
+
+    def _run_one(self, name):
+        found = 0
+        try:
+            self.rules[name].maybe_reload()
+            found = self.agents[name].run_cycle()
+        except Exception:
+            logger.exception("Cycle of mailbox %s failed.", name)
+        interval = self.schedulers[name].record(found)
+        with self._condition:
+            self._running.discard(name)
+            self._due[name] = time.monotonic() + interval
+            self._condition.notify_all()
+
+    def run(self):
+        """Runs mailbox cycles until stop() is called (or Ctrl+C)."""
+        logger.info("Serving %d mailbox(es) with %d cycle worker(s).", len(self.agents), self.workers)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mailbox-cycle') as cycles:
+            try:
+                while True:
+                    batch = self._next_batch()
+                    if not batch:
+                        break
+                    for name in batch:
+                        cycles.submit(self._run_one, name)
+            except KeyboardInterrupt:
+                logger.info("--- Runtime stopped by user. Finishing running cycles... ---")
+                self.stop()
+
+    def close(self):
+        for agent in self.agents.values():
+            agent.close()
+        self._action_pool.shutdown(wait=True)
+
+
+def serve(mailboxes, metrics_port=METRICS_PORT, wakeup_port=WAKEUP_PORT):
+    """
+    Runs a MailboxRuntime in this process, with its metrics endpoint and wake-up listener.
+
+    Args:
+        mailboxes (list): The Mailbox tuples this process serves.
+        metrics_port (int): Port of the metrics endpoint; 0 disables it.
+        wakeup_port (int): Port of the wake-up listener; 0 disables it.
+    """
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    tracer.sample_rate = TRACE_SAMPLE_RATE
+    runtime = MailboxRuntime(mailboxes)
+
+    servers = []
+    if metrics_port:
+        servers.append(MetricsServer(metrics_port))
+    if wakeup_port:
+        servers.append(WakeupListener(runtime, wakeup_port))
+    for server in list(servers):
+        try:
+            server.start()
+        except OSError as e:
+            logger.warning("Could not start %s: %s", type(server).__name__, e)
+            servers.remove(server)
+
+    try:
+        runtime.run()
+    finally:
+        for server in servers:
+            server.stop()
+        runtime.close()
+
+
+def run_process_pool(mailboxes, processes=RUNTIME_PROCESSES):
+    """
+    Spreads the mailboxes over worker processes, each running serve() on its share.
+
+    Process i serves its metrics and wake-up listener on the configured ports plus i.
+    """
+    processes = max(1, min(processes, len(mailboxes)))
+    if processes == 1:
+        serve(mailboxes)
+        return
+
+    workers = []
+    for i in range(processes):
+        shard = mailboxes[i::processes]
+        worker = multiprocessing.Process(
+            target=serve, name=f"agent-runtime-{i}",
+            args=(shard, METRICS_PORT + i if METRICS_PORT else 0, WAKEUP_PORT + i if WAKEUP_PORT else 0))
+        worker.start()
+        workers.append(worker)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # The workers received the same Ctrl+C and are finishing their cycles.
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the agent for many mailboxes.")
+    parser.add_argument('mailboxes_file', nargs='?', default=MAILBOXES_FILE)
+    parser.add_argument('--processes', type=int, default=RUNTIME_PROCESSES)
+    args = parser.parse_args()
+    run_process_pool(load_mailboxes(args.mailboxes_file), args.processes)
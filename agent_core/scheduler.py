@@ -0,0 +1,180 @@
+# agent_core/scheduler.py
+# Decides when the main loop polls the mailbox next.
+# The interval shrinks while mail keeps arriving and grows while the inbox is
+# idle, and a local wake-up socket lets a push notification trigger a poll at once.
+
+import json
+import logging
+import socket
+import socketserver
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """
+    An adaptive poll interval with an external wake-up trigger.
+
+    After a cycle that found new mail the interval is halved (down to
+    `min_interval`); after an idle cycle it grows by `backoff` (up to
+    `max_interval`). `wake()` ends the current wait early.
+
+    Args:
+        min_interval (float): Shortest wait between polls, in seconds.
+        max_interval (float): Longest wait between polls, in seconds.
+        initial_interval (float, optional): The first wait. Defaults to max_interval.
+        backoff (float): Factor the interval grows by after an idle cycle.
+    """
+
+    def __init__(self, min_interval, max_interval, initial_interval=None, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = self._clamp(initial_interval if initial_interval is not None else max_interval)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._reason = None
+
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def record(self, new_messages):
+        """
+        Adapts the interval to the outcome of a poll.
+
+        Args:
+            new_messages (int): How many new messages the poll returned.
+
+        Returns:
+            float: The interval until the next poll.
+        """
+        if new_messages:
+            self.interval = self._clamp(self.interval / 2)
+        else:
+            self.interval = self._clamp(self.interval * self.backoff)
+        return self.interval
+
+    def wake(self, reason='wake-up'):
+        """Makes the current (or next) wait return straight away. Safe to call from any thread."""
+        with self._lock:
+            self._reason = reason
+            self._wakeup.set()
+
+    def wait(self):
+        """
+        Blocks until the interval has passed or `wake()` is called.
+
+        Returns:
+            str: The wake-up reason, or None if the interval simply ran out.
+        """
+        self._wakeup.wait(self.interval)
+        with self._lock:
+            # Checked under the lock, so a wake-up that races with the timeout is not lost.
+            reason, self._reason = self._reason, None
+            self._wakeup.clear()
+        if reason is not None:
+            # Something is waiting; poll at the short interval until things quieten down.
+            self.interval = self.min_interval
+            return reason
+        return None
+
+
+class _WakeupHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(4096).decode('utf-8', errors='replace').strip()
+        reason = 'wake-up'
+        if line.startswith('{'):
+            # A Gmail push notification payload: {"emailAddress": ..., "historyId": ...}
+            try:
+                notification = json.loads(line)
+                reason = f"push notification (historyId {notification.get('historyId')})"
+            except ValueError:
+                pass
+        elif line:
+            reason = line[:100]
+        self.server.scheduler.wake(reason)
+        self.wfile.write(b"ok\n")
+
+
+class WakeupListener:
+    """
+    Listens on a local TCP socket and wakes the scheduler for every connection.
+
+    A client sends one line: any text (used as the wake-up reason) or a Gmail
+    push notification JSON payload, e.g. relayed from a Pub/Sub subscriber.
+    The listener only binds to localhost by default.
+
+    Args:
+        scheduler (PollScheduler): The scheduler to wake.
+        port (int): The TCP port; 0 picks a free one (see `address`).
+        host (str): The interface to bind to.
+    """
+
+    def __init__(self, scheduler, port, host='127.0.0.1'):
+        self.scheduler = scheduler
+        self._server = socketserver.ThreadingTCPServer((host, port), _WakeupHandler,
+                                                       bind_and_activate=False)
+        self._server.daemon_threads = True
+        self._server.allow_reuse_address = True
+        self._server.scheduler = scheduler
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def start(self):
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = threading.Thread(target=self._server.serve_forever, name='wakeup-listener',
+                                        daemon=True)
+        self._thread.start()
+        logger.info("Listening for wake-up triggers on %s:%s.", self.address[0], self.address[1])
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+
+def send_wakeup(port, host='127.0.0.1', message='wake-up', timeout=5.0):
+    """
+    Triggers an immediate poll of a running agent.
+
+    Args:
+        port (int): The agent's wake-up port.
+        host (str): The agent's host.
+        message (str or dict): A reason, or a push notification payload.
+
+    Returns:
+        bool: True if the agent acknowledged the trigger.
+    """
+    if isinstance(message, dict):
+        message = json.dumps(message)
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as connection:
+            connection.sendall(message.encode('utf-8') + b"\n")
+            return connection.recv(16).startswith(b"ok")
+    except OSError as e:
+        logger.warning("Could not reach the agent on %s:%s: %s", host, port, e)
+        return False
+
+
+# This block allows you to run this file directly for testing.
+if __name__ == '__main__':
+    print("--- Running Poll Scheduler Test ---")
+    scheduler = PollScheduler(min_interval=0.5, max_interval=5, initial_interval=2)
+    listener = WakeupListener(scheduler, port=0)
+    listener.start()
+    for found in (3, 0, 0):
+        print(f"Found {found} message(s); next poll in {scheduler.record(found):.2f}s")
+    threading.Timer(0.2, send_wakeup, args=(listener.address[1],),
+                    kwargs={'message': {'emailAddress': 'me@example.com', 'historyId': 1234}}).start()
+    started = time.monotonic()
+    reason = scheduler.wait()
+    print(f"Woken after {time.monotonic() - started:.2f}s by: {reason}")
+    listener.stop()
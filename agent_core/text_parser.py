@@ -1,66 +1,309 @@
 # agent_core/text_parser.py
 # A simple module to parse text for specific details using regular expressions.
+# All patterns are compiled once at import time and the text is scanned in a
+# single pass, collecting the first summary, date, time and duration it finds.
 
 import re
 from datetime import datetime, timedelta
+from config import DATE_DAY_FIRST
 
-def parse_meeting_details(text):
+WEEKDAYS = {
+    'mon': 0, 'monday': 0, 'tue': 1, 'tues': 1, 'tuesday': 1, 'wed': 2, 'wednesday': 2,
+    'thu': 3, 'thur': 3, 'thurs': 3, 'thursday': 3, 'fri': 4, 'friday': 4,
+    # No "sat"/"sun" abbreviations: they are far more often ordinary words.
+    'saturday': 5, 'sunday': 6,
+}
+
+MONTHS = {
+    'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3, 'apr': 4, 'april': 4,
+    'may': 5, 'jun': 6, 'june': 6, 'jul': 7, 'july': 7, 'aug': 8, 'august': 8,
+    'sep': 9, 'sept': 9, 'september': 9, 'oct': 10, 'october': 10, 'nov': 11, 'november': 11,
+    'dec': 12, 'december': 12,
+}
+
+# Month names that are also common words ("we may 5 people", "a scratch may mar it").
+# They only count as months with a day suffix ("May 5th"), a year ("May 5, 2026"),
+# an "on"/"of" in front ("on May 5", "5th of May"), or a time, "at" or meeting word
+# after the day ("May 5 at 3pm", "May 5 2pm", "May 5 meeting"), like "sat"/"sun" above.
+AMBIGUOUS_MONTHS = {'may', 'mar'}
+_UNAMBIGUOUS_MONTHS = MONTHS.keys() - AMBIGUOUS_MONTHS
+
+
+def _words(names):
+    # Longest first, so "thursday" is preferred over "thu".
+    return '|'.join(sorted(names, key=len, reverse=True))
+
+
+_MERIDIEM = r"[ap]\.?m\b\.?"
+_CLOCK = r"\d{1,2}(?::\d{2})?"
+# What may follow "<ambiguous month> <day>" for it to count as a date.
+_AMBIGUOUS_DATE_FOLLOWER = (
+    r",?\s+(?:at\b|@|from\b|" + _CLOCK + r"\s*" + _MERIDIEM + r"|\d{1,2}:\d{2}\b|(?:noon|midday|midnight)\b"
+    r"|(?:meeting|call|sync)\b)"
+)
+
+# Cheap lookahead tried at every word start before the full alternation. Most
+# words in an email cannot begin a token, so they are rejected here in one step.
+_TOKEN_START = (
+    r"\b(?:\d|meeting|discuss|topic|day|to(?:day|morrow|night)|next|noon|mid(?:day|night)|for|"
+    + _words({name[:3] for name in WEEKDAYS} | {name[:3] for name in MONTHS}) + ")"
+)
+
+# One master pattern; each alternative is a named token. Dates come before times
+# so that "2025-06-11" is not mistaken for a time range. It is written in lower
+# case and run over lower-cased text, which is much faster than IGNORECASE.
+_MEETING_TOKEN_PATTERN = r"(?=" + _TOKEN_START + r""")(?:
+    (?:meeting\s+about|discuss|topic:)\s*['"]?(?=(?P<summary>[^'"\n]+))
+  | \b(?P<iso_date>(?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2}))\b
+  | \b(?P<num_date>(?P<num_a>\d{1,2})/(?P<num_b>\d{1,2})(?:/(?P<num_y>\d{2,4}))?)\b
+  | \b(?P<month_date>(?P<md_month>""" + _words(_UNAMBIGUOUS_MONTHS) + r""")\.?\s+(?P<md_day>\d{1,2})(?:st|nd|rd|th)?
+        (?:,?\s+(?P<md_year>\d{4}))?)\b
+  | \b(?P<day_month>(?P<dm_day>\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<dm_month>""" + _words(_UNAMBIGUOUS_MONTHS) + r""")
+        (?:,?\s+(?P<dm_year>\d{4}))?)\b
+  | \b(?P<amb_month_date>(?:(?<=\bon\s)|(?=(?:""" + _words(AMBIGUOUS_MONTHS) + r""")\.?\s+\d{1,2}
+            (?:st|nd|rd|th|,?\s+\d{4}\b|""" + _AMBIGUOUS_DATE_FOLLOWER + r""")))
+        (?P<amd_month>""" + _words(AMBIGUOUS_MONTHS) + r""")\.?\s+(?P<amd_day>\d{1,2})(?:st|nd|rd|th)?
+        (?:,?\s+(?P<amd_year>\d{4}))?)\b
+  | \b(?P<amb_day_month>(?:(?<=\bon\s)|(?=\d{1,2}(?:st|nd|rd|th|\s+of\s|\s+(?:""" + _words(AMBIGUOUS_MONTHS) + r"""),?\s+\d{4}\b)))
+        (?P<adm_day>\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<adm_month>""" + _words(AMBIGUOUS_MONTHS) + r""")
+        (?:,?\s+(?P<adm_year>\d{4}))?)\b
+  | \b(?P<relative>day\s+after\s+tomorrow|tomorrow|today|tonight)\b
+  | \b(?P<weekday>(?P<wd_next>next\s+)?(?P<wd_name>""" + _words(WEEKDAYS) + r"""))\b
+  | \b(?P<range>(?P<r_start>""" + _CLOCK + r""")\s*(?P<r_start_mer>""" + _MERIDIEM + r""")?
+        \s*(?:-|–|to|until|till)\s*
+        (?P<r_end>""" + _CLOCK + r""")\s*(?P<r_end_mer>""" + _MERIDIEM + r""")?)
+  | \b(?P<time>(?P<t_clock>""" + _CLOCK + r""")\s*(?P<t_mer>""" + _MERIDIEM + r""")|(?P<t_24h>\d{1,2}:\d{2})\b)
+  | \b(?P<named_time>noon|midday|midnight)\b
+  | \bfor\s+(?P<duration>(?P<dur_value>\d+(?:\.\d+)?|an?|half\s+an)\s*
+        (?P<dur_unit>hours?|hrs?|h|minutes?|mins?|m)\b)
+    )"""
+MEETING_TOKEN_RE = re.compile(_MEETING_TOKEN_PATTERN, re.VERBOSE)
+# Used for the rare text whose length changes when lower-cased (e.g. "İ").
+_MEETING_TOKEN_RE_ANYCASE = re.compile(_MEETING_TOKEN_PATTERN, re.VERBOSE | re.IGNORECASE)
+
+DEFAULT_DURATION = timedelta(hours=1)
+
+
+def _clock_to_minutes(clock, meridiem):
+    """Converts "2", "10:30" plus an optional am/pm into minutes after midnight, or None."""
+    hour, _, minute = clock.partition(':')
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        is_pm = meridiem[0].lower() == 'p'
+        if hour == 12:
+            hour = 12 if is_pm else 0  # 12 PM is noon, 12 AM is midnight
+        elif is_pm:
+            hour += 12
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return hour * 60 + minute
+
+
+def _time_range(match):
+    """Resolves a range like "2-3pm", "11 to 1pm" or "14:00-15:30" into minutes, or None."""
+    start_mer, end_mer = match.group('r_start_mer'), match.group('r_end_mer')
+    start_clock, end_clock = match.group('r_start'), match.group('r_end')
+    if not (start_mer or end_mer or (':' in start_clock and ':' in end_clock)):
+        # A bare "1-2" is far more likely to be a list number or score than a time.
+        return None
+    end = _clock_to_minutes(end_clock, end_mer)
+    if end is None:
+        return None
+    if start_mer or not end_mer:
+        start = _clock_to_minutes(start_clock, start_mer)
+    else:
+        # "2-3pm": the start shares the end's meridiem unless that puts it after the end.
+        start = _clock_to_minutes(start_clock, end_mer)
+        if start is None or start >= end:
+            start = _clock_to_minutes(start_clock, 'am' if end_mer[0].lower() == 'p' else 'pm')
+    if start is None:
+        return None
+    return start, end
+
+
+def _duration(match):
+    value, unit = match.group('dur_value').lower(), match.group('dur_unit').lower()
+    if value in ('a', 'an'):
+        amount = 1.0
+    elif value.startswith('half'):
+        amount = 0.5
+    else:
+        amount = float(value)
+    minutes = amount * 60 if unit.startswith('h') else amount
+    return timedelta(minutes=minutes) if minutes > 0 else None
+
+
+class MeetingExtractor:
+    """
+    Extracts meeting details (summary, date, start and end time) from free text.
+
+    Understands relative days ("today", "tomorrow"), weekdays ("next Friday"),
+    explicit dates ("2025-06-11", "11/06", "June 11th", "11 June 2025"),
+    12h and 24h times ("2pm", "14:30", "noon"), ranges ("2-3pm", "14:00-15:30")
+    and durations ("for 30 minutes").
+
+    Args:
+        clock (callable, optional): Returns the reference "now". Defaults to datetime.now.
+        day_first (bool): Whether "11/06" means 11 June (True) or November 6 (False).
+            Defaults to DATE_DAY_FIRST in config.py.
+        default_duration (timedelta): Meeting length when no end time or duration is given.
+    """
+
+    def __init__(self, clock=datetime.now, day_first=DATE_DAY_FIRST, default_duration=DEFAULT_DURATION):
+        self.clock = clock
+        self.day_first = day_first
+        self.default_duration = default_duration
+
+    def _explicit_date(self, year, month, day, today):
+        """Builds a date; without a year, the next occurrence on or after today is used."""
+        try:
+            if year is not None:
+                year = int(year)
+                if year < 100:
+                    year += 2000
+                return today.replace(year=year, month=int(month), day=int(day))
+            candidate = today.replace(month=int(month), day=int(day))
+            if candidate < today:
+                candidate = candidate.replace(year=today.year + 1)
+            return candidate
+        except ValueError:
+            return None
+
+    def _resolve_date(self, match, today):
+        if match.group('relative'):
+            word = match.group('relative').lower()
+            if word.startswith('day'):
+                return today + timedelta(days=2)
+            return today + timedelta(days=1) if word == 'tomorrow' else today
+        if match.group('weekday'):
+            target = WEEKDAYS[match.group('wd_name').lower()]
+            days_ahead = (target - today.weekday()) % 7
+            if match.group('wd_next') and days_ahead == 0:
+                days_ahead = 7
+            return today + timedelta(days=days_ahead)
+        if match.group('iso_date'):
+            return self._explicit_date(match.group('iso_y'), match.group('iso_m'),
+                                       match.group('iso_d'), today)
+        if match.group('num_date'):
+            a, b = match.group('num_a'), match.group('num_b')
+            day, month = (a, b) if self.day_first else (b, a)
+            return self._explicit_date(match.group('num_y'), month, day, today)
+        if match.group('month_date'):
+            return self._explicit_date(match.group('md_year'), MONTHS[match.group('md_month').lower()],
+                                       match.group('md_day'), today)
+        if match.group('day_month'):
+            return self._explicit_date(match.group('dm_year'), MONTHS[match.group('dm_month').lower()],
+                                       match.group('dm_day'), today)
+        if match.group('amb_month_date'):
+            return self._explicit_date(match.group('amd_year'), MONTHS[match.group('amd_month').lower()],
+                                       match.group('amd_day'), today)
+        if match.group('amb_day_month'):
+            return self._explicit_date(match.group('adm_year'), MONTHS[match.group('adm_month').lower()],
+                                       match.group('adm_day'), today)
+        return None
+
+    def extract(self, text):
+        """
+        Extracts meeting details from text in a single scan.
+
+        Args:
+            text (str): The text content of an email (subject and body combined).
+
+        Returns:
+            dict: 'summary', 'start_time' and 'end_time', or None if no date and time were found.
+        """
+        summary = None
+        meeting_date = None
+        start_minutes = end_minutes = None
+        duration = None
+        today = None
+
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            matches = MEETING_TOKEN_RE.finditer(lowered)
+        else:
+            matches = _MEETING_TOKEN_RE_ANYCASE.finditer(text)
+
+        for match in matches:
+            if match.group('summary') is not None:
+                if summary is None:
+                    # Taken from the original text to keep its capitalisation.
+                    summary = text[match.start('summary'):match.end('summary')].strip()
+            elif match.group('range') or match.group('time') or match.group('named_time'):
+                if start_minutes is not None:
+                    continue
+                if match.group('range'):
+                    resolved = _time_range(match)
+                    if resolved:
+                        start_minutes, end_minutes = resolved
+                elif match.group('named_time'):
+                    start_minutes = 0 if match.group('named_time').lower() == 'midnight' else 12 * 60
+                elif match.group('t_24h'):
+                    start_minutes = _clock_to_minutes(match.group('t_24h'), None)
+                else:
+                    start_minutes = _clock_to_minutes(match.group('t_clock'), match.group('t_mer'))
+            elif match.group('duration'):
+                if duration is None:
+                    duration = _duration(match)
+            elif meeting_date is None:
+                if today is None:
+                    today = self.clock().replace(hour=0, minute=0, second=0, microsecond=0)
+                meeting_date = self._resolve_date(match, today)
+
+            if (summary is not None and meeting_date is not None
+                    and start_minutes is not None and (duration or end_minutes is not None)):
+                break  # Everything has been found; no need to scan the rest.
+
+        if meeting_date is None or start_minutes is None:
+            # Return None if not enough details could be parsed
+            return None
+
+        start_time = meeting_date + timedelta(minutes=start_minutes)
+        if end_minutes is not None:
+            end_time = meeting_date + timedelta(minutes=end_minutes)
+            if end_time <= start_time:
+                end_time += timedelta(days=1)  # e.g. "11pm-1am"
+        else:
+            end_time = start_time + (duration or self.default_duration)
+
+        return {'summary': summary or "Meeting", 'start_time': start_time, 'end_time': end_time}
+
+    def extract_many(self, texts):
+        """
+        Extracts meeting details from many texts.
+
+        Args:
+            texts (iterable): Text strings.
+
+        Returns:
+            list: One result (dict or None) per text, in the same order.
+        """
+        extract = self.extract
+        return [extract(text) for text in texts]
+
+
+# Shared extractor using the wall clock.
+_default_extractor = MeetingExtractor()
+
+
+def meeting_text(email_data):
+    """The text meeting details are looked for in: an email's subject, then its body."""
+    return f"{email_data.get('subject') or ''}\n{email_data.get('body') or ''}"
+
+
+def parse_meeting_details(text, now=None):
     """
     A simple parser to extract meeting details (summary, date, time) from text.
-    This is a basic implementation and can be significantly improved with more
-    advanced NLP techniques.
 
     Args:
         text (str): The text content of an email (subject and body combined).
+        now (datetime, optional): Reference time for relative dates. Defaults to the current time.
 
     Returns:
         dict: A dictionary with 'summary', 'start_time', and 'end_time', or None if not found.
     """
-    summary = "Meeting"  # Default summary
-    start_time = None
-
-    # Try to find a subject for the meeting, often quoted or after keywords
-    summary_match = re.search(r"(?:meeting about|discuss|topic:)\s*\'?\"?([^\'\"]+)\'?\"?", text, re.IGNORECASE)
-    if summary_match:
-        summary = summary_match.group(1).strip()
-
-    # Very simple regex for time, e.g., "2pm", "10:30 AM"
-    time_match = re.search(r"(\d{1,2}(?::\d{2})?)\s*(am|pm)", text, re.IGNORECASE)
-    
-    # Very simple regex for relative dates
-    date_match_tomorrow = re.search(r"tomorrow", text, re.IGNORECASE)
-    date_match_today = re.search(r"today", text, re.IGNORECASE)
-    
-    now = datetime.now()
-    meeting_date = None
-
-    if date_match_tomorrow:
-        meeting_date = now + timedelta(days=1)
-    elif date_match_today:
-        meeting_date = now
-    
-    if meeting_date and time_match:
-        time_parts = time_match.group(1).split(':')
-        hour = int(time_parts[0])
-        minute = int(time_parts[1]) if len(time_parts) > 1 else 0
-        period = time_match.group(2).lower()
-
-        if period == 'pm' and hour < 12:
-            hour += 12
-        if period == 'am' and hour == 12:  # Handle midnight case (12 AM is 00:00)
-            hour = 0
-
-        # NEW: Add validation to prevent the ValueError crash
-        if not (0 <= hour <= 23 and 0 <= minute <= 59):
-            print(f"Error: Parsed an invalid time (hour={hour}, minute={minute}). Aborting parse.")
-            return None
-            
-        start_time = meeting_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        
-    if start_time:
-        # Assume a default duration of 1 hour for the meeting
-        end_time = start_time + timedelta(hours=1)
-        return {'summary': summary, 'start_time': start_time, 'end_time': end_time}
-
-    # Return None if not enough details could be parsed
-    return None
+    if now is not None:
+        return MeetingExtractor(clock=lambda: now).extract(text)
+    return _default_extractor.extract(text)
@@ -0,0 +1,71 @@
+# agent_core/work_queue.py
+# Orders the work of a cycle so urgent mail is handled first.
+# Emails are queued at a priority level decided from their headers alone, and
+# taken out most urgent first. Waiting work ages: every few seconds in the queue
+# moves it up a level, so a steady stream of urgent mail delays bulk
+# housekeeping (marking newsletters read, moving spam) but never starves it.
+
+import time
+from collections import deque
+
+
+class PriorityWorkQueue:
+    """
+    A priority queue with aging, over a fixed number of levels (0 is the most urgent).
+
+    Items wait in one FIFO per level. pop() takes the head with the lowest
+    effective level: its level, minus one for every `aging_seconds` it has
+    waited. Between equal effective levels the item that has waited longest
+    goes first. Only the head of each level is looked at, so a pop costs
+    O(levels).
+
+    Not thread-safe; the agent fills and drains it from its cycle's thread.
+
+    Args:
+        levels (int): Number of priority levels.
+        aging_seconds (float): Waiting time that counts as one level; None or 0 disables aging.
+        clock (callable): Returns the current time in seconds.
+    """
+
+    def __init__(self, levels=4, aging_seconds=5.0, clock=time.monotonic):
+        self.aging_seconds = aging_seconds
+        self._clock = clock
+        self._levels = [deque() for _ in range(levels)]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, item, level):
+        """Queues an item at a priority level, clamped to the available levels."""
+        level = min(max(level, 0), len(self._levels) - 1)
+        self._levels[level].append((self._clock(), item))
+        self._size += 1
+
+    def pop(self):
+        """
+        Removes and returns the most urgent item.
+
+        Raises:
+            IndexError: If the queue is empty.
+        """
+        if not self._size:
+            raise IndexError('pop from an empty PriorityWorkQueue')
+        now = self._clock()
+        best, best_key = None, None
+        for level, waiting in enumerate(self._levels):
+            if not waiting:
+                continue
+            queued_at = waiting[0][0]
+            effective = level
+            if self.aging_seconds:
+                effective -= (now - queued_at) / self.aging_seconds
+            key = (effective, queued_at)
+            if best_key is None or key < best_key:
+                best, best_key = waiting, key
+        self._size -= 1
+        return best.popleft()[1]
+
+    def pop_many(self, count):
+        """Removes and returns up to `count` items, most urgent first."""
+        return [self.pop() for _ in range(min(count, self._size))]
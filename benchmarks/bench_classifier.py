@@ -0,0 +1,94 @@
+# benchmarks/bench_classifier.py
+# Micro-benchmark of the compiled rule engine against the original
+# keyword-loop implementation of classify_email.
+#
+# Run with: python -m benchmarks.bench_classifier [email_count]
+
+import random
+import sys
+import time
+from agent_core.decision_maker import (
+    IMPORTANT_KEYWORDS,
+    IMPORTANT_SENDERS,
+    MEETING_KEYWORDS,
+    SPAM_KEYWORDS,
+)
+from agent_core.rule_engine import RuleEngine
+
+
+def legacy_classify_email(email_data, senders, important, meeting, spam):
+    """The previous implementation (minus its per-call prints)."""
+    sender = email_data.get('sender', '').lower()
+    subject = email_data.get('subject', '').lower()
+    body = email_data.get('body', '').lower()
+
+    for important_sender in senders:
+        if important_sender in sender:
+            return "IMPORTANT"
+    for keyword in important:
+        if keyword in subject:
+            return "IMPORTANT"
+    for keyword in meeting:
+        if keyword in subject or keyword in body:
+            return "MEETING_REQUEST"
+    for keyword in spam:
+        if keyword in subject or keyword in body:
+            return "SPAM"
+    return "NORMAL"
+
+
+FILLER = (
+    "Here is the latest update on the quarterly numbers. The team has been working "
+    "through the backlog and we expect to close most items by the end of the month. "
+)
+SUBJECTS = ["Weekly news", "Quarterly report", "URGENT: server down", "Lunch?", "Invoice"]
+EXTRAS = ["", "", "", "Can we schedule a meeting?", "You are a WINNER, click here!"]
+SENDERS = ["newsletter@example.com", "colleague@example.com", "Binath <k.g.binath@gmail.com>"]
+
+
+def make_corpus(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            'sender': rng.choice(SENDERS),
+            'subject': rng.choice(SUBJECTS),
+            'body': FILLER * rng.randint(1, 20) + rng.choice(EXTRAS),
+        }
+        for _ in range(count)
+    ]
+
+
+def grow_rules(rules, extra, seed=7):
+    """Pads each rule list with random never-matching keywords, to model large rule sets."""
+    rng = random.Random(seed)
+    letters = 'bcdfghjkmnpqvwxz'
+
+    def pad(words):
+        return list(words) + [''.join(rng.choice(letters) for _ in range(rng.randint(6, 12)))
+                              for _ in range(extra)]
+
+    return tuple(pad(words) for words in rules)
+
+
+def timed(label, fn, corpus):
+    started = time.perf_counter()
+    results = fn(corpus)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {len(corpus) / elapsed:>12,.0f} emails/s  ({elapsed:.3f}s total)")
+    return results
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    corpus = make_corpus(count)
+    base_rules = (IMPORTANT_SENDERS, IMPORTANT_KEYWORDS, MEETING_KEYWORDS, SPAM_KEYWORDS)
+
+    for extra in (0, 200):
+        rules = grow_rules(base_rules, extra)
+        engine = RuleEngine(*rules)
+        print(f"\n--- Classifying {count} synthetic emails, {extra} extra keywords per rule list ---")
+        legacy = timed('legacy', lambda emails: [legacy_classify_email(e, *rules) for e in emails], corpus)
+        compiled = timed('compiled', lambda emails: [c.category for c in engine.classify_many(emails)], corpus)
+
+        mismatches = sum(1 for a, b in zip(legacy, compiled) if a != b)
+        print(f"Category mismatches between implementations: {mismatches}")
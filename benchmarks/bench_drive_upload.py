@@ -0,0 +1,68 @@
+# benchmarks/bench_drive_upload.py
+# Upload throughput of BulkUploader against the offline fake Drive endpoint,
+# for a few worker counts, plus a resume run after a simulated connection drop.
+#
+# Run with: python -m benchmarks.bench_drive_upload [file_count] [file_kb] [latency_ms]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from integrations.fake_transport import FakeDriveHttp, build_fake_service
+from integrations.file_service import BulkUploader
+from integrations.governor import governor
+
+CHUNK_SIZE = 256 * 1024
+
+
+def make_files(directory, count, size):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"file{i:04d}.bin")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def run(name, paths, latency, sessions_file=None, http=None, **options):
+    http = http or FakeDriveHttp(latency=latency)
+    # Runs are independent; a circuit opened by the interrupted run must not affect the next.
+    governor.reset()
+    uploader = BulkUploader('folder', chunksize=CHUNK_SIZE, sessions_file=sessions_file,
+                            service=build_fake_service('drive', 'v3', http), **options)
+    received = http.bytes_received
+    started = time.perf_counter()
+    results = uploader.upload(paths)
+    elapsed = time.perf_counter() - started
+    uploaded = sum(1 for file_id in results.values() if file_id)
+    megabytes = (http.bytes_received - received) / (1024 * 1024)
+    print(f"{name:<12} {uploaded:>4}/{len(paths)} files, {megabytes:7.1f} MB sent in {elapsed:6.2f}s "
+          f"({megabytes / elapsed:6.1f} MB/s)")
+    return http
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    size = (int(sys.argv[2]) if len(sys.argv) > 2 else 1024) * 1024
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20.0) / 1000.0
+
+    # The fake endpoint has no quota to protect.
+    governor.set_rate_limits({})
+    directory = tempfile.mkdtemp()
+    try:
+        paths = make_files(directory, count, size)
+        print(f"--- Uploading {count} x {size // 1024} KB, {latency * 1000:.0f} ms per round trip ---")
+        for workers in (1, 4, 8):
+            run(f"{workers} worker(s)", paths, latency, max_workers=workers)
+
+        # Interrupt every upload part-way, then run again with the saved sessions.
+        sessions_file = os.path.join(directory, 'sessions.json')
+        http = FakeDriveHttp(latency=latency)
+        http.interrupt_after_chunks = count * (size // CHUNK_SIZE) // 2
+        run('interrupted', paths, latency, sessions_file, http, max_workers=8)
+        http.interrupt_after_chunks = None
+        run('resumed', paths, latency, sessions_file, http, max_workers=8)
+    finally:
+        shutil.rmtree(directory)
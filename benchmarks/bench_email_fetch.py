@@ -0,0 +1,52 @@
+# benchmarks/bench_email_fetch.py
+# Compares the old one-request-per-message fetch loop with the batched,
+# paginated fetch_unread_emails, against the offline fake Gmail endpoint.
+#
+# Run with: python -m benchmarks.bench_email_fetch [message_count] [latency_ms]
+
+import sys
+import time
+from integrations.email_service import _parse_message, fetch_unread_emails
+from integrations.fake_transport import FakeGmailHttp, build_fake_service, make_fake_message
+from integrations.governor import governor
+
+
+def make_mailbox(count):
+    return [
+        make_fake_message(f"msg{i:06d}", f"sender{i}@example.com", f"Subject {i}",
+                          f"Body of message {i}. " * 20)
+        for i in range(count)
+    ]
+
+
+def legacy_fetch(service):
+    """The previous implementation: first list page only, one get() per message."""
+    results = service.users().messages().list(userId='me', q='is:unread').execute()
+    emails = []
+    for message_info in results.get('messages', []):
+        msg = service.users().messages().get(userId='me', id=message_info['id']).execute()
+        emails.append(_parse_message(msg))
+    return emails
+
+
+def run(name, fetch, count, latency):
+    http = FakeGmailHttp(make_mailbox(count), latency=latency)
+    service = build_fake_service('gmail', 'v1', http)
+    started = time.perf_counter()
+    emails = fetch(service)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<10} fetched {len(emails):>6}/{count} messages in {elapsed:7.3f}s "
+          f"using {http.request_count:>5} HTTP requests")
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000.0
+
+    # The fake endpoint has no quota to protect.
+    governor.set_rate_limits({})
+    print(f"--- Fetching {count} unread messages, {latency * 1000:.0f} ms per round trip ---")
+    run('legacy', legacy_fetch, count, latency)
+    run('batched', lambda service: fetch_unread_emails(service=service), count, latency)
+    run('metadata', lambda service: fetch_unread_emails(service=service, include_body=False),
+        count, latency)
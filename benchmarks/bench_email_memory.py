@@ -0,0 +1,90 @@
+# benchmarks/bench_email_memory.py
+# Memory held by a cycle's emails, per 10,000 messages, in each of the forms the
+# agent can keep them in:
+#
+#   dict           one plain dictionary per message, bodies decoded
+#   record (lazy)  EmailRecords straight from the Gmail responses, bodies not read yet
+#   record         EmailRecords after their bodies were read (payloads released)
+#   cycle buffer   a CycleBuffer holding the same emails
+#
+# Messages are parsed from JSON one by one, as they arrive from the API, so only
+# what each form keeps is counted. "objects" is the number of objects the garbage
+# collector tracks, which it walks on every full collection.
+#
+# Run with: python -m benchmarks.bench_email_memory [messages]
+
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from agent_core.cycle_buffer import CycleBuffer
+from integrations.email_message import EmailRecord
+from integrations.fake_transport import make_fake_message
+
+WORDS = [''.join(random.Random(i).choices('abcdefghijklmnopqrstuvwxyz', k=3 + i % 8)) for i in range(5000)]
+
+
+def make_responses(count, seed=0):
+    """Gmail message resources as JSON, with bodies of a few hundred words."""
+    rng = random.Random(seed)
+    responses = []
+    for i in range(count):
+        sender = rng.randrange(500)
+        message = make_fake_message(
+            f"{0x18c0000000000000 + i:x}", f"Sender {sender} <user{sender}@domain{sender % 60}.example.com>",
+            ' '.join(rng.choices(WORDS, k=rng.randint(4, 12))),
+            ' '.join(rng.choices(WORDS, k=rng.randint(50, 600))),
+            label_ids=['INBOX', 'UNREAD'] + (['CATEGORY_UPDATES'] if i % 3 else ['IMPORTANT']),
+            thread_id=f"{0x18c0000000000000 + i // 3:x}")
+        responses.append(json.dumps(message))
+    return responses
+
+
+def as_dict(message):
+    record = EmailRecord(message)
+    return {key: record[key] for key in ('id', 'threadId', 'snippet', 'sender', 'recipient', 'subject', 'body')}
+
+
+def as_lazy_record(message):
+    return EmailRecord(message)
+
+
+def as_record(message):
+    record = EmailRecord(message)
+    record.body
+    return record
+
+
+def build(kind, responses):
+    if kind == 'cycle buffer':
+        return CycleBuffer(as_lazy_record(json.loads(response)) for response in responses)
+    convert = {'dict': as_dict, 'record (lazy)': as_lazy_record, 'record': as_record}[kind]
+    return [convert(json.loads(response)) for response in responses]
+
+
+def measure(kind, responses):
+    gc.collect()
+    objects = len(gc.get_objects())
+    tracemalloc.start()
+    started = time.perf_counter()
+    emails = build(kind, responses)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    objects = len(gc.get_objects()) - objects
+    del emails
+    return size, objects, elapsed
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    responses = make_responses(count)
+    print(f"--- {count} messages, scaled to 10,000 ---")
+    print(f"{'form':<15}{'MB':>8}{'bytes/email':>13}{'objects':>10}{'build s':>9}")
+    for kind in ('dict', 'record (lazy)', 'record', 'cycle buffer'):
+        size, objects, elapsed = measure(kind, responses)
+        scale = 10000 / count
+        print(f"{kind:<15}{size * scale / 1e6:8.1f}{size / count:13,.0f}{objects * scale:10,.0f}{elapsed * scale:9.2f}")
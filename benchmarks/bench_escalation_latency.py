@@ -0,0 +1,101 @@
+# benchmarks/bench_escalation_latency.py
+# How long urgent mail waits behind bulk traffic: one cycle over a backlog of
+# newsletters, spam and meeting requests with a few urgent emails spread through
+# it, replayed against the fake Google endpoints with a simulated round trip.
+#
+# For every urgent email it measures the time from its fetch to the escalation
+# reaching the supervisor, and reports the p50/p99/max of those, next to when the
+# last label change of the bulk mail was applied (so starvation would show) and
+# how long the whole cycle took.
+#
+# Run with: python -m benchmarks.bench_escalation_latency [messages] [latency_ms] [urgent_percent]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from agent_core.logging_config import configure_logging
+from agent_core.main_agent import Agent
+from agent_core.replay import ReplayEnvironment, percentile
+from integrations.governor import governor
+
+
+def make_fixtures(count, urgent_percent, seed=0):
+    """Mostly bulk mail, and urgent emails that are each in their own thread, with distinct bodies."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        roll = rng.random() * 100
+        if roll < urgent_percent:
+            subject, body = f"URGENT: outage report {i}", f"Incident {i}: service {rng.randrange(10 ** 6)} is down."
+        elif roll < urgent_percent + 10:
+            subject, body = "Meeting request: weekly sync", "Can we have a meeting on Tuesday at 10:00 for 30 minutes?"
+        elif roll < urgent_percent + 40:
+            subject, body = "Congratulations, you are a winner!", "Claim your prize now, click here."
+        else:
+            subject, body = f"Newsletter #{i}", "This week's news. " * rng.randint(20, 200)
+        records.append({'cycle': 1, 'id': f"bulk{i:06d}", 'from': f"sender{rng.randint(1, 500)}@example.com",
+                        'subject': subject, 'body': body})
+    return records
+
+
+def run(count, latency, urgent_percent):
+    environment = ReplayEnvironment(make_fixtures(count, urgent_percent), latency=latency)
+    environment.deliver(1)
+    fetched_at, escalated_at = {}, {}
+    last_label_change = [None]
+
+    handle = environment.gmail.handle
+
+    def gmail_handle(method, path, params, data):
+        result = handle(method, path, params, data)
+        if path.endswith('/batchModify'):
+            last_label_change[0] = time.perf_counter()
+        elif method == 'GET' and '/messages/' in path:
+            fetched_at.setdefault(path.rsplit('/', 1)[1], time.perf_counter())
+        return result
+
+    environment.gmail.handle = gmail_handle
+
+    governor.reset()
+    governor.set_rate_limits({})
+    with tempfile.TemporaryDirectory(prefix='agent-bench-') as state_dir, environment:
+        agent = Agent(state_file=os.path.join(state_dir, 'state.json'),
+                      ledger_file=os.path.join(state_dir, 'ledger.sqlite3'),
+                      knowledge_file=os.path.join(state_dir, 'knowledge.sqlite3'))
+        send = agent.escalation_queue._send
+
+        def timed_send(emails, follow_up=False):
+            ok = send(emails, follow_up)
+            if ok:
+                now = time.perf_counter()
+                for email in emails:
+                    escalated_at.setdefault(email['id'], now)
+            return ok
+
+        agent.escalation_queue._send = timed_send
+        try:
+            started = time.perf_counter()
+            agent.run_cycle()
+            finished = time.perf_counter()
+        finally:
+            agent.close()
+
+    waits = [escalated_at[m_id] - fetched_at[m_id] for m_id in escalated_at]
+    return waits, (last_label_change[0] or finished) - started, finished - started
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50.0) / 1000.0
+    urgent_percent = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+
+    configure_logging('CRITICAL')
+    print(f"--- One cycle over {count} unread messages ({urgent_percent:g}% urgent), "
+          f"{latency * 1000:.0f} ms per round trip ---")
+    waits, labels_done, total = run(count, latency, urgent_percent)
+    print(f"{len(waits)} escalations, fetch to escalation: p50 {percentile(waits, 0.5) * 1000:.0f} ms, "
+          f"p99 {percentile(waits, 0.99) * 1000:.0f} ms, max {max(waits, default=0) * 1000:.0f} ms")
+    print(f"last bulk label change {labels_done * 1000:8.0f} ms")
+    print(f"cycle done             {total * 1000:8.0f} ms")
@@ -0,0 +1,69 @@
+# benchmarks/bench_first_action.py
+# How soon the agent starts acting on a large backlog: one cycle over N unread
+# messages (a full resync), replayed against the fake Google endpoints with a
+# simulated network round trip. Reports when the first action chain finished,
+# when the first change reached Gmail (a label change or a sent email), and
+# when the whole cycle was done.
+#
+# Run with: python -m benchmarks.bench_first_action [messages] [latency_ms]
+
+import os
+import sys
+import tempfile
+import time
+from agent_core.logging_config import configure_logging
+from agent_core.main_agent import Agent
+from agent_core.replay import ReplayEnvironment, synthetic_fixtures
+from integrations.governor import governor
+
+
+def run(count, latency):
+    environment = ReplayEnvironment(synthetic_fixtures(count, cycles=1), latency=latency)
+    environment.deliver(1)
+    marks = {}
+
+    def first(name):
+        marks.setdefault(name, time.perf_counter())
+
+    handle = environment.gmail.handle
+
+    def gmail_handle(method, path, params, data):
+        if method == 'POST':
+            first('gmail_change')
+        return handle(method, path, params, data)
+
+    environment.gmail.handle = gmail_handle
+
+    governor.reset()
+    governor.set_rate_limits({})
+    with tempfile.TemporaryDirectory(prefix='agent-bench-') as state_dir, environment:
+        agent = Agent(state_file=os.path.join(state_dir, 'state.json'),
+                      ledger_file=os.path.join(state_dir, 'ledger.sqlite3'),
+                      knowledge_file=os.path.join(state_dir, 'knowledge.sqlite3'))
+        run_chain = agent.executor._run_chain
+
+        def timed_chain(message_id, actions):
+            results = run_chain(message_id, actions)
+            first('action')
+            return results
+
+        agent.executor._run_chain = timed_chain
+        try:
+            started = time.perf_counter()
+            agent.run_cycle()
+            finished = time.perf_counter()
+        finally:
+            agent.close()
+    return {name: at - started for name, at in marks.items()}, finished - started
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50.0) / 1000.0
+
+    configure_logging('CRITICAL')
+    print(f"--- One cycle over {count} unread messages, {latency * 1000:.0f} ms per round trip ---")
+    marks, total = run(count, latency)
+    print(f"first action done      {marks.get('action', float('nan')) * 1000:8.0f} ms")
+    print(f"first change in Gmail  {marks.get('gmail_change', float('nan')) * 1000:8.0f} ms")
+    print(f"cycle done             {total * 1000:8.0f} ms")
@@ -0,0 +1,156 @@
+# benchmarks/bench_http_transport.py
+# Connection reuse of the API clients' HTTP transports, against a local HTTPS server.
+# Like the multi-mailbox runtime, several mailboxes (each with its own credentials)
+# call Gmail, Calendar and Drive from a shared pool of worker threads:
+#
+#   httplib2   the client library's transport: one service object, and so one
+#              set of connections, per mailbox, thread and API
+#   pooled     integrations.http_transport: one connection pool for the process
+#
+# The server counts the TLS handshakes it completes. It also simulates a network
+# round trip time: one per response, and two per new connection (TCP connect and
+# a TLS 1.3 handshake), which is where a real call to Google spends its time.
+#
+# Run with: python -m benchmarks.bench_http_transport [mailboxes] [threads] [cycles] [rtt_ms]
+
+import http.server
+import multiprocessing
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# API, version, and the call made on it.
+CALLS = [
+    ('gmail', 'v1', lambda service: service.users().getProfile(userId='me')),
+    ('calendar', 'v3', lambda service: service.calendarList().list()),
+    ('drive', 'v3', lambda service: service.about().get(fields='user')),
+]
+CALLS_PER_CYCLE = 12
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.server.rtt)
+        body = b'{"emailAddress": "bench@example.com"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, context, handshakes, rtt):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.context = context
+        self.handshakes = handshakes
+        self.rtt = rtt
+
+    def get_request(self):
+        sock, address = self.socket.accept()
+        # Headers and body go out in separate writes; without this, Nagle's algorithm
+        # holds the body back until the client's delayed ACK.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self.context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False), address
+
+    def finish_request(self, request, client_address):
+        time.sleep(2 * self.rtt)
+        request.do_handshake()
+        with self.handshakes.get_lock():
+            self.handshakes.value += 1
+        super().finish_request(request, client_address)
+
+
+def serve(cert, key, handshakes, port, rtt):
+    """Runs the server in its own process, so it does not compete with the clients for the GIL."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server = CountingServer(context, handshakes, rtt)
+    port.value = server.server_address[1]
+    server.serve_forever()
+
+
+def make_certificate(directory):
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=127.0.0.1',
+                    '-addext', 'subjectAltName=IP:127.0.0.1', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+def run(transport, endpoint, cert, mailboxes, threads, cycles):
+    import httplib2
+    import google_auth_httplib2
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build_from_document
+    from integrations.auth_service import discovery_document
+    from integrations.http_transport import AuthorizedHttp, PooledTransport
+
+    pool = PooledTransport(ca_certs=cert) if transport == 'pooled' else None
+    credentials = [Credentials(token=f"token-{i}") for i in range(mailboxes)]
+    services = {}
+    local = threading.local()
+
+    def service_for(mailbox, api, version):
+        if pool is not None:
+            # Shared by all threads, as ServiceRegistry does with the pooled transport.
+            key = (mailbox, api)
+            if key not in services:
+                services[key] = build_from_document(discovery_document(api, version), http=AuthorizedHttp(
+                    credentials[mailbox], pool), client_options={'api_endpoint': endpoint})
+            return services[key]
+        # One per thread, as ServiceRegistry does with httplib2.
+        own = local.__dict__.setdefault('services', {})
+        if (mailbox, api) not in own:
+            http = google_auth_httplib2.AuthorizedHttp(credentials[mailbox], http=httplib2.Http(ca_certs=cert))
+            own[(mailbox, api)] = build_from_document(discovery_document(api, version), http=http,
+                                                      client_options={'api_endpoint': endpoint})
+        return own[(mailbox, api)]
+
+    def call(mailbox, index):
+        api, version, method = CALLS[index % len(CALLS)]
+        method(service_for(mailbox, api, version)).execute()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for cycle in range(cycles):
+            list(executor.map(lambda i: call(i % mailboxes, i), range(mailboxes * CALLS_PER_CYCLE)))
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    mailboxes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    cycles = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    rtt = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.02
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        calls = cycles * mailboxes * CALLS_PER_CYCLE
+        print(f"--- {mailboxes} mailboxes, {threads} threads, {cycles} cycles of "
+              f"{mailboxes * CALLS_PER_CYCLE} calls, {rtt * 1000:.0f} ms round trips ---")
+        for transport in ('httplib2', 'pooled'):
+            handshakes, port = multiprocessing.Value('i', 0), multiprocessing.Value('i', 0)
+            server = multiprocessing.Process(target=serve, args=(cert, key, handshakes, port, rtt), daemon=True)
+            server.start()
+            while not port.value:
+                time.sleep(0.01)
+            endpoint = f"https://127.0.0.1:{port.value}/"
+            elapsed = run(transport, endpoint, cert, mailboxes, threads, cycles)
+            print(f"{transport:<9} {handshakes.value:4d} TLS handshakes for {calls} calls, "
+                  f"{elapsed:6.2f}s ({calls / elapsed:,.0f} calls/s)")
+            server.terminate()
+            server.join()
@@ -0,0 +1,96 @@
+# benchmarks/bench_knowledge_index.py
+# Indexing throughput and lookup latency of the knowledge index on a synthetic
+# mail history. Word frequencies follow Zipf's law, as in real text, and each
+# thread of three emails is about one of a few hundred topics; a tenth of the
+# threads has a reply.
+#
+# Run with: python -m benchmarks.bench_knowledge_index [document_count]
+
+import bisect
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from agent_core.knowledge_index import KnowledgeIndex
+
+VOCABULARY = 30000
+TOPICS = 300
+TOPIC_WORDS = 12
+
+
+def make_corpus(count, seed=0):
+    rng = random.Random(seed)
+    words = [f"term{rank}" for rank in range(VOCABULARY)]
+    cumulative = list(itertools.accumulate(1 / (rank + 1) ** 1.05 for rank in range(VOCABULARY)))
+
+    def draw(n):
+        return [words[bisect.bisect(cumulative, rng.random() * cumulative[-1])] for _ in range(n)]
+
+    topics = [rng.sample(words[1000:], TOPIC_WORDS) for _ in range(TOPICS)]
+    emails = []
+    for i in range(count):
+        if i % 3 == 0:
+            topic = rng.randrange(TOPICS)
+        emails.append({
+            'id': f"msg{i:07d}", 'threadId': f"thread{i // 3:07d}", 'sender': f"user{rng.randint(1, 500)}@example.com",
+            'subject': ' '.join(draw(2) + rng.choices(topics[topic], k=2)),
+            'body': ' '.join(draw(80) + rng.choices(topics[topic], k=8)),
+            'topic': topic,
+        })
+    return emails, topics, draw, rng
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    emails, topics, draw, rng = make_corpus(count)
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        index = KnowledgeIndex(os.path.join(state_dir, 'knowledge.sqlite3'))
+        print(f"--- Indexing {count} emails in cycles of 100 ---")
+        started = time.perf_counter()
+        for i in range(0, count, 100):
+            index.add_many(emails[i:i + 100], ['NORMAL'] * len(emails[i:i + 100]))
+        elapsed = time.perf_counter() - started
+        replies = 0
+        for email in emails[::30]:
+            index.add_reply(f"reply-{email['id']}", email['threadId'],
+                            f"Answer about {' '.join(topics[email['topic']][:3])}", subject=f"Re: {email['subject']}")
+            replies += 1
+        size = os.path.getsize(index.path) + os.path.getsize(index.path + '-wal')
+        print(f"indexed {len(index)} documents ({replies} replies) in {elapsed:.2f}s "
+              f"({count / elapsed:,.0f} emails/s), {size / 1e6:.1f} MB on disk")
+
+        probes = []
+        for _ in range(500):
+            topic = rng.randrange(TOPICS)
+            probes.append({'id': 'new', 'threadId': 'new', 'subject': ' '.join(draw(2) + rng.choices(topics[topic], k=2)),
+                           'body': ' '.join(draw(80) + rng.choices(topics[topic], k=8)), 'topic': topic})
+
+        # Each cycle's batch adds an index segment; compaction (every
+        # LEDGER_COMPACT_EVERY_CYCLES cycles in the agent) merges them into one.
+        for state in ('as indexed', 'after compact()'):
+            if state != 'as indexed':
+                index.compact()
+            print(f"--- Lookups of {len(probes)} new emails, {state} ---")
+            for name, lookup in (('similar', lambda p: index.similar(p, limit=5)), ('find_reply', index.find_reply)):
+                timings = []
+                hits = 0
+                for probe in probes:
+                    started = time.perf_counter()
+                    result = lookup(probe)
+                    timings.append(time.perf_counter() - started)
+                    best = result[0] if isinstance(result, list) and result else result
+                    if best is not None:
+                        source = best.message_id.replace('reply-', '')
+                        hits += emails[int(source[3:])]['topic'] == probe['topic']
+                p50, p99 = percentiles(timings)
+                print(f"{name:<11} p50 {p50:6.3f} ms  p99 {p99:6.3f} ms  best match on topic: {hits / len(probes):.0%}")
+        index.close()
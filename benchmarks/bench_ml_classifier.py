@@ -0,0 +1,72 @@
+# benchmarks/bench_ml_classifier.py
+# Training time, accuracy, model size and per-message scoring cost of the
+# hashed naive Bayes fallback classifier, on a synthetic labelled corpus.
+#
+# Run with: python -m benchmarks.bench_ml_classifier [email_count]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from nlp_utils.classifier import HashedNaiveBayes, accuracy
+
+WORDS = ("report numbers team backlog month update project client review notes plan budget "
+         "invoice order shipping account password security team lunch weekend travel").split()
+SIGNALS = {
+    'IMPORTANT': "escalate outage deadline asap blocker production incident".split(),
+    'MEETING_REQUEST': "call sync catch-up availability slot agenda invite calendar".split(),
+    'SPAM': "prize lottery bitcoin unsubscribe discount crypto jackpot offer".split(),
+    'NORMAL': [],
+}
+
+
+def make_corpus(count, seed=3):
+    """Emails whose category shows only through a few words no rule lists."""
+    rng = random.Random(seed)
+    emails, labels = [], []
+    for _ in range(count):
+        label = rng.choices(list(SIGNALS), weights=[10, 15, 15, 60])[0]
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 300))]
+        for _ in range(rng.randint(1, 3) if SIGNALS[label] else 0):
+            words.insert(rng.randrange(len(words)), rng.choice(SIGNALS[label]))
+        if rng.random() < 0.2:
+            # A misleading word from some other category.
+            other = rng.choice([words for name, words in SIGNALS.items() if name != label and words])
+            words.insert(rng.randrange(len(words)), rng.choice(other))
+        emails.append({
+            'sender': f"user{rng.randint(1, 500)}@{rng.choice(['example.com', 'corp.example', 'mail.test'])}",
+            'subject': ' '.join(rng.choice(WORDS) for _ in range(4)),
+            'body': ' '.join(words),
+        })
+        labels.append(label)
+    return emails, labels
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    emails, labels = make_corpus(count)
+    split = int(count * 0.8)
+
+    started = time.perf_counter()
+    model = HashedNaiveBayes.train(emails[:split], labels[:split])
+    print(f"--- Trained on {split} emails in {time.perf_counter() - started:.2f}s ---")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'model.bin')
+        model.save(path)
+        started = time.perf_counter()
+        model = HashedNaiveBayes.load(path)
+        print(f"model file       {os.path.getsize(path) / 1024:,.0f} KB, "
+              f"loaded in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+        test_emails, test_labels = emails[split:], labels[split:]
+        print(f"held-out accuracy {accuracy(model, test_emails, test_labels):.3f}")
+
+        for batch_size in (1, 100):
+            started = time.perf_counter()
+            for start in range(0, len(test_emails), batch_size):
+                model.predict_many(test_emails[start:start + batch_size])
+            elapsed = time.perf_counter() - started
+            print(f"batch size {batch_size:<5} {elapsed / len(test_emails) * 1e6:7.1f} us/message")
+        del model
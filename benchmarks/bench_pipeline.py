@@ -0,0 +1,84 @@
+# benchmarks/bench_pipeline.py
+# End-to-end throughput of the agent pipeline (fetch, classify, act) replayed
+# offline against the fake Google endpoints, for a few network scenarios.
+# Reports messages/sec, p50/p99 cycle latency and API calls per message.
+#
+# Run with: python -m benchmarks.bench_pipeline [message_count] [baseline.json]
+#
+# With a baseline file, results are compared against it and regressions are
+# flagged; if the file does not exist yet, the results are written to it.
+
+import json
+import os
+import sys
+from agent_core.logging_config import configure_logging
+from agent_core.replay import replay, synthetic_fixtures
+
+# name -> (latency in seconds, error rate)
+SCENARIOS = {
+    'local': (0.0, 0.0),
+    'latency-5ms': (0.005, 0.0),
+    'latency+errors': (0.005, 0.01),
+}
+
+# Relative change beyond which a metric counts as a regression, and whether
+# higher (+1) or lower (-1) values are worse. Timings are noisy; the call count
+# is deterministic for a given seed.
+TOLERANCES = {
+    'messages_per_second': (0.15, -1),
+    'p99_cycle_ms': (0.25, 1),
+    'api_calls_per_message': (0.01, 1),
+}
+
+
+def run(count, cycles=10):
+    fixtures = synthetic_fixtures(count, cycles=cycles, seed=0)
+    results = {}
+    for name, (latency, error_rate) in SCENARIOS.items():
+        report = replay(fixtures, latency=latency, error_rate=error_rate, seed=0)
+        results[name] = report.as_dict()
+        print(f"{name:<15} {report.messages_per_second:>9,.0f} msgs/s  "
+              f"p50 {report.p50_cycle_seconds * 1000:7.1f} ms  p99 {report.p99_cycle_seconds * 1000:7.1f} ms  "
+              f"{report.api_calls_per_message:5.2f} calls/msg  "
+              f"handled {report.handled}/{report.messages}")
+    return results
+
+
+def compare(results, baseline):
+    """Prints the metrics that got worse than the baseline by more than their tolerance."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if before['messages'] != result['messages']:
+            print(f"{name}: the baseline replayed {before['messages']} messages; not comparable.")
+            continue
+        for metric, (tolerance, worse) in TOLERANCES.items():
+            old, new = before[metric], result[metric]
+            if old and (new - old) / old * worse > tolerance:
+                regressions.append(f"{name}: {metric} {old} -> {new}")
+    if regressions:
+        print("Regressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+    else:
+        print("No regressions against the baseline.")
+    return regressions
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    baseline_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    configure_logging('CRITICAL')
+    print(f"--- Replaying {count} synthetic messages over 10 cycles ---")
+    results = run(count)
+
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            sys.exit(1 if compare(results, json.load(f)) else 0)
+    elif baseline_path:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
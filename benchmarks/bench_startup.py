@@ -0,0 +1,86 @@
+# benchmarks/bench_startup.py
+# Start-up cost of short-lived runs such as `python main.py --once` from cron.
+# Each measurement starts a fresh Python process, so nothing is already imported:
+#
+#   interpreter   python -c pass, the floor everything else sits on
+#   import        importing agent_core.main_agent
+#   cold cycle    importing, building the API clients and running one cycle of
+#                 20 emails against the fake Google endpoints
+#
+# Run with: python -m benchmarks.bench_startup [runs]
+#
+# Exits with status 1 if a median goes over its budget, and then lists the
+# slowest imports, which is almost always where the time went.
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_CYCLE = """
+from agent_core.logging_config import configure_logging
+from agent_core.replay import replay, synthetic_fixtures
+configure_logging('CRITICAL')
+report = replay(synthetic_fixtures(20, cycles=1, seed=0), rate_limits={})
+assert report.handled == report.messages, report
+"""
+
+# name -> (code run in the child process, budget in seconds above the bare interpreter)
+CASES = {
+    'interpreter': ("pass", None),
+    'import': ("import agent_core.main_agent", 0.15),
+    'cold cycle': (COLD_CYCLE, 0.75),
+}
+
+
+def time_process(code):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE='')
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - started
+
+
+def slowest_imports(module, count=10):
+    """Returns the `count` imports of `module` with the largest cumulative time, in seconds."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT),
+                            capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            timings.append((int(parts[1]) / 1e6, parts[2].strip()))
+    return sorted(timings, reverse=True)[:count]
+
+
+def run(runs):
+    medians = {}
+    for name, (code, _) in CASES.items():
+        medians[name] = statistics.median(time_process(code) for _ in range(runs))
+    floor = medians['interpreter']
+
+    over_budget = []
+    for name, (_, budget) in CASES.items():
+        line = f"{name:<12} {medians[name] * 1000:7.1f} ms"
+        if budget is not None:
+            cost = medians[name] - floor
+            line += f"  (+{cost * 1000:6.1f} ms, budget {budget * 1000:.0f} ms)"
+            if cost > budget:
+                line += "  OVER BUDGET"
+                over_budget.append(name)
+        print(line)
+    return over_budget
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"--- Median of {runs} fresh processes ---")
+    over_budget = run(runs)
+    if over_budget:
+        print("Slowest imports of agent_core.main_agent (cumulative):")
+        for seconds, module in slowest_imports('agent_core.main_agent'):
+            print(f"  {seconds * 1000:7.1f} ms  {module}")
+        sys.exit(1)
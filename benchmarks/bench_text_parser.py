@@ -0,0 +1,92 @@
+# benchmarks/bench_text_parser.py
+# Throughput of the single-pass MeetingExtractor against the original
+# four-regex parse_meeting_details, on a synthetic meeting-email corpus.
+#
+# Run with: python -m benchmarks.bench_text_parser [text_count]
+
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from agent_core.text_parser import MeetingExtractor
+
+REFERENCE_TIME = datetime(2025, 6, 11, 9, 0)
+
+
+def legacy_parse_meeting_details(text, now=REFERENCE_TIME):
+    """The previous implementation, with its clock fixed for a fair comparison."""
+    summary = "Meeting"
+    start_time = None
+    summary_match = re.search(r"(?:meeting about|discuss|topic:)\s*\'?\"?([^\'\"]+)\'?\"?", text, re.IGNORECASE)
+    if summary_match:
+        summary = summary_match.group(1).strip()
+    time_match = re.search(r"(\d{1,2}(?::\d{2})?)\s*(am|pm)", text, re.IGNORECASE)
+    date_match_tomorrow = re.search(r"tomorrow", text, re.IGNORECASE)
+    date_match_today = re.search(r"today", text, re.IGNORECASE)
+
+    meeting_date = None
+    if date_match_tomorrow:
+        meeting_date = now + timedelta(days=1)
+    elif date_match_today:
+        meeting_date = now
+
+    if meeting_date and time_match:
+        time_parts = time_match.group(1).split(':')
+        hour = int(time_parts[0])
+        minute = int(time_parts[1]) if len(time_parts) > 1 else 0
+        period = time_match.group(2).lower()
+        if period == 'pm' and hour < 12:
+            hour += 12
+        if period == 'am' and hour == 12:
+            hour = 0
+        if not (0 <= hour <= 23 and 0 <= minute <= 59):
+            return None
+        start_time = meeting_date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    if start_time:
+        return {'summary': summary, 'start_time': start_time, 'end_time': start_time + timedelta(hours=1)}
+    return None
+
+
+PHRASES = [
+    "Can we have a meeting about 'the Q3 budget' tomorrow at 2pm?",
+    "Let's discuss the roadmap next Friday 14:00-15:30.",
+    "Quick sync on 2025-07-01 from 11-1pm.",
+    "Call on June 20th at 10:30 am for 30 minutes.",
+    "Are you free today at 4:15 PM?",
+    "Topic: hiring plan. Monday 9am works for me.",
+    "Could we meet on 12/06 at noon for an hour?",
+]
+FILLER = (
+    "Thanks for the update on the release. I looked through the notes and "
+    "everything seems to be on track, apart from the open items in the tracker. "
+)
+
+
+def make_corpus(count, seed=3):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        filler = FILLER * rng.randint(0, 8)
+        corpus.append(f"Re: planning\n{filler}{rng.choice(PHRASES)}\n{filler}")
+    return corpus
+
+
+def timed(label, fn, corpus):
+    started = time.perf_counter()
+    results = fn(corpus)
+    elapsed = time.perf_counter() - started
+    parsed = sum(1 for r in results if r)
+    print(f"{label:<10} {len(corpus) / elapsed:>10,.0f} texts/s  "
+          f"parsed {parsed}/{len(corpus)} ({elapsed:.3f}s total)")
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    corpus = make_corpus(count)
+    extractor = MeetingExtractor(clock=lambda: REFERENCE_TIME)
+
+    print(f"--- Parsing {count} synthetic meeting emails ---")
+    timed('legacy', lambda texts: [legacy_parse_meeting_details(t) for t in texts], corpus)
+    timed('extractor', extractor.extract_many, corpus)
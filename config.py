@@ -3,10 +3,13 @@
 # Loads environment variables and defines constants.
 
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from a .env file at the project root
-load_dotenv()
+# Load environment variables from a .env file at the project root. python-dotenv
+# is only imported when there is such a file, which keeps start-up fast.
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 # --- Application Settings ---
 AGENT_NAME = "Intelligent Agent v1.0"
@@ -16,9 +19,147 @@ AGENT_NAME = "Intelligent Agent v1.0"
 # The second argument is a default value if the variable is not found.
 SUPERVISOR_EMAIL = os.getenv("SUPERVISOR_EMAIL", "default.supervisor@example.com")
 
+# --- Escalations ---
+# Important emails of one thread, or with near-identical bodies, are escalated in
+# one digest. Matching emails that arrive within this many seconds of a digest are
+# held and sent together in the next one.
+ESCALATION_DIGEST_WINDOW_SECONDS = int(os.getenv("ESCALATION_DIGEST_WINDOW_SECONDS", "900"))
+# Bodies whose 64-bit SimHash fingerprints differ in at most this many bits are near-duplicates.
+ESCALATION_NEAR_DUPLICATE_BITS = 10
+
 # --- Agent Behavior Settings ---
 # Time in seconds for the agent to wait before checking for new emails again.
+# This is the starting point; the wait then adapts between the two bounds below.
 SLEEP_TIME_SECONDS = 300  # 5 minutes
+# Shortest wait, used while new mail keeps arriving.
+POLL_MIN_SECONDS = int(os.getenv("POLL_MIN_SECONDS", "15"))
+# Longest wait, reached after a run of idle cycles (e.g. at night).
+POLL_MAX_SECONDS = int(os.getenv("POLL_MAX_SECONDS", "900"))  # 15 minutes
+# Local TCP port that triggers an immediate check when something connects to it
+# (e.g. a relay for Gmail push notifications). Set to 0 to disable.
+WAKEUP_PORT = int(os.getenv("AGENT_WAKEUP_PORT", "8765"))
+
+# Number of messages fetched per Gmail batch request (Gmail allows at most 100).
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "100"))
+# A message a cycle could not finish (e.g. its escalation, event or label change failed)
+# is fetched again by this many following cycles before the agent gives up on it.
+SYNC_RETRY_CYCLES = int(os.getenv("SYNC_RETRY_CYCLES", "5"))
+
+# Maximum number of bytes decoded from an email body. Longer bodies are truncated.
+MAX_BODY_BYTES = 256 * 1024
+
+# --- Processing Pipeline ---
+# Each cycle streams fetch -> classify -> act. Fetched batches (of GMAIL_BATCH_SIZE
+# messages) that may wait for classification before fetching pauses.
+PIPELINE_FETCH_QUEUE_BATCHES = int(os.getenv("PIPELINE_FETCH_QUEUE_BATCHES", "4"))
+# Messages whose actions may be queued or running; classification pauses beyond that.
+PIPELINE_MAX_PENDING_ACTIONS = int(os.getenv("PIPELINE_MAX_PENDING_ACTIONS", "500"))
+# Fetched emails are classified and acted on most urgent first (IMPORTANT, then meeting
+# requests, then the rest), judged by their sender and subject. Every this many
+# seconds of waiting moves an email up one level, so bulk mail is never starved.
+PRIORITY_AGING_SECONDS = float(os.getenv("PRIORITY_AGING_SECONDS", "5"))
+# Emails classified and acted on per step; escalations due are sent after each step.
+PRIORITY_CHUNK_EMAILS = int(os.getenv("PRIORITY_CHUNK_EMAILS", "50"))
+
+# Worker threads used to run email actions (send, label, calendar) concurrently.
+MAX_ACTION_WORKERS = 8
+
+# Maximum number of concurrent calls per Google API.
+API_CONCURRENCY_LIMITS = {
+    'gmail': 4,
+    'calendar': 2,
+    'drive': 2,
+}
+
+# Per-user request quotas, as (quota units per second, burst). Gmail counts quota
+# units (e.g. 5 per message fetch, 100 per send); Calendar and Drive count requests.
+API_RATE_LIMITS = {
+    'gmail': (250, 250),
+    'calendar': (10, 20),
+    'drive': (200, 200),
+}
+# Retries of a throttled or failed API call before giving up on it.
+API_MAX_RETRIES = 5
+# Consecutive failed calls (each after its retries) after which an API is left alone for a while.
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET_SECONDS = 30
+# Where API clients get their discovery documents: "bundled" uses the copies shipped
+# with google-api-python-client (no network, fast start-up); "live" fetches the
+# latest ones from Google and caches them on disk.
+DISCOVERY_DOCUMENTS = os.getenv("DISCOVERY_DOCUMENTS", "bundled")
+# HTTP transport of the API clients: "pooled" shares keep-alive connections between
+# all APIs, threads and mailboxes of the process; "httplib2" is the client
+# library's own transport, one connection set per thread and API.
+HTTP_TRANSPORT = os.getenv("HTTP_TRANSPORT", "pooled")
+# Kept-alive connections per host. Calls beyond it open extra connections, closed after use.
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "16"))
+# Seconds to wait for a connection or a response.
+HTTP_TIMEOUT_SECONDS = 60
+# Negotiate HTTP/2 with the pooled transport. Needs the h2 package, and urllib3's
+# HTTP/2 support is still experimental, so it is off by default.
+HTTP2 = os.getenv("HTTP2", "0") == "1"
+
+# --- Observability ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "text" for a terminal, "json" for one structured record per line.
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Local port serving Prometheus-style metrics at /metrics. Set to 0 to disable.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+# Fraction of emails whose per-stage trace spans are logged (at DEBUG level).
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+
+# --- Local State ---
+# Where the agent keeps state that must survive restarts (e.g., the Gmail sync position).
+STATE_DIR = os.getenv("AGENT_STATE_DIR", os.path.join(os.getcwd(), "agent_state"))
+STATE_FILE = os.path.join(STATE_DIR, "state.json")
+
+# Record of actions already taken per message, so restarts never repeat them.
+LEDGER_FILE = os.path.join(STATE_DIR, "ledger.sqlite3")
+LEDGER_RETENTION_DAYS = 30
+# Expired ledger entries are removed every this many cycles.
+LEDGER_COMPACT_EVERY_CYCLES = 100
+# Full-text index of processed mail and of the user's replies. Escalations list the
+# similar emails seen before, and the reply given to the closest one. Set to 0 to disable.
+KNOWLEDGE_INDEX_ENABLED = os.getenv("KNOWLEDGE_INDEX_ENABLED", "1") == "1"
+KNOWLEDGE_INDEX_FILE = os.path.join(STATE_DIR, "knowledge.sqlite3")
+KNOWLEDGE_RETENTION_DAYS = 365
+
+# --- Multiple Mailboxes ---
+# JSON file listing the mailboxes one runtime serves (see agent_core/runtime.py).
+MAILBOXES_FILE = os.getenv("MAILBOXES_FILE", os.path.join(os.getcwd(), "mailboxes.json"))
+# Per-mailbox tokens, sync state and ledgers live in these directories, one entry per mailbox.
+MAILBOX_TOKEN_DIR = os.path.join(os.getcwd(), "credentials", "mailboxes")
+MAILBOX_STATE_DIR = os.path.join(STATE_DIR, "mailboxes")
+# Mailbox cycles run at the same time in one process.
+MAILBOX_CYCLE_WORKERS = int(os.getenv("MAILBOX_CYCLE_WORKERS", "4"))
+# Worker processes the mailboxes are spread over.
+RUNTIME_PROCESSES = int(os.getenv("RUNTIME_PROCESSES", "1"))
+
+# --- Google Calendar ---
+# Time zone of the events the agent creates (an IANA name).
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "America/Los_Angeles")
+# Whether numeric dates in emails put the day first ("11/06" is 11 June) or the month
+# first (November 6). The default, month first, matches the US time zone above.
+DATE_DAY_FIRST = os.getenv("DATE_DAY_FIRST", "0") == "1"
+# How far ahead the local free/busy cache looks, in days.
+CALENDAR_WINDOW_DAYS = 60
+# How often the free/busy snapshot is re-queried; event changes are synced every cycle.
+FREEBUSY_REFRESH_SECONDS = 300
 
-print("Configuration loaded.")
+# --- Google Drive Uploads ---
+# Bytes sent per resumable upload request. Drive requires a multiple of 256 KB.
+DRIVE_UPLOAD_CHUNK_BYTES = int(os.getenv("DRIVE_UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+# Files uploaded in parallel by bulk uploads.
+DRIVE_UPLOAD_WORKERS = 4
+# Open resumable upload sessions, so interrupted uploads continue where they stopped.
+UPLOAD_SESSIONS_FILE = os.path.join(STATE_DIR, "upload_sessions.json")
 
+# --- Classification Rules ---
+# JSON file with VIP/blocked senders and keyword lists. Changes are picked up without a restart.
+RULES_FILE = os.getenv("RULES_FILE", os.path.join(os.getcwd(), "rules.json"))
+RULES_RELOAD_SECONDS = 5
+# Trained fallback classifier for emails no rule matches (see nlp_utils/classifier.py).
+# Without a model file only the rules are used.
+CLASSIFIER_MODEL_FILE = os.getenv("CLASSIFIER_MODEL_FILE", os.path.join(os.getcwd(), "models", "classifier.bin"))
+# A model prediction is used only at or above this confidence (0 to 1).
+CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.9"))
@@ -1,13 +1,28 @@
 # integrations/auth_service.py
 # This module handles the OAuth 2.0 authentication flow for all Google APIs.
+# It also keeps a process-wide registry of built service objects so that
+# every integration call does not re-read token.json and rebuild its client.
+# When one process serves several mailboxes, each has its own token and registry,
+# and integration calls use the mailbox selected with mailbox_context().
+#
+# The Google auth and client libraries take a few hundred milliseconds to import,
+# so they are imported on first use rather than when this module is loaded.
 
+import contextvars
+import hashlib
+import json
+import logging
 import os.path
-import pickle
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from googleapiclient.discovery_cache.base import Cache
 from googleapiclient.errors import HttpError
+from config import DISCOVERY_DOCUMENTS, HTTP_TRANSPORT
+from integrations.http_transport import refresh_credentials
+
+logger = logging.getLogger(__name__)
 
 # Define the SCOPES (permissions) your agent will need.
 # If you modify these scopes, you must delete the existing token.json file.
@@ -24,71 +39,440 @@ SCOPES = [
 CREDENTIALS_FILE = os.path.join(os.getcwd(), 'credentials', 'credentials.json')
 TOKEN_FILE = os.path.join(os.getcwd(), 'credentials', 'token.json')
 
+# Discovery documents are cached here so the agent can build its clients offline.
+DISCOVERY_CACHE_DIR = os.path.join(os.getcwd(), '.discovery_cache')
+
+# Credentials are refreshed this long before they actually expire, so a request
+# never goes out with a token that is about to become invalid.
+REFRESH_MARGIN = timedelta(minutes=5)
 
-def get_google_api_service(api_name, api_version):
+
+class FileDiscoveryCache(Cache):
     """
-    Authenticates with the Google API and returns a service object.
-    Handles the OAuth 2.0 flow, including token storage and refresh.
+    A discovery document cache that stores each document as a file on disk.
+    It plugs into googleapiclient's `build(cache=...)` hook.
+    """
+
+    def __init__(self, cache_dir=DISCOVERY_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path_for(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def get(self, url):
+        try:
+            with open(self._path_for(url), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, url, content):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path_for(url)
+            # Write to a temporary file first so a crash never leaves a half-written document.
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not cache discovery document: %s", e)
+
+
+# Parsed discovery documents, shared by every registry and thread of the process.
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+def discovery_document(api_name, api_version):
+    """
+    Returns the discovery document bundled with google-api-python-client, parsed.
+    Each document is read and parsed once per process.
+
+    Returns:
+        dict: The document, or None if the library has no copy of it.
+    """
+    key = (api_name, api_version)
+    document = _documents.get(key)
+    if document is None:
+        with _documents_lock:
+            document = _documents.get(key)
+            if document is None:
+                from googleapiclient.discovery_cache import get_static_doc
+                content = get_static_doc(api_name, api_version)
+                if content is None:
+                    return None
+                document = _documents[key] = json.loads(content)
+    return document
+
+
+def _utcnow():
+    """Returns the current UTC time as a naive datetime, matching google-auth's expiry field."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _needs_refresh(creds, margin=REFRESH_MARGIN):
+    """Checks whether credentials are expired or will expire within the refresh margin."""
+    if creds.expiry is None:
+        return not creds.valid
+    return _utcnow() >= creds.expiry - margin
+
+
+def _save_credentials(creds, token_file):
+    logger.info("Saving credentials to token.json...")
+    try:
+        with open(token_file, 'w') as token:
+            token.write(creds.to_json())
+        logger.info("Credentials saved to %s", token_file)
+    except Exception as e:
+        logger.warning("Error saving credentials: %s", e)
+
+
+def _load_credentials(scopes, token_file=TOKEN_FILE, credentials_file=CREDENTIALS_FILE):
+    """
+    Loads credentials from the token file, refreshing them or running the
+    interactive authorization flow when necessary.
 
     Args:
-        api_name (str): The name of the API to connect to (e.g., 'gmail', 'calendar', 'drive').
-        api_version (str): The version of the API (e.g., 'v1', 'v3').
+        scopes (list): The OAuth scopes the credentials must cover.
+        token_file (str): Path to the stored user token.
+        credentials_file (str): Path to the OAuth client secrets file.
 
     Returns:
-        A Google API service object, or None if authentication fails.
+        Credentials: Valid credentials, or None if authentication fails.
     """
     creds = None
     # The file token.json stores the user's access and refresh tokens.
     # It is created automatically when the authorization flow completes for the first time.
-    if os.path.exists(TOKEN_FILE):
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
+    if os.path.exists(token_file):
+        try:
+            creds = Credentials.from_authorized_user_file(token_file, scopes)
+        except Exception as e:
+            logger.warning("Error loading credentials from token file: %s", e)
+            creds = None
+
+    if creds and creds.refresh_token and _needs_refresh(creds):
+        logger.info("Credentials have expired or are about to. Refreshing token...")
         try:
-            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+            creds.refresh(Request())
+            _save_credentials(creds, token_file)
         except Exception as e:
-            print(f"Error loading credentials from token file: {e}")
+            logger.error("Error refreshing token: %s. Please re-authenticate.", e)
+            # If refresh fails, force re-authentication by setting creds to None
             creds = None
 
     # If there are no (valid) credentials available, let the user log in.
     if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            print("Credentials have expired. Refreshing token...")
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"Error refreshing token: {e}. Please re-authenticate.")
-                # If refresh fails, force re-authentication by setting creds to None
-                creds = None
+        logger.info("No valid credentials found. Starting authentication flow...")
+        if not os.path.exists(credentials_file):
+            logger.error("credentials.json not found at %s. Please download it from "
+                         "Google Cloud Console and place it correctly.", credentials_file)
+            return None
+
+        try:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(credentials_file, scopes)
+            creds = flow.run_local_server(port=0)
+        except Exception as e:
+            logger.error("Failed to run authentication flow: %s", e)
+            return None
+
+        logger.info("Authentication successful.")
+        _save_credentials(creds, token_file)
+
+    return creds
+
+
+class ServiceRegistry:
+    """
+    A thread-safe, process-wide cache of authenticated Google API service objects.
+
+    Services are keyed by (api_name, api_version, scopes). Credentials are held in
+    memory per scope set and refreshed ahead of expiry. Clients are built from the
+    discovery documents bundled with the client library, or with
+    discovery_documents='live' from Google's latest ones, cached on disk; either
+    way, building a client does not need the network after the first start.
+
+    With http_transport='pooled', service objects send their requests through the
+    process-wide connection pool (integrations.http_transport), which is
+    thread-safe, so all threads share one service object per API. The client
+    library's httplib2 transport is not thread-safe, so with 'httplib2' each
+    thread gets its own service objects. Credentials are shared by all threads.
+    """
+
+    def __init__(self, token_file=TOKEN_FILE, credentials_file=CREDENTIALS_FILE,
+                 discovery_cache=None, refresh_margin=REFRESH_MARGIN,
+                 discovery_documents=DISCOVERY_DOCUMENTS, http_transport=HTTP_TRANSPORT):
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+        self.discovery_cache = discovery_cache or FileDiscoveryCache()
+        self.discovery_documents = discovery_documents
+        self.pooled = http_transport == 'pooled'
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._local = threading.local()
+        self._shared_services = {}
+        self._generation = 0
+        self._credentials = {}
+        self._overrides = {}
+        # APIs whose live discovery document could not be fetched.
+        self._offline = set()
+        self._stats = {'hits': 0, 'misses': 0, 'builds': 0, 'build_time': 0.0, 'refreshes': 0}
+
+    def _lock_for(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _get_credentials(self, scopes):
+        """Returns in-memory credentials for the scope set, refreshing them ahead of expiry."""
+        with self._lock_for(('credentials', scopes)):
+            creds = self._credentials.get(scopes)
+            if creds is None:
+                creds = _load_credentials(list(scopes), self.token_file, self.credentials_file)
+                if creds is None:
+                    return None
+                self._credentials[scopes] = creds
+            elif creds.refresh_token and _needs_refresh(creds, self.refresh_margin):
+                # The credentials' own lock is shared with the authorized transports,
+                # which may have renewed the token while this thread waited for it.
+                try:
+                    if refresh_credentials(creds, self._auth_request(),
+                                           lambda c: _needs_refresh(c, self.refresh_margin)):
+                        logger.info("Refreshed cached credentials ahead of expiry.")
+                        self._count('refreshes')
+                        _save_credentials(creds, self.token_file)
+                except Exception as e:
+                    logger.warning("Error refreshing cached credentials: %s", e)
+                    del self._credentials[scopes]
+                    return None
+            return creds
+
+    def _auth_request(self):
+        """A google.auth transport for token refreshes, on the shared pool when pooled."""
+        if self.pooled:
+            from google.auth.transport.urllib3 import Request
+            from integrations.http_transport import shared_transport
+            return Request(shared_transport().pool)
+        from google.auth.transport.requests import Request
+        return Request()
+
+    def _build(self, api_name, api_version, creds):
+        from googleapiclient.discovery import build, build_from_document
+
+        # Either the credentials or an authorized transport is passed to the client library.
+        if self.pooled:
+            from integrations.http_transport import authorized_http
+            auth = {'http': authorized_http(creds)}
         else:
-            print("No valid credentials found. Starting authentication flow...")
-            if not os.path.exists(CREDENTIALS_FILE):
-                print(f"ERROR: credentials.json not found at {CREDENTIALS_FILE}")
-                print("Please download it from Google Cloud Console and place it correctly.")
-                return None
-            
+            auth = {'credentials': creds}
+
+        live = self.discovery_documents == 'live' and (api_name, api_version) not in self._offline
+        if live:
             try:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    CREDENTIALS_FILE, SCOPES)
-                creds = flow.run_local_server(port=0)
+                # The live discovery document, cached on disk for later offline starts.
+                return build(api_name, api_version, cache=self.discovery_cache,
+                             static_discovery=False, **auth)
+            except HttpError:
+                raise
             except Exception as e:
-                print(f"Failed to run authentication flow: {e}")
+                # Offline with an empty cache: use the bundled copy from now on, so
+                # other threads do not retry the network.
+                logger.warning("Could not fetch discovery document (%s). Using bundled copy.", e)
+                self._offline.add((api_name, api_version))
+        document = discovery_document(api_name, api_version)
+        if document is None:
+            if live:
+                raise ValueError(f"No discovery document for {api_name} {api_version}.")
+            # Not bundled with the library; fetch it after all.
+            return build(api_name, api_version, cache=self.discovery_cache,
+                         static_discovery=False, **auth)
+        return build_from_document(document, **auth)
+
+    def get_service(self, api_name, api_version, scopes=None):
+        """
+        Returns a cached service object, building it on first use.
+
+        Args:
+            api_name (str): The name of the API (e.g., 'gmail', 'calendar', 'drive').
+            api_version (str): The version of the API (e.g., 'v1', 'v3').
+            scopes (list, optional): OAuth scopes to request. Defaults to SCOPES.
+
+        Returns:
+            A Google API service object, or None if authentication fails.
+        """
+        override = self._overrides.get((api_name, api_version))
+        if override is not None:
+            return override
+
+        scopes = tuple(sorted(scopes or SCOPES))
+        key = (api_name, api_version, scopes)
+        services = self._thread_services()
+
+        service = services.get(key)
+        if service is not None:
+            # Still run the refresh check so a long-lived service never uses a stale token.
+            if self._get_credentials(scopes) is None:
                 return None
+            self._count('hits')
+            return service
 
-        # Save the credentials for the next run
-        print("Authentication successful. Saving credentials to token.json...")
-        try:
-            with open(TOKEN_FILE, 'w') as token:
-                token.write(creds.to_json())
-            print(f"Credentials saved to {TOKEN_FILE}")
-        except Exception as e:
-            print(f"Error saving credentials: {e}")
+        self._count('misses')
+        creds = self._get_credentials(scopes)
+        if creds is None:
+            return None
 
-    try:
-        service = build(api_name, api_version, credentials=creds)
-        print(f"Successfully connected to {api_name} API version {api_version}.")
+        with self._lock_for(key):
+            # Another thread sharing the cache may have built it meanwhile.
+            service = services.get(key)
+            if service is None:
+                started = time.perf_counter()
+                service = self._build(api_name, api_version, creds)
+                self._count('builds')
+                self._count('build_time', time.perf_counter() - started)
+                logger.info("Successfully connected to %s API version %s.", api_name, api_version)
+                services[key] = service
         return service
+
+    def _thread_services(self):
+        """
+        Returns the service cache the calling thread uses, invalidated by clear():
+        one shared by all threads with the pooled transport, else the thread's own.
+        """
+        if self.pooled:
+            return self._shared_services
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            local.services = {}
+            local.generation = self._generation
+        return local.services
+
+    def override(self, api_name, api_version, service):
+        """
+        Makes get_service() return `service` for an API, whatever the scopes, without
+        authenticating. Used to run the agent against fake endpoints offline.
+        Passing None removes the override.
+        """
+        with self._lock:
+            if service is None:
+                self._overrides.pop((api_name, api_version), None)
+            else:
+                self._overrides[(api_name, api_version)] = service
+
+    def stats(self):
+        """Returns a snapshot of the hit/miss/build-time counters."""
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        """Drops all cached services and credentials, e.g. after the token file changes."""
+        with self._lock:
+            self._generation += 1
+            self._shared_services = {}
+            self._credentials.clear()
+
+
+# The process-wide registry used by all integration modules.
+_registry = ServiceRegistry()
+
+# Registries of additional mailboxes, each with its own token file.
+_mailbox_registries = {}
+_mailbox_lock = threading.Lock()
+
+# The mailbox integration calls act on in the current thread (None: the default token).
+_current_mailbox = contextvars.ContextVar('mailbox', default=None)
+
+
+def register_mailbox(name, token_file, credentials_file=CREDENTIALS_FILE):
+    """
+    Adds a mailbox with its own OAuth token. Calls made inside
+    `mailbox_context(name)` authenticate with that token.
+
+    Args:
+        name (str): The mailbox name used with mailbox_context().
+        token_file (str): The mailbox's stored user token; created by the
+                          authorization flow on first use.
+        credentials_file (str): The OAuth client secrets file.
+    """
+    with _mailbox_lock:
+        registry = _mailbox_registries.get(name)
+        if registry is None or registry.token_file != token_file:
+            _mailbox_registries[name] = ServiceRegistry(token_file, credentials_file,
+                                                        discovery_cache=_registry.discovery_cache)
+
+
+def current_mailbox():
+    """Returns the name of the mailbox selected in this context, or None for the default one."""
+    return _current_mailbox.get()
+
+
+@contextmanager
+def mailbox_context(name):
+    """
+    Makes integration calls in the with-block use the given mailbox's credentials.
+    None selects the default token (credentials/token.json).
+
+    Raises:
+        KeyError: If the mailbox was not registered.
+    """
+    if name is not None and name not in _mailbox_registries:
+        raise KeyError(f"Unknown mailbox: {name}")
+    token = _current_mailbox.set(name)
+    try:
+        yield
+    finally:
+        _current_mailbox.reset(token)
+
+
+def _current_registry():
+    name = _current_mailbox.get()
+    return _registry if name is None else _mailbox_registries[name]
+
+
+def get_google_api_service(api_name, api_version, scopes=None):
+    """
+    Authenticates with the Google API and returns a service object.
+    Service objects and credentials are cached for the lifetime of the process.
+
+    Args:
+        api_name (str): The name of the API to connect to (e.g., 'gmail', 'calendar', 'drive').
+        api_version (str): The version of the API (e.g., 'v1', 'v3').
+        scopes (list, optional): OAuth scopes to request. Defaults to SCOPES.
+
+    Returns:
+        A Google API service object, or None if authentication fails.
+    """
+    try:
+        return _current_registry().get_service(api_name, api_version, scopes)
     except HttpError as error:
-        print(f"An error occurred while building the service: {error}")
+        logger.error("An error occurred while building the service: %s", error)
         return None
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error("An unexpected error occurred: %s", e)
         return None
 
+
+def get_service_registry_stats():
+    """Returns the hit/miss/build-time counters of the current mailbox's service registry."""
+    return _current_registry().stats()
+
+
+def override_service(api_name, api_version, service):
+    """
+    Replaces the service returned for an API in the current mailbox, e.g. with
+    one built on a fake transport.
+
+    Args:
+        api_name (str): The name of the API (e.g., 'gmail').
+        api_version (str): The version of the API (e.g., 'v1').
+        service: The service object to hand out, or None to restore normal behaviour.
+    """
+    _current_registry().override(api_name, api_version, service)
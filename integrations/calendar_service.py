@@ -1,12 +1,81 @@
 # integrations/calendar_service.py
 # This module contains all functions for interacting with the Google Calendar API.
+# A local free/busy cache answers "is this slot free?" and "does this event
+# already exist?" without a round trip, and new events are inserted in batches.
 
-from datetime import datetime, timedelta
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
 from googleapiclient.errors import HttpError
+from config import CALENDAR_TIMEZONE, CALENDAR_WINDOW_DAYS, FREEBUSY_REFRESH_SECONDS
 # Import our reusable authentication service
 from integrations.auth_service import get_google_api_service
+from integrations.governor import CircuitOpenError, TransportError, governor
 
-def create_calendar_event(summary, description, start_time, end_time, attendees=None):
+logger = logging.getLogger(__name__)
+
+# Calendar recommends no more than 50 calls per batch request.
+MAX_CALENDAR_BATCH_SIZE = 50
+
+# A busy period. `event_id` and `summary` are None for periods only known from free/busy.
+Busy = namedtuple('Busy', ['start', 'end', 'event_id', 'summary'])
+
+# The outcome of checking a proposed event against the cache.
+SlotCheck = namedtuple('SlotCheck', ['duplicate', 'conflicts'])
+
+# What happened to a queued event: status is one of the constants below, link is
+# the event's HTML link (of the existing event for duplicates).
+EventResult = namedtuple('EventResult', ['status', 'link'])
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+CONFLICT = 'conflict'
+FAILED = 'failed'
+
+
+def _localize(moment, tz):
+    """Attaches the calendar time zone to naive datetimes."""
+    return moment.replace(tzinfo=tz) if moment.tzinfo is None else moment
+
+
+def _parse_when(when, tz):
+    """Converts an event's start/end ({'dateTime': ...} or {'date': ...}) to an aware datetime."""
+    if 'dateTime' in when:
+        return _localize(datetime.fromisoformat(when['dateTime'].replace('Z', '+00:00')), tz)
+    day = date.fromisoformat(when['date'])
+    return datetime(day.year, day.month, day.day, tzinfo=tz)
+
+
+def _duplicate_key(summary, start, end, attendees=()):
+    # The attendees belong to the key: two requests that both fall back to the
+    # default summary at the same time are different meetings unless the same people asked.
+    return ((summary or '').strip().lower(), start.timestamp(), end.timestamp(),
+            frozenset(address.strip().lower() for address in attendees or ()))
+
+
+def _attendees(event):
+    return [attendee.get('email', '') for attendee in event.get('attendees', [])]
+
+
+def _event_body(summary, description, start_time, end_time, attendees=None, timezone=CALENDAR_TIMEZONE):
+    # The 'event' object is a dictionary that matches the structure
+    # required by the Google Calendar API.
+    event = {
+        'summary': summary,
+        'description': description,
+        'start': {'dateTime': start_time.isoformat(), 'timeZone': timezone},
+        'end': {'dateTime': end_time.isoformat(), 'timeZone': timezone},
+    }
+    # Add attendees if they are provided
+    if attendees:
+        event['attendees'] = [{'email': email} for email in attendees]
+    return event
+
+
+def create_calendar_event(summary, description, start_time, end_time, attendees=None,
+                          timezone=CALENDAR_TIMEZONE):
     """
     Creates an event on the user's primary Google Calendar.
 
@@ -16,6 +85,7 @@ def create_calendar_event(summary, description, start_time, end_time, attendees=
         start_time (datetime): The start date and time of the event.
         end_time (datetime): The end date and time of the event.
         attendees (list, optional): A list of attendee email addresses. Defaults to None.
+        timezone (str, optional): IANA time zone of naive start/end times. Defaults to CALENDAR_TIMEZONE.
 
     Returns:
         str: The HTML link to the created event, or None if it fails.
@@ -23,55 +93,334 @@ def create_calendar_event(summary, description, start_time, end_time, attendees=
     try:
         service = get_google_api_service('calendar', 'v3')
         if not service:
-            print("Failed to get Calendar service. Aborting.")
+            logger.error("Failed to get Calendar service. Aborting.")
             return None
 
-        # The 'event' object is a dictionary that matches the structure
-        # required by the Google Calendar API.
-        event = {
-            'summary': summary,
-            'description': description,
-            'start': {
-                'dateTime': start_time.isoformat(),
-                'timeZone': 'America/Los_Angeles', # TODO: Make this configurable
-            },
-            'end': {
-                'dateTime': end_time.isoformat(),
-                'timeZone': 'America/Los_Angeles', # TODO: Make this configurable
-            },
-        }
+        event = _event_body(summary, description, start_time, end_time, attendees, timezone)
 
-        # Add attendees if they are provided
-        if attendees:
-            event['attendees'] = [{'email': email} for email in attendees]
-
-        print("Creating calendar event...")
+        logger.info("Creating calendar event...")
         # Call the Calendar API's 'insert' method to create the event.
         # 'calendarId='primary'' refers to the user's main calendar.
-        created_event = service.events().insert(calendarId='primary', body=event).execute()
-        
+        created_event = governor.execute(service.events().insert(calendarId='primary', body=event))
+
         event_link = created_event.get('htmlLink')
-        print(f"Event created successfully! Link: {event_link}")
+        logger.info("Event created successfully! Link: %s", event_link)
         return event_link
 
     except HttpError as error:
-        print(f"An error occurred with the Calendar API: {error}")
+        logger.error("An error occurred with the Calendar API: %s", error)
         return None
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error("An unexpected error occurred: %s", e)
         return None
 
 
+class CalendarCache:
+    """
+    A local copy of a calendar's busy periods and events.
+
+    Events are kept current with incremental `events().list(syncToken=...)`
+    calls, which cost one request when nothing changed. A `freebusy().query`
+    snapshot, refreshed every `freebusy_ttl` seconds, adds busy time the
+    event listing does not explain (e.g. events outside the synced window).
+    Conflict and duplicate checks are then answered locally.
+
+    Args:
+        calendar_id (str): The calendar to mirror.
+        service (optional): A Calendar service object to use instead of the shared one.
+        timezone (str): IANA time zone used for naive datetimes.
+        window_days (int): How many days ahead the free/busy snapshot covers.
+        freebusy_ttl (float): Seconds before the free/busy snapshot is re-queried.
+    """
+
+    def __init__(self, calendar_id='primary', service=None, timezone=CALENDAR_TIMEZONE,
+                 window_days=CALENDAR_WINDOW_DAYS, freebusy_ttl=FREEBUSY_REFRESH_SECONDS):
+        self.calendar_id = calendar_id
+        self.tz = ZoneInfo(timezone)
+        self.window = timedelta(days=window_days)
+        self.freebusy_ttl = freebusy_ttl
+        self._service = service
+        self._lock = threading.RLock()
+        self._events = {}
+        self._keys = {}
+        self._by_key = {}
+        self._freebusy = []
+        self._freebusy_at = None
+        self._sync_token = None
+
+    @property
+    def service(self):
+        return self._service or get_google_api_service('calendar', 'v3')
+
+    def __len__(self):
+        with self._lock:
+            return len(self._events)
+
+    def _forget(self, event_id):
+        self._events.pop(event_id, None)
+        key = self._keys.pop(event_id, None)
+        if key is not None and self._by_key.get(key, (None,))[0] == event_id:
+            del self._by_key[key]
+
+    def add_event(self, event):
+        """Applies an event resource (new, changed or cancelled) to the cache."""
+        with self._lock:
+            self._forget(event['id'])
+            if event.get('status') == 'cancelled' or 'start' not in event:
+                return
+            busy = Busy(_parse_when(event['start'], self.tz), _parse_when(event['end'], self.tz),
+                        event['id'], event.get('summary'))
+            key = _duplicate_key(busy.summary, busy.start, busy.end, _attendees(event))
+            self._keys[event['id']] = key
+            self._by_key[key] = (event['id'], event.get('htmlLink'))
+            # "Free" (transparent) events do not block time, but still count for duplicates.
+            if event.get('transparency') != 'transparent':
+                self._events[event['id']] = busy
+
+    def remove_event(self, event_id):
+        with self._lock:
+            self._forget(event_id)
+
+    def _list_events(self, service, since=None, **params):
+        events_api = service.events()
+        request = events_api.list(calendarId=self.calendar_id, singleEvents=True,
+                                  maxResults=250, **params)
+        sync_token = None
+        while request is not None:
+            response = governor.execute(request)
+            for event in response.get('items', []):
+                # Events that ended before `since` cannot conflict with anything new.
+                if since is not None and 'end' in event and _parse_when(event['end'], self.tz) < since:
+                    self.remove_event(event['id'])
+                else:
+                    self.add_event(event)
+            sync_token = response.get('nextSyncToken', sync_token)
+            request = events_api.list_next(request, response)
+        return sync_token
+
+    def sync(self, service=None):
+        """Applies event changes since the last sync (a full listing the first time)."""
+        service = service or self.service
+        if self._sync_token is not None:
+            try:
+                self._sync_token = self._list_events(service, syncToken=self._sync_token)
+                return
+            except HttpError as error:
+                # Calendar answers 410 Gone when the token is too old; start over.
+                if error.resp.status != 410:
+                    raise
+                logger.warning("Calendar sync token expired. Running a full sync...")
+        with self._lock:
+            self._events.clear()
+            self._keys.clear()
+            self._by_key.clear()
+        # Calendar only issues a sync token for an unfiltered listing (timeMin is not
+        # allowed with syncToken), so past events are dropped here instead.
+        since = datetime.now(self.tz) - timedelta(days=1)
+        self._sync_token = self._list_events(service, since=since)
+
+    def refresh_freebusy(self, service=None):
+        """Re-queries the busy periods of the next `window_days` days."""
+        service = service or self.service
+        now = datetime.now(self.tz)
+        body = {
+            'timeMin': now.isoformat(),
+            'timeMax': (now + self.window).isoformat(),
+            'timeZone': str(self.tz),
+            'items': [{'id': self.calendar_id}],
+        }
+        response = governor.execute(service.freebusy().query(body=body))
+        periods = response.get('calendars', {}).get(self.calendar_id, {}).get('busy', [])
+        with self._lock:
+            self._freebusy = [
+                (_parse_when({'dateTime': p['start']}, self.tz), _parse_when({'dateTime': p['end']}, self.tz))
+                for p in periods
+            ]
+            self._freebusy_at = time.monotonic()
+
+    def refresh(self):
+        """
+        Brings the cache up to date: an event sync, plus a free/busy query when the snapshot is stale.
+
+        Returns:
+            bool: True if the cache is current, False if the API could not be reached.
+        """
+        try:
+            service = self.service
+            if not service:
+                logger.error("Failed to get Calendar service. Aborting.")
+                return False
+            self.sync(service)
+            if self._freebusy_at is None or time.monotonic() - self._freebusy_at >= self.freebusy_ttl:
+                self.refresh_freebusy(service)
+            return True
+        except (HttpError, CircuitOpenError, TransportError) as error:
+            logger.error("An error occurred while refreshing the calendar cache: %s", error)
+            return False
+
+    def check(self, summary, start_time, end_time, attendees=None):
+        """
+        Checks a proposed event against the cache, without any API call.
+
+        Args:
+            summary (str): The event title.
+            start_time (datetime): Start; naive values are in the calendar time zone.
+            end_time (datetime): End; naive values are in the calendar time zone.
+            attendees (list, optional): Attendee email addresses.
+
+        Returns:
+            SlotCheck: `duplicate` is (event_id, link) of an existing event with the same
+                title, time and attendees, or None; `conflicts` lists the overlapping Busy periods.
+        """
+        start, end = _localize(start_time, self.tz), _localize(end_time, self.tz)
+        with self._lock:
+            duplicate = self._by_key.get(_duplicate_key(summary, start, end, attendees))
+            conflicts = [busy for busy in self._events.values() if busy.start < end and start < busy.end]
+            known = [(busy.start, busy.end) for busy in conflicts]
+            for period_start, period_end in self._freebusy:
+                if period_start < end and start < period_end and not any(
+                        known_start <= period_start and period_end <= known_end
+                        for known_start, known_end in known):
+                    conflicts.append(Busy(period_start, period_end, None, None))
+        conflicts.sort(key=lambda busy: busy.start)
+        return SlotCheck(duplicate, conflicts)
+
+    def is_free(self, start_time, end_time):
+        """Returns True if nothing known overlaps the given period."""
+        return not self.check(None, start_time, end_time).conflicts
+
+
+class EventInsertQueue:
+    """
+    Collects the events decided during a cycle and creates them with batch requests.
+
+    On flush, the cache is refreshed once. Each event is then checked locally:
+    duplicates of existing events are not created again, and events that
+    overlap busy time are skipped (reported as CONFLICT) unless `allow_conflicts`
+    is set. Events accepted earlier in the same flush count as busy for later ones.
+
+    Args:
+        cache (CalendarCache): The cache of the target calendar.
+        allow_conflicts (bool): Whether to create events that overlap busy time.
+        timezone (str): IANA time zone for naive start/end times.
+    """
+
+    def __init__(self, cache, allow_conflicts=False, timezone=CALENDAR_TIMEZONE):
+        self.cache = cache
+        self.allow_conflicts = allow_conflicts
+        self.timezone = timezone
+        self._lock = threading.Lock()
+        self._queued = []
+
+    def __len__(self):
+        with self._lock:
+            return len(self._queued)
+
+    def keys(self):
+        """Returns the keys of the events waiting for the next flush."""
+        with self._lock:
+            return {key for key, *_ in self._queued}
+
+    def queue(self, key, summary, description, start_time, end_time, attendees=None):
+        """
+        Queues an event for the next flush.
+
+        Args:
+            key (str): Identifies the request in the flush results (e.g. the email's message ID).
+            summary, description, start_time, end_time, attendees: As for create_calendar_event.
+
+        Returns:
+            bool: Always True; the outcome is reported by flush().
+        """
+        with self._lock:
+            self._queued.append((key, summary, description, start_time, end_time, attendees))
+        return True
+
+    def flush(self):
+        """
+        Creates every queued event that is neither a duplicate nor a conflict.
+
+        Returns:
+            dict: key -> EventResult.
+        """
+        with self._lock:
+            queued, self._queued = self._queued, []
+        if not queued:
+            return {}
+
+        cache = self.cache
+        if not cache.refresh():
+            return {key: EventResult(FAILED, None) for key, *_ in queued}
+
+        results = {}
+        to_insert = []
+        for key, summary, description, start_time, end_time, attendees in queued:
+            slot = cache.check(summary, start_time, end_time, attendees)
+            if slot.duplicate is not None:
+                logger.info("Event '%s' at %s already exists; not creating it again.", summary, start_time)
+                results[key] = EventResult(DUPLICATE, slot.duplicate[1])
+                continue
+            if slot.conflicts and not self.allow_conflicts:
+                busy = ', '.join(f"{b.summary or 'busy'} ({b.start:%H:%M}-{b.end:%H:%M})"
+                                 for b in slot.conflicts)
+                logger.warning("Event '%s' at %s conflicts with: %s. Not creating it.",
+                               summary, start_time, busy)
+                results[key] = EventResult(CONFLICT, None)
+                continue
+            # Holds the slot so later events of this flush see it as taken.
+            cache.add_event({'id': f"pending:{key}", 'summary': summary,
+                             'start': {'dateTime': _localize(start_time, cache.tz).isoformat()},
+                             'end': {'dateTime': _localize(end_time, cache.tz).isoformat()},
+                             'attendees': [{'email': email} for email in attendees or []]})
+            to_insert.append((key, _event_body(summary, description, start_time, end_time,
+                                               attendees, self.timezone)))
+
+        if to_insert:
+            self._insert(to_insert, results)
+        return results
+
+    def _insert(self, to_insert, results):
+        cache = self.cache
+
+        def on_response(key, response, exception):
+            cache.remove_event(f"pending:{key}")
+            if exception is not None:
+                logger.error("Failed to create the event for %s: %s", key, exception)
+                results[key] = EventResult(FAILED, None)
+                return
+            cache.add_event(response)
+            results[key] = EventResult(CREATED, response.get('htmlLink'))
+
+        service = cache.service
+        events_api = service.events()
+        for start in range(0, len(to_insert), MAX_CALENDAR_BATCH_SIZE):
+            chunk = to_insert[start:start + MAX_CALENDAR_BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=on_response)
+            for key, body in chunk:
+                batch.add(events_api.insert(calendarId=cache.calendar_id, body=body), request_id=key)
+            try:
+                governor.execute(batch)
+            except (HttpError, CircuitOpenError, TransportError) as error:
+                logger.error("An error occurred while creating %d calendar event(s): %s", len(chunk), error)
+                for key, _ in chunk:
+                    cache.remove_event(f"pending:{key}")
+                    results.setdefault(key, EventResult(FAILED, None))
+
+        created = sum(1 for result in results.values() if result.status == CREATED)
+        logger.info("Created %d calendar event(s) in %d batch request(s).",
+                    created, 1 + (len(to_insert) - 1) // MAX_CALENDAR_BATCH_SIZE)
+
+
 # This block allows you to run this file directly for testing.
 if __name__ == '__main__':
     print("--- Running Calendar Event Creation Test ---")
-    
+
     # Define the details for our test event.
     # We'll create an event that starts in one hour and lasts for one hour.
     now = datetime.now()
     start_time = now + timedelta(hours=1)
     end_time = start_time + timedelta(hours=1)
-    
+
     # Call the function to create the event.
     create_calendar_event(
         summary='Agent Test Event',
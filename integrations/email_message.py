@@ -0,0 +1,239 @@
+# integrations/email_message.py
+# The agent's in-memory email record, built from a Gmail API message.
+# Headers are parsed straight away; the body is only located and decoded the
+# first time it is read, and never beyond a configurable size cap.
+# Records are slotted rather than dict-backed, and the strings many of them share
+# (senders and their domains, label IDs) are interned, so a large backlog stays small.
+
+import base64
+import codecs
+import sys
+import threading
+from collections.abc import Mapping
+from agent_core.rule_engine import extract_address
+
+# Default cap on decoded body size. Classification and escalation only need the
+# start of a message, so huge newsletters are not decoded in full.
+DEFAULT_MAX_BODY_BYTES = 256 * 1024
+
+# Base64 text decoded per step; a multiple of 4 so every chunk decodes on its own.
+_DECODE_CHUNK_CHARS = 64 * 1024
+
+
+def _header_value(headers, name):
+    name = name.lower()
+    for header in headers:
+        if header.get('name', '').lower() == name:
+            return header.get('value', '')
+    return ''
+
+
+def _content_charset(part):
+    """Returns the charset declared in a part's Content-Type header, or utf-8."""
+    content_type = _header_value(part.get('headers', []), 'Content-Type')
+    for param in content_type.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            return value.strip().strip('"') or 'utf-8'
+    return 'utf-8'
+
+
+def _is_attachment(part):
+    if part.get('filename') or part.get('body', {}).get('attachmentId'):
+        return True
+    disposition = _header_value(part.get('headers', []), 'Content-Disposition')
+    return disposition.lower().startswith('attachment')
+
+
+def find_text_part(payload):
+    """
+    Finds the part holding the plain-text body, walking nested multipart trees.
+
+    Attachments are skipped. A message without parts is its own body part.
+
+    Args:
+        payload (dict): The 'payload' of a Gmail message resource.
+
+    Returns:
+        dict: The body part, or None if the message has no plain-text body.
+    """
+    if 'parts' not in payload:
+        return payload
+    # Depth-first, in document order, so the first text/plain part wins as before.
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if 'parts' in part:
+            stack.extend(reversed(part['parts']))
+        elif part.get('mimeType') == 'text/plain' and not _is_attachment(part):
+            return part
+    return None
+
+
+def decode_body(data, charset='utf-8', max_bytes=DEFAULT_MAX_BODY_BYTES):
+    """
+    Decodes base64url body data to text, chunk by chunk, up to max_bytes.
+
+    Only the encoded prefix needed to produce max_bytes is ever decoded, and
+    invalid byte sequences are replaced instead of raising.
+
+    Args:
+        data (str): The base64url-encoded body data.
+        charset (str): The text encoding of the decoded bytes.
+        max_bytes (int, optional): Maximum number of decoded bytes; None for no limit.
+
+    Returns:
+        str: The decoded text.
+    """
+    if not data:
+        return ''
+    if max_bytes is not None:
+        # Every 4 base64 characters encode 3 bytes.
+        data = data[:-(-max_bytes // 3) * 4]
+
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    pieces = []
+    produced = 0
+    truncated = False
+    for start in range(0, len(data), _DECODE_CHUNK_CHARS):
+        chunk = data[start:start + _DECODE_CHUNK_CHARS]
+        # Gmail may leave off the trailing padding.
+        raw = base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4))
+        if max_bytes is not None and produced + len(raw) >= max_bytes:
+            truncated = produced + len(raw) > max_bytes
+            raw = raw[:max_bytes - produced]
+        produced += len(raw)
+        pieces.append(decoder.decode(raw))
+    if not truncated:
+        # A character cut in half by the size cap is dropped rather than replaced.
+        pieces.append(decoder.decode(b'', final=True))
+    return ''.join(pieces)
+
+
+# Each distinct set of label IDs is kept once, however many messages carry it.
+_label_sets = {}
+_label_sets_lock = threading.Lock()
+
+
+def intern_labels(label_ids):
+    """Returns the shared tuple of interned strings for a list of label IDs."""
+    key = tuple(label_ids or ())
+    labels = _label_sets.get(key)
+    if labels is None:
+        with _label_sets_lock:
+            labels = _label_sets.setdefault(key, tuple(sys.intern(label) for label in key))
+    return labels
+
+
+class EmailRecord(Mapping):
+    """
+    One email, as the agent handles it from fetching to acting.
+
+    Fields are attributes (record.subject, record.thread_id), and the record is
+    also a read-only mapping with the keys of the agent's email dictionaries
+    ('id', 'threadId', 'snippet', 'sender', 'recipient', 'subject', 'labelIds',
+    'body'), so code written for plain dictionaries works on it unchanged.
+
+    The body is decoded on first access; after that the raw payload is released.
+    `sender_address` and `sender_domain` are worked out once, at parse time.
+    Senders, recipients, their addresses and domains, and label IDs are interned.
+
+    Args:
+        msg (dict): A message resource returned by `users().messages().get`.
+        max_body_bytes (int, optional): Cap on the decoded body size.
+    """
+
+    __slots__ = ('id', 'thread_id', 'snippet', 'sender', 'recipient', 'subject', 'label_ids',
+                 'sender_address', 'sender_domain', '_body', '_payload', '_max_body_bytes')
+
+    KEYS = ('id', 'threadId', 'snippet', 'sender', 'recipient', 'subject', 'labelIds', 'body')
+
+    # Mapping key -> attribute.
+    _ATTRIBUTES = {'id': 'id', 'threadId': 'thread_id', 'snippet': 'snippet', 'sender': 'sender',
+                   'recipient': 'recipient', 'subject': 'subject', 'labelIds': 'label_ids', 'body': 'body'}
+
+    def __init__(self, msg, max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+        payload = msg.get('payload', {})
+        headers = payload.get('headers', [])
+        self._set(msg.get('id'), msg.get('threadId'), msg.get('snippet'), _header_value(headers, 'From'),
+                  _header_value(headers, 'To'), _header_value(headers, 'Subject'), msg.get('labelIds'))
+        self._body = None
+        self._payload = payload
+        self._max_body_bytes = max_body_bytes
+
+    def _set(self, message_id, thread_id, snippet, sender, recipient, subject, label_ids):
+        self.id = message_id
+        self.thread_id = thread_id
+        self.snippet = snippet
+        # A backlog comes from far fewer correspondents than it has messages, so the
+        # sender and recipient strings are shared between records.
+        self.sender = sys.intern(sender) if sender else sender
+        self.recipient = sys.intern(recipient) if recipient else recipient
+        self.subject = subject
+        self.label_ids = intern_labels(label_ids)
+        self.sender_address = address = sys.intern(extract_address(sender or ''))
+        self.sender_domain = sys.intern(address.rpartition('@')[2])
+
+    @classmethod
+    def from_fields(cls, message_id, thread_id=None, snippet=None, sender='', recipient='', subject='',
+                    body='', label_ids=None):
+        """Builds a record from already decoded fields."""
+        record = cls.__new__(cls)
+        record._set(message_id, thread_id, snippet, sender, recipient, subject, label_ids)
+        record._body = body
+        record._payload = None
+        record._max_body_bytes = None
+        return record
+
+    @classmethod
+    def from_mapping(cls, email):
+        """Builds a record from an email dictionary (or returns the record it is given)."""
+        if isinstance(email, cls):
+            return email
+        return cls.from_fields(email.get('id'), email.get('threadId'), email.get('snippet'),
+                               email.get('sender') or '', email.get('recipient') or '',
+                               email.get('subject') or '', email.get('body') or '', email.get('labelIds'))
+
+    @property
+    def body(self):
+        body = self._body
+        if body is None:
+            part = find_text_part(self._payload)
+            body = ''
+            if part is not None:
+                body = decode_body(part.get('body', {}).get('data', ''),
+                                   charset=_content_charset(part),
+                                   max_bytes=self._max_body_bytes)
+            self._body = body
+            self._payload = None
+        return body
+
+    @property
+    def body_loaded(self):
+        return self._body is not None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._ATTRIBUTES[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        name = self._ATTRIBUTES.get(key)
+        return default if name is None else getattr(self, name)
+
+    def __contains__(self, key):
+        return key in self._ATTRIBUTES
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return f"EmailRecord(id={self.id!r}, subject={self.subject!r})"
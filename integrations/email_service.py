@@ -2,93 +2,264 @@
 # This module contains all functions for interacting with the Gmail API.
 
 import base64
-from email.mime.text import MIMEText
+import itertools
+import logging
+import threading
 from googleapiclient.errors import HttpError
 # Import the authentication service we created
 from integrations.auth_service import get_google_api_service
+from integrations.email_message import DEFAULT_MAX_BODY_BYTES, EmailRecord
+from integrations.governor import CircuitOpenError, TransportError, governor, is_retryable
 
-def fetch_unread_emails():
+logger = logging.getLogger(__name__)
+
+# Gmail accepts at most 100 calls in a single batch request.
+MAX_BATCH_SIZE = 100
+
+# Headers the agent reads when only metadata is fetched.
+METADATA_HEADERS = ['From', 'To', 'Subject']
+
+# Trims full-format responses down to the fields the parser actually uses.
+FULL_MESSAGE_FIELDS = 'id,threadId,snippet,labelIds,payload(mimeType,headers,body/data,parts)'
+
+
+def _parse_message(msg, max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+    """
+    Converts a Gmail API message resource into the agent's email record.
+    Headers are parsed immediately; the body is decoded on first access.
+
+    Args:
+        msg (dict): A message resource returned by `users().messages().get`.
+        max_body_bytes (int, optional): Cap on the decoded body size.
+
+    Returns:
+        EmailRecord: A slotted, dict-like email with id, threadId, snippet, sender,
+                     recipient, subject, labelIds and body.
+    """
+    return EmailRecord(msg, max_body_bytes=max_body_bytes)
+
+
+def iter_message_ids(service, query='is:unread'):
+    """
+    Lists the IDs of all messages matching a query, one result page at a time.
+
+    Args:
+        service: An authenticated Gmail service object.
+        query (str): A Gmail search query.
+
+    Yields:
+        list: The message ID strings of each page, in the order the API returned them.
+    """
+    messages_api = service.users().messages()
+    request = messages_api.list(userId='me', q=query, maxResults=500)
+    while request is not None:
+        response = governor.execute(request)
+        yield [m['id'] for m in response.get('messages', [])]
+        request = messages_api.list_next(request, response)
+
+
+def list_message_ids(service, query='is:unread'):
+    """
+    Lists the IDs of all messages matching a query, following every result page.
+
+    Args:
+        service: An authenticated Gmail service object.
+        query (str): A Gmail search query.
+
+    Returns:
+        list: Message ID strings, in the order the API returned them.
+    """
+    return [message_id for page in iter_message_ids(service, query) for message_id in page]
+
+
+def iter_messages(service, message_ids, batch_size=MAX_BATCH_SIZE, include_body=True,
+                  max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+    """
+    Fetches and parses messages through Gmail batch requests, yielding each
+    batch's messages as soon as its response has arrived.
+
+    `message_ids` may be a lazy iterable (e.g. the pages of iter_message_ids,
+    flattened): a batch is sent as soon as enough IDs are known, so the first
+    messages come back before the listing is complete. Calls that were
+    throttled or failed transiently are fetched again at the end, after a
+    backoff delay.
+
+    Args:
+        service: An authenticated Gmail service object.
+        message_ids (iterable): The IDs of the messages to fetch.
+        batch_size (int): Number of `messages().get` calls per batch (1-100).
+        include_body (bool): If False, only headers are fetched (format=metadata).
+        max_body_bytes (int, optional): Cap on each decoded body; None for no limit.
+
+    Yields:
+        list: The parsed EmailRecords of one batch request, in request order.
+            Messages that failed to fetch are left out.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    messages_api = service.users().messages()
+    fetched = []
+    retry_ids = []
+    attempt = 0
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            if is_retryable(exception) and attempt < governor.max_retries:
+                retry_ids.append(request_id)
+                return
+            logger.error("Failed to fetch message %s: %s", request_id, exception)
+            return
+        fetched.append(_parse_message(response, max_body_bytes))
+
+    pending = iter(message_ids)
+    while True:
+        chunk = list(itertools.islice(pending, batch_size))
+        if not chunk:
+            if not retry_ids:
+                return
+            retrying = list(retry_ids)
+            del retry_ids[:]
+            pending = iter(retrying)
+            attempt += 1
+            logger.warning("Retrying %d throttled message fetch(es) (attempt %d).", len(retrying), attempt)
+            governor.sleep(governor.backoff_delay(attempt))
+            continue
+
+        batch = service.new_batch_http_request(callback=on_response)
+        for message_id in chunk:
+            if include_body:
+                request = messages_api.get(userId='me', id=message_id, format='full',
+                                           fields=FULL_MESSAGE_FIELDS)
+            else:
+                request = messages_api.get(userId='me', id=message_id, format='metadata',
+                                           metadataHeaders=METADATA_HEADERS)
+            batch.add(request, request_id=message_id)
+        governor.execute(batch)
+        if fetched:
+            yield fetched
+            fetched = []
+
+
+def fetch_messages(service, message_ids, batch_size=MAX_BATCH_SIZE, include_body=True,
+                   max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+    """
+    Fetches and parses messages through Gmail batch requests.
+
+    Calls inside a batch that were throttled or failed transiently are fetched
+    again in a later batch, after a backoff delay.
+
+    Args:
+        service: An authenticated Gmail service object.
+        message_ids (list): The IDs of the messages to fetch.
+        batch_size (int): Number of `messages().get` calls per batch (1-100).
+        include_body (bool): If False, only headers are fetched (format=metadata).
+        max_body_bytes (int, optional): Cap on each decoded body; None for no limit.
+
+    Returns:
+        list: Parsed EmailRecords, in the same order as message_ids.
+            Messages that failed to fetch are left out.
+    """
+    fetched = {email['id']: email
+               for batch in iter_messages(service, message_ids, batch_size, include_body, max_body_bytes)
+               for email in batch}
+    return [fetched[m_id] for m_id in message_ids if m_id in fetched]
+
+
+def fetch_unread_emails(batch_size=MAX_BATCH_SIZE, include_body=True, service=None,
+                        max_body_bytes=DEFAULT_MAX_BODY_BYTES):
     """
     Fetches all unread emails from the user's inbox, parses them,
     and returns a list of email data.
+
+    Every result page of the unread listing is read, and the messages
+    themselves are fetched through batch requests of up to `batch_size` calls.
+
+    Args:
+        batch_size (int, optional): Messages per batch request (1-100). Defaults to 100.
+        include_body (bool, optional): Whether to download and decode message bodies.
+                                       Defaults to True.
+        service (optional): A Gmail service object to use instead of the shared one.
+        max_body_bytes (int, optional): Cap on each decoded body. Defaults to 256 KB.
+
+    Returns:
+        list: A list of EmailRecords (see integrations.email_message).
     """
     try:
-        service = get_google_api_service('gmail', 'v1')
+        service = service or get_google_api_service('gmail', 'v1')
         if not service:
-            print("Failed to get Gmail service. Aborting.")
+            logger.error("Failed to get Gmail service. Aborting.")
             return []
 
-        # List all unread messages
-        results = service.users().messages().list(userId='me', q='is:unread').execute()
-        messages = results.get('messages', [])
+        # List all unread messages, across every page of results
+        message_ids = list_message_ids(service, query='is:unread')
 
-        if not messages:
-            print("No unread messages found.")
+        if not message_ids:
+            logger.info("No unread messages found.")
             return []
 
-        print(f"Found {len(messages)} unread messages. Fetching details...")
-        
-        email_list = []
-        for message_info in messages:
-            msg = service.users().messages().get(userId='me', id=message_info['id']).execute()
-            payload = msg.get('payload', {})
-            headers = payload.get('headers', [])
-            
-            # Extract sender, recipient, and subject from headers
-            email_data = {
-                'id': msg.get('id'),
-                'threadId': msg.get('threadId'),
-                'snippet': msg.get('snippet'),
-                'sender': '',
-                'recipient': '',
-                'subject': ''
-            }
-            for header in headers:
-                name = header.get('name', '').lower()
-                if name == 'from':
-                    email_data['sender'] = header.get('value')
-                elif name == 'to':
-                    email_data['recipient'] = header.get('value')
-                elif name == 'subject':
-                    email_data['subject'] = header.get('value')
-
-            # Get the email body
-            body = ''
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    if part['mimeType'] == 'text/plain':
-                        encoded_body = part.get('body', {}).get('data', '')
-                        body = base64.urlsafe_b64decode(encoded_body).decode('utf-8')
-                        break
-            else:
-                encoded_body = payload.get('body', {}).get('data', '')
-                if encoded_body:
-                    body = base64.urlsafe_b64decode(encoded_body).decode('utf-8')
-            
-            email_data['body'] = body
-            email_list.append(email_data)
-        
-        print("Finished fetching email details.")
+        logger.info("Found %d unread messages. Fetching details...", len(message_ids))
+        email_list = fetch_messages(service, message_ids, batch_size=batch_size,
+                                    include_body=include_body, max_body_bytes=max_body_bytes)
+
+        logger.info("Finished fetching email details.")
         return email_list
 
     except HttpError as error:
-        print(f"An error occurred with the Gmail API: {error}")
+        logger.error("An error occurred with the Gmail API: %s", error)
         return []
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error("An unexpected error occurred: %s", e)
         return []
 
+
+def stream_unread_emails(batch_size=MAX_BATCH_SIZE, include_body=True, service=None,
+                         max_body_bytes=DEFAULT_MAX_BODY_BYTES):
+    """
+    Like fetch_unread_emails, but yields the emails batch by batch as they arrive,
+    so callers can start on the first ones while the rest is still being fetched.
+
+    Listing and fetching overlap: the first batch request is sent as soon as the
+    first page of the unread listing is in.
+
+    Args:
+        batch_size (int, optional): Messages per batch request (1-100). Defaults to 100.
+        include_body (bool, optional): Whether to download and decode message bodies.
+        service (optional): A Gmail service object to use instead of the shared one.
+        max_body_bytes (int, optional): Cap on each decoded body. Defaults to 256 KB.
+
+    Yields:
+        list: The EmailRecords of each batch request. An API error is logged and ends the stream.
+    """
+    try:
+        service = service or get_google_api_service('gmail', 'v1')
+        if not service:
+            logger.error("Failed to get Gmail service. Aborting.")
+            return
+
+        message_ids = itertools.chain.from_iterable(iter_message_ids(service, query='is:unread'))
+        yield from iter_messages(service, message_ids, batch_size=batch_size,
+                                 include_body=include_body, max_body_bytes=max_body_bytes)
+
+    except HttpError as error:
+        logger.error("An error occurred with the Gmail API: %s", error)
+    except Exception as e:
+        logger.error("An unexpected error occurred: %s", e)
+
 def send_email(to, subject, body_text):
     """
     Creates and sends an email on behalf of the user.
+
+    Returns:
+        str: The ID of the sent message, or None if sending failed.
     """
     try:
         service = get_google_api_service('gmail', 'v1')
         if not service:
-            print("Failed to get Gmail service for sending email.")
-            return
+            logger.error("Failed to get Gmail service for sending email.")
+            return None
 
-        # Create the email message object using MIMEText
+        # Create the email message object using MIMEText (imported here; the email
+        # package is slow to import and most cycles send nothing)
+        from email.mime.text import MIMEText
         message = MIMEText(body_text)
         message['to'] = to
         message['subject'] = subject
@@ -99,40 +270,140 @@ def send_email(to, subject, body_text):
         create_message = {'raw': encoded_message}
         
         # Call the API to send the email
-        send_message = service.users().messages().send(userId="me", body=create_message).execute()
-        print(f"Email sent successfully. Message ID: {send_message['id']}")
+        send_message = governor.execute(service.users().messages().send(userId="me", body=create_message))
+        logger.info("Email sent successfully. Message ID: %s", send_message['id'])
+        return send_message['id']
 
     except HttpError as error:
-        print(f"An error occurred while sending email: {error}")
+        logger.error("An error occurred while sending email: %s", error)
+        return None
     except Exception as e:
-        print(f"An unexpected error occurred while sending email: {e}")
+        logger.error("An unexpected error occurred while sending email: %s", e)
+        return None
 
 def modify_message_labels(message_id, labels_to_add=[], labels_to_remove=[]):
     """A helper function to add or remove labels from a message."""
     try:
         service = get_google_api_service('gmail', 'v1')
         if not service:
-            print("Failed to get Gmail service for modifying labels.")
+            logger.error("Failed to get Gmail service for modifying labels.")
             return
 
         body = {
             'addLabelIds': labels_to_add,
             'removeLabelIds': labels_to_remove
         }
-        service.users().messages().modify(userId='me', id=message_id, body=body).execute()
+        governor.execute(service.users().messages().modify(userId='me', id=message_id, body=body))
         # print(f"Successfully modified labels for message {message_id}.")
         return True
-    except HttpError as error:
-        print(f"An error occurred while modifying labels: {error}")
+    except (HttpError, CircuitOpenError, TransportError) as error:
+        logger.error("An error occurred while modifying labels: %s", error)
         return False
 
-def mark_as_read(message_id):
-    """Marks a specific message as read by removing the 'UNREAD' label."""
-    print(f"ACTION: Marking message {message_id} as read.")
-    modify_message_labels(message_id, labels_to_remove=['UNREAD'])
+# Gmail's batchModify accepts at most 1000 message IDs per call.
+MAX_BATCH_MODIFY_IDS = 1000
+
+
+class LabelChangeQueue:
+    """
+    Collects label changes during a cycle and applies them with as few
+    `messages().batchModify` calls as possible.
+
+    Changes are grouped by their (add, remove) label sets, so marking 500
+    messages as read becomes a single request. It is safe to queue changes
+    from several threads.
+
+    Args:
+        service (optional): A Gmail service object to use instead of the shared one.
+    """
+
+    def __init__(self, service=None):
+        self._service = service
+        self._lock = threading.Lock()
+        self._changes = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._changes)
 
-def move_to_spam(message_id):
-    """Moves a specific message to Spam by adding the 'SPAM' label."""
-    print(f"ACTION: Moving message {message_id} to Spam.")
-    modify_message_labels(message_id, labels_to_add=['SPAM'])
+    def queue(self, message_id, labels_to_add=(), labels_to_remove=()):
+        """Queues a label change; changes queued twice for a message are merged."""
+        with self._lock:
+            add, remove = self._changes.get(message_id, (set(), set()))
+            add = (add - set(labels_to_remove)) | set(labels_to_add)
+            remove = (remove - set(labels_to_add)) | set(labels_to_remove)
+            self._changes[message_id] = (add, remove)
 
+    def discard(self, message_ids):
+        """Drops the queued changes of the given messages, so their labels stay as they are."""
+        with self._lock:
+            for message_id in message_ids:
+                self._changes.pop(message_id, None)
+
+    def flush(self, hold=()):
+        """
+        Applies every queued change.
+
+        Args:
+            hold (collection, optional): Messages whose changes stay queued for a later flush.
+
+        Returns:
+            dict: message_id -> True if its labels were updated, False otherwise.
+        """
+        with self._lock:
+            changes, self._changes = self._changes, {}
+            for message_id in hold:
+                if message_id in changes:
+                    self._changes[message_id] = changes.pop(message_id)
+        if not changes:
+            return {}
+
+        groups = {}
+        for message_id, (add, remove) in changes.items():
+            groups.setdefault((tuple(sorted(add)), tuple(sorted(remove))), []).append(message_id)
+
+        results = {}
+        service = self._service or get_google_api_service('gmail', 'v1')
+        if not service:
+            logger.error("Failed to get Gmail service for modifying labels.")
+            return {message_id: False for message_id in changes}
+
+        for (add, remove), message_ids in groups.items():
+            for start in range(0, len(message_ids), MAX_BATCH_MODIFY_IDS):
+                chunk = message_ids[start:start + MAX_BATCH_MODIFY_IDS]
+                body = {'ids': chunk, 'addLabelIds': list(add), 'removeLabelIds': list(remove)}
+                try:
+                    governor.execute(service.users().messages().batchModify(userId='me', body=body))
+                    ok = True
+                except (HttpError, CircuitOpenError, TransportError) as error:
+                    logger.error("An error occurred while modifying labels of %d message(s): %s",
+                                 len(chunk), error)
+                    ok = False
+                results.update(dict.fromkeys(chunk, ok))
+
+        logger.info("Applied label changes to %d message(s) in %d request(s).", len(results),
+                    sum(1 + (len(ids) - 1) // MAX_BATCH_MODIFY_IDS for ids in groups.values()))
+        return results
+
+
+def mark_as_read(message_id, label_queue=None):
+    """
+    Marks a specific message as read by removing the 'UNREAD' label.
+    If a LabelChangeQueue is given, the change is queued for its next flush.
+    """
+    logger.info("ACTION: Marking message %s as read.", message_id)
+    if label_queue is not None:
+        label_queue.queue(message_id, labels_to_remove=['UNREAD'])
+        return True
+    return modify_message_labels(message_id, labels_to_remove=['UNREAD'])
+
+def move_to_spam(message_id, label_queue=None):
+    """
+    Moves a specific message to Spam by adding the 'SPAM' label.
+    If a LabelChangeQueue is given, the change is queued for its next flush.
+    """
+    logger.info("ACTION: Moving message %s to Spam.", message_id)
+    if label_queue is not None:
+        label_queue.queue(message_id, labels_to_add=['SPAM'])
+        return True
+    return modify_message_labels(message_id, labels_to_add=['SPAM'])
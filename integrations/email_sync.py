@@ -0,0 +1,242 @@
+# integrations/email_sync.py
+# Incremental mailbox synchronisation using Gmail history IDs.
+# Instead of re-listing every unread message on each poll, the agent remembers
+# the last historyId it processed and only asks Gmail for what changed since.
+
+import itertools
+import logging
+from googleapiclient.errors import HttpError
+from config import SYNC_RETRY_CYCLES
+from integrations.auth_service import get_google_api_service
+from integrations.email_message import DEFAULT_MAX_BODY_BYTES
+from integrations.email_service import MAX_BATCH_SIZE, iter_message_ids, iter_messages
+from integrations.governor import CircuitOpenError, TransportError, governor
+
+logger = logging.getLogger(__name__)
+
+HISTORY_STATE_KEY = 'gmail_history_id'
+# Messages left unfinished by earlier cycles: message ID -> cycles that have tried it.
+RETRY_STATE_KEY = 'gmail_retry_ids'
+
+
+class MailboxSync:
+    """
+    Tracks the Gmail mailbox through `users().history().list` deltas.
+
+    The first poll (or any poll after the stored history ID has expired) does a
+    full `is:unread` resync. Later polls cost a single history request when
+    nothing has changed. `stream()` yields the messages batch by batch as they
+    are fetched; `poll()` returns them all at once. The new history ID is only
+    persisted by `commit()`, which the caller runs once the polled messages
+    have been handled.
+
+    The history delta moves on past messages the caller could not finish, so
+    `commit()` takes their IDs and the next polls fetch them again first, for
+    up to `retry_cycles` cycles.
+
+    Args:
+        state_store: An object with get(key) / set(key, value), e.g. StateStore.
+        batch_size (int): Messages per batch request when fetching details.
+        service (optional): A Gmail service object to use instead of the shared one.
+        max_body_bytes (int, optional): Cap on each decoded message body.
+        retry_cycles (int): Polls that fetch an unfinished message again before it is dropped.
+    """
+
+    def __init__(self, state_store, batch_size=MAX_BATCH_SIZE, service=None,
+                 max_body_bytes=DEFAULT_MAX_BODY_BYTES, retry_cycles=SYNC_RETRY_CYCLES):
+        self.state_store = state_store
+        self.batch_size = batch_size
+        self.max_body_bytes = max_body_bytes
+        self.retry_cycles = retry_cycles
+        self._service = service
+        self._pending_history_id = None
+        # Whether the current stream() has listed every message ID it will fetch.
+        self.listed = False
+        # The message IDs the current stream() has listed, retries included.
+        self.listed_ids = []
+        # Messages the user sent, as reported by the current stream()'s history delta.
+        self.sent_ids = []
+
+    @property
+    def service(self):
+        return self._service or get_google_api_service('gmail', 'v1')
+
+    def _full_sync(self, service):
+        """Yields the IDs of every unread message, one listing page at a time."""
+        logger.info("Running full mailbox resync...")
+        # Read the history ID first so nothing that arrives during the listing is missed.
+        profile = governor.execute(service.users().getProfile(userId='me'))
+        yield from iter_message_ids(service, query='is:unread')
+        self._pending_history_id = profile['historyId']
+
+    def _history_delta(self, service, start_history_id):
+        """Yields the IDs of messages that became unread since start_history_id, page by page."""
+        history_api = service.users().history()
+        request = history_api.list(userId='me', startHistoryId=start_history_id,
+                                   historyTypes=['messageAdded', 'labelAdded'])
+        seen, seen_sent = set(), set()
+        latest_history_id = start_history_id
+        while request is not None:
+            response = governor.execute(request)
+            latest_history_id = response.get('historyId', latest_history_id)
+            message_ids = []
+            for record in response.get('history', []):
+                for change in record.get('messagesAdded', []):
+                    message = change.get('message', {})
+                    if 'SENT' in message.get('labelIds', []) and message['id'] not in seen_sent:
+                        seen_sent.add(message['id'])
+                        self.sent_ids.append(message['id'])
+                changes = record.get('messagesAdded', []) + record.get('labelsAdded', [])
+                for change in changes:
+                    message = change.get('message', {})
+                    if 'UNREAD' not in message.get('labelIds', []):
+                        continue
+                    if message['id'] not in seen:
+                        seen.add(message['id'])
+                        message_ids.append(message['id'])
+            yield message_ids
+            request = history_api.list_next(request, response)
+
+        self._pending_history_id = latest_history_id
+
+    @property
+    def retry_ids(self):
+        """The IDs of the messages the next poll fetches again."""
+        return list(self.state_store.get(RETRY_STATE_KEY) or {})
+
+    def _message_id_pages(self, service):
+        retry_ids = self.retry_ids
+        seen = set(retry_ids)
+        if retry_ids:
+            logger.info("Fetching %d message(s) left unfinished by earlier cycles again.", len(retry_ids))
+            self.listed_ids.extend(retry_ids)
+            yield retry_ids
+        for page in self._list_pages(service):
+            page = [message_id for message_id in page if message_id not in seen]
+            seen.update(page)
+            self.listed_ids.extend(page)
+            yield page
+        self.listed = True
+
+    def _list_pages(self, service):
+        start_history_id = self.state_store.get(HISTORY_STATE_KEY)
+        if start_history_id is None:
+            yield from self._full_sync(service)
+            return
+        try:
+            # The first page is read up front: an expired history ID fails there.
+            pages = self._history_delta(service, start_history_id)
+            first_page = next(pages, None)
+        except HttpError as error:
+            # Gmail answers 404 once a history ID is too old to be served.
+            if error.resp.status != 404:
+                raise
+            logger.warning("History ID %s has expired.", start_history_id)
+            yield from self._full_sync(service)
+            return
+        if first_page is not None:
+            yield first_page
+            yield from pages
+
+    def stream(self):
+        """
+        Fetches the unread messages that are new since the last committed sync,
+        yielding them batch by batch as they arrive.
+
+        The listing (or history delta) and the message fetches overlap, so the
+        first batch is available after a couple of round trips, however large the
+        backlog. If the stream ends with an error, the sync position is left where
+        it was, and the next poll sees the same messages again.
+
+        `listed` turns True once every message ID has been listed. Until then,
+        callers should not mark messages as read: that shifts the pages of the
+        `is:unread` listing a full resync is still going through.
+
+        Yields:
+            list: The lazily decoded EmailRecords of one batch request (see email_service.iter_messages).
+        """
+        self._pending_history_id = None
+        self.listed = False
+        self.listed_ids = []
+        self.sent_ids = []
+        try:
+            service = self.service
+            if not service:
+                logger.error("Failed to get Gmail service. Aborting.")
+                return
+
+            found = 0
+            message_ids = itertools.chain.from_iterable(self._message_id_pages(service))
+            for batch in iter_messages(service, message_ids, batch_size=self.batch_size,
+                                       max_body_bytes=self.max_body_bytes):
+                if not found:
+                    logger.info("Receiving new unread messages...")
+                found += len(batch)
+                yield batch
+            if found:
+                logger.info("Fetched %d new unread message(s).", found)
+
+        except HttpError as error:
+            self._pending_history_id = None
+            logger.error("An error occurred while syncing the mailbox: %s", error)
+        except Exception as e:
+            self._pending_history_id = None
+            logger.error("An unexpected error occurred while syncing the mailbox: %s", e)
+
+    def poll(self):
+        """
+        Fetches the unread messages that are new since the last committed sync.
+
+        Returns:
+            list: Lazily decoded EmailRecords (see email_service.iter_messages).
+        """
+        return [email for batch in self.stream() for email in batch]
+
+    def fetch_sent(self):
+        """
+        Fetches the messages the user sent that the last poll's history delta
+        reported (a full resync reports none), e.g. to index them as replies.
+
+        Returns:
+            list: Lazily decoded EmailRecords; empty if they could not be fetched.
+        """
+        if not self.sent_ids:
+            return []
+        try:
+            return [email for batch in iter_messages(self.service, self.sent_ids, batch_size=self.batch_size,
+                                                     max_body_bytes=self.max_body_bytes)
+                    for email in batch]
+        except (HttpError, CircuitOpenError, TransportError) as error:
+            logger.warning("Could not fetch %d sent message(s): %s", len(self.sent_ids), error)
+            return []
+
+    def commit(self, unfinished=()):
+        """
+        Persists the history ID reached by the last poll.
+
+        Args:
+            unfinished (iterable): IDs of polled messages that were not handled; the
+                next polls fetch them again, up to `retry_cycles` times.
+        """
+        tried = self.state_store.get(RETRY_STATE_KEY) or {}
+        # Retries the last poll never got to (e.g. it had no service) wait for the next one.
+        listed = set(self.listed_ids)
+        retries = {message_id: attempts for message_id, attempts in tried.items()
+                   if message_id not in listed}
+        for message_id in unfinished:
+            attempts = tried.get(message_id, 0) + 1
+            if attempts > self.retry_cycles:
+                logger.warning("Giving up on message %s: still unfinished after %d cycle(s).",
+                               message_id, attempts)
+                continue
+            retries[message_id] = attempts
+        if retries != tried:
+            self.state_store.set(RETRY_STATE_KEY, retries)
+        if self._pending_history_id is not None:
+            self.state_store.set(HISTORY_STATE_KEY, self._pending_history_id)
+            self._pending_history_id = None
+
+    def reset(self):
+        """Forgets the stored history ID so the next poll does a full resync."""
+        self._pending_history_id = None
+        self.state_store.delete(HISTORY_STATE_KEY)
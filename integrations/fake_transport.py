@@ -0,0 +1,496 @@
+# integrations/fake_transport.py
+# An in-memory stand-in for the Google HTTP endpoints, used to exercise and
+# benchmark the integrations offline. It behaves like an httplib2.Http object,
+# so it can be handed straight to googleapiclient's `build(http=...)`.
+
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from email.parser import Parser
+from googleapiclient.discovery import build_from_document
+import httplib2
+from integrations.auth_service import discovery_document
+
+
+def make_fake_message(message_id, sender, subject, body, label_ids=None, thread_id=None):
+    """
+    Builds a Gmail API message resource with a single text/plain body.
+
+    Returns:
+        dict: A message in the shape returned by `users().messages().get(format='full')`.
+    """
+    encoded_body = base64.urlsafe_b64encode(body.encode('utf-8')).decode('ascii')
+    return {
+        'id': message_id,
+        'threadId': thread_id or message_id,
+        'labelIds': list(label_ids or ['INBOX', 'UNREAD']),
+        'snippet': body[:100],
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [
+                {'name': 'From', 'value': sender},
+                {'name': 'To', 'value': 'me@example.com'},
+                {'name': 'Subject', 'value': subject},
+            ],
+            'body': {'size': len(body), 'data': encoded_body},
+        },
+    }
+
+
+def _response(status, payload=None, headers=None):
+    response_headers = {'status': str(status), 'content-type': 'application/json'}
+    response_headers.update(headers or {})
+    content = json.dumps(payload if payload is not None else {}).encode('utf-8')
+    return httplib2.Response(response_headers), content
+
+
+class FakeGoogleHttp:
+    """
+    Base class for fake Google endpoints. Subclasses implement `handle()`;
+    this class takes care of latency simulation, request counting, error
+    injection and the multipart/mixed batch protocol.
+
+    `request_count` counts HTTP round trips; `call_count` counts API calls,
+    including each call inside a batch.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.request_count = 0
+        self.batch_count = 0
+        self.call_count = 0
+        self.error_rate = 0.0
+        self.error_status = 503
+        self._random = random.Random()
+        self._injected_errors = []
+        self._lock = threading.Lock()
+
+    def set_error_rate(self, rate, status=503, seed=None):
+        """Makes a random fraction `rate` of all API calls fail with `status`."""
+        with self._lock:
+            self.error_rate = rate
+            self.error_status = status
+            self._random = random.Random(seed)
+
+    def inject_errors(self, status, count=1, retry_after=None):
+        """Makes the next `count` API calls (including calls inside batches) fail with `status`."""
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        payload = {'error': {'code': status, 'message': 'Injected error.'}}
+        with self._lock:
+            self._injected_errors.extend([(status, payload, headers)] * count)
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=1, connection_type=None):
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = urllib.parse.urlparse(uri)
+        if parsed.path == '/batch' or parsed.path.startswith('/batch/'):
+            return self._handle_batch(body, headers or {})
+
+        return _response(*self._dispatch(method, parsed.path, parsed.query, body))
+
+    def close(self):
+        return None
+
+    def _dispatch(self, method, path, query, body):
+        params = {k: v if len(v) > 1 else v[0]
+                  for k, v in urllib.parse.parse_qs(query).items()}
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        data = json.loads(body) if body else None
+        with self._lock:
+            self.call_count += 1
+            if self._injected_errors:
+                return self._injected_errors.pop(0)
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self.error_status, {'error': {'code': self.error_status,
+                                                     'message': 'Random injected error.'}}
+        try:
+            return self.handle(method, path, params, data)
+        except KeyError:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+    def handle(self, method, path, params, data):
+        """Returns a (status, payload) or (status, payload, headers) tuple for a single API call."""
+        raise NotImplementedError()
+
+    def _handle_batch(self, body, headers):
+        with self._lock:
+            self.batch_count += 1
+        content_type = headers.get('content-type', '')
+        message = Parser().parsestr(f"Content-Type: {content_type}\r\n\r\n{body}")
+
+        boundary = 'fake_batch_boundary'
+        out = []
+        for part in message.get_payload():
+            request_text = part.get_payload()
+            request_line = request_text.split('\n', 1)[0].strip()
+            method, target, _ = request_line.split(' ', 2)
+            parsed = urllib.parse.urlparse(target)
+            # The inner request body follows the first blank line.
+            inner_body = None
+            for separator in ('\r\n\r\n', '\n\n'):
+                if separator in request_text:
+                    inner_body = request_text.split(separator, 1)[1] or None
+                    break
+            status, payload = self._dispatch(method, parsed.path, parsed.query, inner_body)[:2]
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        out.append(f"--{boundary}--")
+        response_headers = {
+            'status': '200',
+            'content-type': f'multipart/mixed; boundary={boundary}',
+        }
+        return httplib2.Response(response_headers), ''.join(out).encode('utf-8')
+
+
+class FakeGmailHttp(FakeGoogleHttp):
+    """
+    A fake Gmail v1 endpoint backed by an in-memory mailbox.
+
+    Args:
+        messages (list): Message resources, e.g. built with `make_fake_message`.
+        latency (float): Seconds of simulated latency per HTTP round trip.
+    """
+
+    def __init__(self, messages=None, latency=0.0):
+        super().__init__(latency)
+        self.messages = {m['id']: m for m in (messages or [])}
+        self.sent = []
+        # Mailbox history: a list of (history_id, record) tuples, oldest first.
+        self.history_id = 1000
+        self.oldest_history_id = self.history_id
+        self.history = []
+
+    def _record_history(self, key, message):
+        self.history_id += 1
+        change = {'message': {k: message[k] for k in ('id', 'threadId', 'labelIds')}}
+        self.history.append((self.history_id, {'id': str(self.history_id), key: [change]}))
+
+    def add_message(self, message):
+        """Delivers a new message into the mailbox, recording a messageAdded history entry."""
+        with self._lock:
+            self.messages[message['id']] = message
+            self._record_history('messagesAdded', message)
+
+    def expire_history(self):
+        """Drops all history so older startHistoryId values return 404, as Gmail does."""
+        with self._lock:
+            self.history = []
+            self.oldest_history_id = self.history_id
+
+    def _modify_labels(self, message, data):
+        labels = [l for l in message['labelIds'] if l not in data.get('removeLabelIds', [])]
+        labels += [l for l in data.get('addLabelIds', []) if l not in labels]
+        added = [l for l in data.get('addLabelIds', []) if l not in message['labelIds']]
+        message['labelIds'] = labels
+        if added:
+            self._record_history('labelsAdded', message)
+        return message
+
+    def _matches(self, message, query):
+        if query and 'is:unread' in query:
+            return 'UNREAD' in message['labelIds']
+        return True
+
+    def _format(self, message, params):
+        fmt = params.get('format', 'full')
+        if fmt == 'minimal':
+            return {k: message[k] for k in ('id', 'threadId', 'labelIds')}
+        if fmt == 'metadata':
+            wanted = params.get('metadataHeaders', [])
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            wanted = {h.lower() for h in wanted}
+            headers = [h for h in message['payload']['headers']
+                       if not wanted or h['name'].lower() in wanted]
+            result = {k: v for k, v in message.items() if k != 'payload'}
+            result['payload'] = {'mimeType': message['payload']['mimeType'], 'headers': headers}
+            return result
+        return message
+
+    def handle(self, method, path, params, data):
+        prefix = '/gmail/v1/users/me/'
+        if not path.startswith(prefix):
+            raise KeyError(path)
+        parts = path[len(prefix):].split('/')
+
+        if parts == ['messages'] and method == 'GET':
+            ids = [m_id for m_id, m in self.messages.items() if self._matches(m, params.get('q'))]
+            page_size = int(params.get('maxResults', 100))
+            start = int(params.get('pageToken', 0))
+            page = ids[start:start + page_size]
+            payload = {
+                'messages': [{'id': m_id, 'threadId': self.messages[m_id]['threadId']} for m_id in page],
+                'resultSizeEstimate': len(ids),
+            }
+            if start + page_size < len(ids):
+                payload['nextPageToken'] = str(start + page_size)
+            return 200, payload
+
+        if parts == ['profile']:
+            return 200, {'emailAddress': 'me@example.com', 'historyId': str(self.history_id)}
+
+        if parts == ['history']:
+            start = int(params['startHistoryId'])
+            if start < self.oldest_history_id:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            records = [record for history_id, record in self.history if history_id > start]
+            return 200, {'history': records, 'historyId': str(self.history_id)}
+
+        if parts == ['messages', 'send'] and method == 'POST':
+            self.sent.append(data)
+            return 200, {'id': f"sent-{len(self.sent)}", 'labelIds': ['SENT']}
+
+        if len(parts) == 2 and parts[0] == 'messages' and method == 'GET':
+            return 200, self._format(self.messages[parts[1]], params)
+
+        if len(parts) == 3 and parts[0] == 'messages' and parts[2] == 'modify':
+            message = self._modify_labels(self.messages[parts[1]], data)
+            return 200, {'id': message['id'], 'labelIds': message['labelIds']}
+
+        if parts == ['messages', 'batchModify'] and method == 'POST':
+            for message_id in data.get('ids', []):
+                if message_id in self.messages:
+                    self._modify_labels(self.messages[message_id], data)
+            return 204, {}
+
+        raise KeyError(path)
+
+
+class FakeDriveHttp(FakeGoogleHttp):
+    """
+    A fake Drive v3 endpoint with folder listings and the resumable upload protocol.
+
+    Uploaded content is kept in memory. Set `interrupt_after_chunks` to make the
+    connection drop after that many chunk uploads, to simulate a crash mid-upload.
+
+    Args:
+        files (list, optional): Existing file resources ('id', 'name', 'parents', 'md5Checksum').
+        latency (float): Seconds of simulated latency per HTTP round trip.
+    """
+
+    def __init__(self, files=None, latency=0.0):
+        super().__init__(latency)
+        self.files = {f['id']: f for f in (files or [])}
+        self.content = {}
+        self.sessions = {}
+        self.bytes_received = 0
+        self.chunk_count = 0
+        self.interrupt_after_chunks = None
+        self._next_id = 0
+
+    def _new_id(self, prefix):
+        with self._lock:
+            self._next_id += 1
+            return f"{prefix}{self._next_id}"
+
+    def expire_sessions(self):
+        """Forgets every open upload session, as Drive does after about a week."""
+        with self._lock:
+            self.sessions.clear()
+
+    def request(self, uri, method='GET', body=None, headers=None,
+                redirections=1, connection_type=None):
+        parsed = urllib.parse.urlparse(uri)
+        if not parsed.path.startswith('/upload/'):
+            return super().request(uri, method, body, headers, redirections, connection_type)
+
+        with self._lock:
+            self.request_count += 1
+            self.call_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+
+        if method == 'POST':
+            # Start of a resumable session: the body is the file metadata.
+            upload_id = self._new_id('upload')
+            self.sessions[upload_id] = {'metadata': json.loads(body or '{}'), 'data': bytearray()}
+            location = f"{parsed.scheme}://{parsed.netloc}{parsed.path}?uploadType=resumable&upload_id={upload_id}"
+            return _response(200, {}, {'location': location})
+
+        session = self.sessions.get(params.get('upload_id'))
+        if session is None:
+            return _response(404, {'error': {'code': 404, 'message': 'Upload session not found.'}})
+
+        if hasattr(body, 'read'):
+            body = body.read()
+        chunk = body or b''
+        content_range = headers.get('content-range', '')
+        if chunk:
+            with self._lock:
+                self.chunk_count += 1
+                interrupted = (self.interrupt_after_chunks is not None
+                               and self.chunk_count > self.interrupt_after_chunks)
+            if interrupted:
+                raise ConnectionResetError("Simulated connection drop during upload.")
+            start = int(content_range.split(' ', 1)[1].split('-', 1)[0])
+            del session['data'][start:]
+            session['data'] += chunk
+            with self._lock:
+                self.bytes_received += len(chunk)
+
+        total = content_range.rsplit('/', 1)[-1]
+        if total != '*' and len(session['data']) == int(total):
+            return _response(200, self._finish_upload(params['upload_id'], session))
+        range_header = {'range': f"bytes=0-{len(session['data']) - 1}"} if session['data'] else {}
+        return _response(308, {}, range_header)
+
+    def _finish_upload(self, upload_id, session):
+        data = bytes(session['data'])
+        file_id = self._new_id('file')
+        resource = dict(session['metadata'], id=file_id, size=str(len(data)),
+                        md5Checksum=hashlib.md5(data).hexdigest())
+        resource.setdefault('parents', [])
+        with self._lock:
+            self.files[file_id] = resource
+            self.content[file_id] = data
+            del self.sessions[upload_id]
+        return resource
+
+    def handle(self, method, path, params, data):
+        if path == '/drive/v3/files' and method == 'GET':
+            files = list(self.files.values())
+            query = params.get('q', '')
+            if ' in parents' in query:
+                parent = query.split("'", 2)[1]
+                files = [f for f in files if parent in f.get('parents', [])]
+            page_size = int(params.get('pageSize', 100))
+            start = int(params.get('pageToken', 0))
+            payload = {'files': files[start:start + page_size]}
+            if start + page_size < len(files):
+                payload['nextPageToken'] = str(start + page_size)
+            return 200, payload
+        raise KeyError(path)
+
+
+class FakeCalendarHttp(FakeGoogleHttp):
+    """
+    A fake Calendar v3 endpoint: event insert and listing (with sync tokens) and
+    free/busy queries, for a set of in-memory calendars.
+
+    Args:
+        events (dict, optional): calendar ID -> list of event resources.
+        latency (float): Seconds of simulated latency per HTTP round trip.
+    """
+
+    def __init__(self, events=None, latency=0.0):
+        super().__init__(latency)
+        self.calendars = {}
+        # Every change gets a sequence number; a sync token is the last number a client saw.
+        self.sequence = 0
+        self.oldest_sync_token = 0
+        self.inserted = []
+        for calendar_id, calendar_events in (events or {}).items():
+            for event in calendar_events:
+                self.put_event(calendar_id, dict(event))
+
+    def put_event(self, calendar_id, event):
+        """Adds or replaces an event, as if it was edited in another client."""
+        with self._lock:
+            self.sequence += 1
+            event.setdefault('id', f"evt{self.sequence}")
+            event.setdefault('status', 'confirmed')
+            event['_sequence'] = self.sequence
+            self.calendars.setdefault(calendar_id, {})[event['id']] = event
+        return event
+
+    def cancel_event(self, calendar_id, event_id):
+        """Cancels an event; sync listings report it with status 'cancelled'."""
+        event = dict(self.calendars[calendar_id][event_id], status='cancelled')
+        return self.put_event(calendar_id, event)
+
+    def expire_sync_tokens(self):
+        """Makes every sync token issued so far invalid (410 Gone), as Calendar sometimes does."""
+        with self._lock:
+            self.oldest_sync_token = self.sequence
+
+    @staticmethod
+    def _when(value):
+        """Parses an RFC 3339 timestamp; naive values are taken as UTC."""
+        moment = datetime.fromisoformat(value)
+        return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+    @staticmethod
+    def _public(event):
+        return {k: v for k, v in event.items() if not k.startswith('_')}
+
+    def _list_events(self, calendar_id, params):
+        events = sorted(self.calendars.get(calendar_id, {}).values(), key=lambda e: e['_sequence'])
+        window = [name for name in ('timeMin', 'timeMax', 'updatedMin') if name in params]
+        if 'syncToken' in params and window:
+            return 400, {'error': {'code': 400, 'message': f"syncToken cannot be combined with {window[0]}."}}
+        if 'syncToken' in params:
+            token = int(params['syncToken'])
+            if token < self.oldest_sync_token:
+                return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid.'}}
+            events = [e for e in events if e['_sequence'] > token]
+        else:
+            events = [e for e in events if e['status'] != 'cancelled']
+            if 'timeMin' in params:
+                time_min = self._when(params['timeMin'])
+                events = [e for e in events
+                          if self._when(e['end'].get('dateTime', e['end'].get('date'))) > time_min]
+        page_size = int(params.get('maxResults', 250))
+        start = int(params.get('pageToken', 0))
+        payload = {'items': [self._public(e) for e in events[start:start + page_size]]}
+        if start + page_size < len(events):
+            payload['nextPageToken'] = str(start + page_size)
+        elif not window:
+            # A windowed listing cannot be continued incrementally, so it gets no sync token.
+            payload['nextSyncToken'] = str(self.sequence)
+        return 200, payload
+
+    def _free_busy(self, data):
+        calendars = {}
+        time_min, time_max = self._when(data['timeMin']), self._when(data['timeMax'])
+        for item in data.get('items', []):
+            busy = [
+                {'start': e['start']['dateTime'], 'end': e['end']['dateTime']}
+                for e in self.calendars.get(item['id'], {}).values()
+                if e['status'] != 'cancelled' and 'dateTime' in e.get('start', {})
+                and e.get('transparency') != 'transparent'
+                and self._when(e['end']['dateTime']) > time_min
+                and self._when(e['start']['dateTime']) < time_max
+            ]
+            calendars[item['id']] = {'busy': sorted(busy, key=lambda b: b['start'])}
+        return 200, {'kind': 'calendar#freeBusy', 'timeMin': data['timeMin'],
+                     'timeMax': data['timeMax'], 'calendars': calendars}
+
+    def handle(self, method, path, params, data):
+        if path == '/calendar/v3/freeBusy' and method == 'POST':
+            return self._free_busy(data)
+        prefix = '/calendar/v3/calendars/'
+        if not path.startswith(prefix):
+            raise KeyError(path)
+        calendar_id, _, rest = urllib.parse.unquote(path[len(prefix):]).partition('/')
+        if rest == 'events' and method == 'GET':
+            return self._list_events(calendar_id, params)
+        if rest == 'events' and method == 'POST':
+            event = self.put_event(calendar_id, dict(data))
+            self.inserted.append(event['id'])
+            event['htmlLink'] = f"https://calendar.example.com/event?eid={event['id']}"
+            return 200, self._public(event)
+        raise KeyError(path)
+
+
+def build_fake_service(api_name, api_version, http):
+    """Builds a googleapiclient service object that talks to a fake endpoint."""
+    return build_from_document(discovery_document(api_name, api_version), http=http)
@@ -1,20 +1,151 @@
 # integrations/file_service.py
 # This module contains all functions for interacting with the Google Drive API.
+# Large files are sent as resumable, chunked uploads; bulk uploads run on a
+# worker pool, skip files Drive already has and resume interrupted sessions.
 
+import hashlib
+import logging
 import os
-from googleapiclient.http import MediaFileUpload
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from googleapiclient.errors import HttpError
+from config import DRIVE_UPLOAD_CHUNK_BYTES, DRIVE_UPLOAD_WORKERS, UPLOAD_SESSIONS_FILE
+from agent_core.state_store import StateStore
 # Import our reusable authentication service
 from integrations.auth_service import get_google_api_service
+from integrations.governor import CircuitOpenError, TransportError, governor
 
-def upload_file_to_drive(file_path, folder_id=None):
+logger = logging.getLogger(__name__)
+
+# Drive rejects resumable chunks that are not a multiple of 256 KB.
+CHUNK_ALIGNMENT = 256 * 1024
+
+# Bytes read per step when hashing a local file.
+_HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def _aligned_chunksize(chunksize):
+    if chunksize is None or chunksize < 0:
+        return -1  # The whole file in one request.
+    return max(CHUNK_ALIGNMENT, chunksize - chunksize % CHUNK_ALIGNMENT)
+
+
+def file_md5(file_path):
+    """Returns the hex MD5 digest of a local file, the same checksum Drive reports as md5Checksum."""
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_folder_checksums(service, folder_id):
+    """
+    Lists the content checksums of the files in a Drive folder.
+
+    Args:
+        service: A Drive v3 service object.
+        folder_id (str): The folder to list, or None for "My Drive".
+
+    Returns:
+        dict: md5Checksum -> file ID. Google Docs and other files without content are left out.
+    """
+    files_api = service.files()
+    request = files_api.list(q=f"'{folder_id or 'root'}' in parents and trashed = false",
+                             fields='nextPageToken, files(id, md5Checksum)', pageSize=1000)
+    checksums = {}
+    while request is not None:
+        response = governor.execute(request)
+        for item in response.get('files', []):
+            if item.get('md5Checksum'):
+                checksums.setdefault(item['md5Checksum'], item['id'])
+        request = files_api.list_next(request, response)
+    return checksums
+
+
+def _session_key(file_path, folder_id):
+    # Tied to the file's size and modification time, so an edited file starts a new upload.
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}|{folder_id or ''}"
+
+
+def _query_upload_status(request):
+    """
+    Asks Drive how much of a resumable upload it has received, with an empty PUT
+    to the session URI, and moves the request on to the first missing byte.
+
+    Returns:
+        dict: The created file resource if Drive already has the whole file, otherwise None.
+
+    Raises:
+        HttpError: If Drive answers with anything but 200, 201 or 308 (e.g. 404 for an expired session).
+    """
+    headers = {'Content-Range': f"bytes */{request.resumable.size()}", 'Content-Length': '0'}
+    resp, content = request.http.request(request.resumable_uri, 'PUT', headers=headers)
+    if resp.status in (200, 201):
+        return request.postproc(resp, content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=request.resumable_uri)
+    # The Range header ("bytes=0-N") is missing when Drive has nothing yet.
+    confirmed = resp.get('range')
+    request.resumable_progress = int(confirmed.rsplit('-', 1)[1]) + 1 if confirmed else 0
+    return None
+
+
+def _upload(service, file_path, folder_id, chunksize, sessions=None):
+    """
+    Runs one resumable upload to completion and returns the created file resource.
+
+    If `sessions` holds a session URI for this file, the upload continues from the
+    last byte Drive confirmed instead of starting over.
+    """
+    file_metadata = {'name': os.path.basename(file_path)}
+    if folder_id:
+        file_metadata['parents'] = [folder_id]
+    from googleapiclient.http import MediaFileUpload
+    media = MediaFileUpload(file_path, chunksize=_aligned_chunksize(chunksize), resumable=True)
+    request = service.files().create(body=file_metadata, media_body=media,
+                                     fields='id, md5Checksum')
+
+    key = _session_key(file_path, folder_id) if sessions is not None else None
+    saved_uri = sessions.get(key) if key is not None else None
+    if saved_uri:
+        logger.info("Resuming upload of '%s'...", file_metadata['name'])
+        request.resumable_uri = saved_uri
+
+    response = None
+    try:
+        if saved_uri:
+            response = governor.call('drive', lambda: _query_upload_status(request),
+                                     method='drive.files.create')
+        while response is None:
+            # Each chunk is retried on its own; a resumable upload never repeats confirmed bytes.
+            _, response = governor.call('drive', request.next_chunk, method='drive.files.create')
+            if key is not None and response is None and request.resumable_uri != saved_uri:
+                saved_uri = request.resumable_uri
+                sessions.set(key, saved_uri)
+    except HttpError as error:
+        if saved_uri and error.resp.status in (404, 410):
+            # The session has expired on Drive's side; start again from the beginning.
+            logger.warning("Upload session for '%s' has expired. Restarting.", file_metadata['name'])
+            sessions.delete(key)
+            return _upload(service, file_path, folder_id, chunksize, sessions)
+        raise
+
+    if key is not None:
+        sessions.delete(key)
+    return response
+
+
+def upload_file_to_drive(file_path, folder_id=None, chunksize=DRIVE_UPLOAD_CHUNK_BYTES):
     """
     Uploads a file to the user's Google Drive.
 
     Args:
         file_path (str): The path to the local file to upload.
-        folder_id (str, optional): The ID of the Drive folder to upload into. 
+        folder_id (str, optional): The ID of the Drive folder to upload into.
                                    If None, uploads to the root "My Drive". Defaults to None.
+        chunksize (int, optional): Bytes sent per upload request; None sends the file in one request.
 
     Returns:
         str: The ID of the uploaded file, or None if it fails.
@@ -22,54 +153,167 @@ def upload_file_to_drive(file_path, folder_id=None):
     try:
         service = get_google_api_service('drive', 'v3')
         if not service:
-            print("Failed to get Drive service. Aborting.")
+            logger.error("Failed to get Drive service. Aborting.")
             return None
 
         if not os.path.exists(file_path):
-            print(f"Error: The file at {file_path} does not exist.")
+            logger.error("The file at %s does not exist.", file_path)
             return None
 
-        # Get the filename from the path
-        file_name = os.path.basename(file_path)
-        
-        # Prepare the file metadata
-        file_metadata = {'name': file_name}
-        if folder_id:
-            file_metadata['parents'] = [folder_id]
-
-        # Prepare the media to upload
-        media = MediaFileUpload(file_path, resumable=True)
-
-        print(f"Uploading '{file_name}' to Google Drive...")
-        # Call the Drive v3 API
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-
-        file_id = file.get('id')
-        print(f"File uploaded successfully! File ID: {file_id}")
+        logger.info("Uploading '%s' to Google Drive...", os.path.basename(file_path))
+        file_id = _upload(service, file_path, folder_id, chunksize).get('id')
+        logger.info("File uploaded successfully! File ID: %s", file_id)
         return file_id
 
     except HttpError as error:
-        print(f"An error occurred with the Drive API: {error}")
+        logger.error("An error occurred with the Drive API: %s", error)
         return None
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error("An unexpected error occurred: %s", e)
+        return None
+
+
+class BulkUploader:
+    """
+    Uploads many files into one Drive folder on a worker pool.
+
+    Files whose content (MD5) already exists in the folder, or that duplicate
+    another file of the same run, are not uploaded again: a file whose twin is
+    still uploading waits for it and gets its file ID, or is uploaded itself if
+    the twin failed. Resumable session
+    URIs are persisted in `sessions_file`, so after a crash or restart an
+    interrupted upload continues where it stopped.
+
+    Args:
+        folder_id (str, optional): The target Drive folder; None for "My Drive".
+        max_workers (int): Number of files uploaded in parallel.
+        chunksize (int, optional): Bytes sent per upload request (rounded down to 256 KB).
+        sessions_file (str, optional): JSON file holding open upload sessions; None disables resuming.
+        skip_duplicates (bool): Whether to skip files whose content is already in the folder.
+        service (optional): A Drive service object to use instead of the shared one.
+    """
+
+    def __init__(self, folder_id=None, max_workers=DRIVE_UPLOAD_WORKERS,
+                 chunksize=DRIVE_UPLOAD_CHUNK_BYTES, sessions_file=UPLOAD_SESSIONS_FILE,
+                 skip_duplicates=True, service=None):
+        self.folder_id = folder_id
+        self.max_workers = max_workers
+        self.chunksize = chunksize
+        self.skip_duplicates = skip_duplicates
+        self.sessions = StateStore(sessions_file) if sessions_file else None
+        self._service = service
+        self._lock = threading.Lock()
+        self._known = {}
+
+    @property
+    def service(self):
+        return self._service or get_google_api_service('drive', 'v3')
+
+    def _claim(self, checksum):
+        """
+        Claims the upload of a file's content for the calling worker.
+
+        Returns:
+            tuple: (Future, None) if the caller must upload it and resolve the Future with
+                   the new file ID (or None on failure); (None, file_id) if the content is
+                   already in the folder. While a twin with the same content is in flight
+                   this waits for it, and hands out a new claim if the twin failed.
+        """
+        while True:
+            with self._lock:
+                known = self._known.get(checksum)
+                if known is None:
+                    claim = self._known[checksum] = Future()
+                    return claim, None
+            file_id = known.result() if isinstance(known, Future) else known
+            if file_id is not None:
+                return None, file_id
+
+    def _upload_one(self, file_path):
+        checksum = claim = None
+        try:
+            if self.skip_duplicates:
+                checksum = file_md5(file_path)
+                claim, existing_id = self._claim(checksum)
+                if claim is None:
+                    logger.info("Skipping '%s': identical content is already in the folder.", file_path)
+                    return existing_id
+
+            file_id = _upload(self.service, file_path, self.folder_id, self.chunksize, self.sessions).get('id')
+            if claim is not None:
+                with self._lock:
+                    self._known[checksum] = file_id
+                claim.set_result(file_id)
+            return file_id
+
+        except HttpError as error:
+            logger.error("An error occurred uploading '%s': %s", file_path, error)
+        except Exception as e:
+            logger.error("An unexpected error occurred uploading '%s': %s", file_path, e)
+        finally:
+            if claim is not None and not claim.done():
+                with self._lock:
+                    # Let a twin waiting on this upload (or a later run) try again.
+                    self._known.pop(checksum, None)
+                claim.set_result(None)
         return None
 
+    def upload(self, file_paths):
+        """
+        Uploads files in parallel.
+
+        Args:
+            file_paths (iterable): Local paths of the files to upload.
+
+        Returns:
+            dict: file path -> Drive file ID (of the upload or of the existing copy), or None on failure.
+        """
+        file_paths = list(file_paths)
+        if not file_paths:
+            return {}
+        if self.skip_duplicates:
+            try:
+                checksums = list_folder_checksums(self.service, self.folder_id)
+            except (HttpError, CircuitOpenError, TransportError) as error:
+                logger.warning("Could not list the target folder, uploading without dedup: %s", error)
+                checksums = {}
+            with self._lock:
+                for checksum, file_id in checksums.items():
+                    self._known.setdefault(checksum, file_id)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='drive-upload') as pool:
+            file_ids = list(pool.map(self._upload_one, file_paths))
+        return dict(zip(file_paths, file_ids))
+
+
+def upload_directory(directory, folder_id=None, **uploader_options):
+    """
+    Uploads every regular file directly inside a local directory.
+
+    Args:
+        directory (str): The local directory.
+        folder_id (str, optional): The target Drive folder; None for "My Drive".
+        **uploader_options: Passed on to BulkUploader (max_workers, chunksize, ...).
+
+    Returns:
+        dict: file path -> Drive file ID, or None for files that failed.
+    """
+    file_paths = sorted(entry.path for entry in os.scandir(directory) if entry.is_file())
+    logger.info("Uploading %d file(s) from '%s' to Google Drive...", len(file_paths), directory)
+    return BulkUploader(folder_id, **uploader_options).upload(file_paths)
+
 # This block allows you to run this file directly for testing.
 if __name__ == '__main__':
     print("--- Running Google Drive File Upload Test ---")
-    
+
     # 1. Create a dummy file to upload for the test
     test_file_name = "test_upload.txt"
     try:
         with open(test_file_name, "w") as f:
             f.write("This is a test file for the Intelligent Agent upload function.")
         print(f"Created a dummy file: '{test_file_name}'")
-    
+
         # 2. Call the upload function
         upload_file_to_drive(test_file_name)
 
@@ -0,0 +1,420 @@
+# integrations/governor.py
+# A request governor shared by every Google API integration.
+# It keeps each API under its quota with a token bucket, retries throttled and
+# failed calls with jittered exponential backoff (honouring Retry-After), and
+# stops calling an API that keeps failing through a per-API circuit breaker.
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from googleapiclient.errors import HttpError
+from agent_core.metrics import API_CALLS_TOTAL, API_LATENCY_SECONDS
+from integrations.auth_service import current_mailbox
+from config import (
+    API_MAX_RETRIES,
+    API_RATE_LIMITS,
+    CIRCUIT_BREAKER_RESET_SECONDS,
+    CIRCUIT_BREAKER_THRESHOLD,
+)
+
+# Gmail counts calls in quota units rather than requests; every other method costs 1.
+# https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    'gmail.users.getProfile': 1,
+    'gmail.users.history.list': 2,
+    'gmail.users.messages.get': 5,
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.modify': 5,
+    'gmail.users.messages.batchModify': 50,
+    'gmail.users.messages.send': 100,
+}
+
+# Calls that must not be repeated if the outcome is unknown (e.g. the connection
+# dropped after the request was sent). They are only retried when Google
+# explicitly rejected them for rate limiting.
+NON_IDEMPOTENT_METHODS = {
+    'gmail.users.messages.send',
+    'calendar.events.insert',
+}
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')
+
+# A Retry-After longer than this is not waited out; the call fails instead of stalling the cycle.
+MAX_RETRY_AFTER_SECONDS = 120
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an API whose circuit breaker is open."""
+
+    def __init__(self, api, retry_in):
+        super().__init__(f"Circuit breaker for {api} is open; retrying in {retry_in:.0f}s.")
+        self.api = api
+        self.retry_in = retry_in
+
+
+class TransportError(Exception):
+    """
+    Raised when a call could not reach its API (e.g. the connection failed) and
+    its retries are exhausted. The original error is kept as `error` and `__cause__`.
+    """
+
+    def __init__(self, api, error):
+        super().__init__(f"{api} call failed: {error}")
+        self.api = api
+        self.error = error
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. `acquire()` blocks until enough tokens are available.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens (the allowed burst).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Takes tokens from the bucket, sleeping until they are available.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens are reserved straight away (the balance may go negative), so
+            # concurrent callers queue up behind each other instead of all waking at once.
+            self._tokens -= tokens
+            wait = max(self._paused_until - now, -self._tokens / self.rate if self._tokens < 0 else 0.0)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Holds back every caller for the given time, e.g. after a Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and rejects calls for
+    `reset_timeout` seconds. After that a single trial call is let through:
+    success closes the circuit, failure opens it again. A call that is retried
+    counts once, when its last attempt has failed.
+
+    Args:
+        threshold (int): Consecutive failed calls that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self, api):
+        """Raises CircuitOpenError if the call must not be made."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError(api, max(remaining, 0.0))
+
+    def before_retry(self, api):
+        """Raises CircuitOpenError if other calls opened the circuit while this one was backing off."""
+        with self._lock:
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining > 0:
+                raise CircuitOpenError(api, remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def _retry_after(error):
+    """Returns the Retry-After delay of an HttpError in seconds, or None."""
+    value = getattr(error, 'resp', None) and error.resp.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_rate_limited(error):
+    if error.resp.status == 429:
+        return True
+    return error.resp.status == 403 and any(reason in (error.content or b'') for reason in RATE_LIMIT_REASONS)
+
+
+def is_retryable(error):
+    """Whether an exception from an API call is worth retrying."""
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES or _is_rate_limited(error)
+    import httplib2
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+
+def _is_batch(request):
+    # Imported here, not at module load: by the time a request exists, a client
+    # has been built and googleapiclient.http is loaded anyway.
+    from googleapiclient.http import BatchHttpRequest
+    return isinstance(request, BatchHttpRequest)
+
+
+def _method_id(request):
+    if _is_batch(request):
+        # All calls of a batch belong to the same API; use the first to name it.
+        first = next(iter(request._requests.values()), None)
+        return first.methodId if first is not None else None
+    return getattr(request, 'methodId', None)
+
+
+def _observe_call(api, method, started, error=None):
+    if error is None:
+        status = 'ok'
+    elif isinstance(error, HttpError):
+        status = str(error.resp.status)
+    else:
+        status = 'error'
+    API_LATENCY_SECONDS.observe(time.perf_counter() - started, api=api, method=method)
+    API_CALLS_TOTAL.inc(api=api, method=method, status=status)
+
+
+def request_cost(request):
+    """Returns the quota units a request (or a whole batch) is charged."""
+    if _is_batch(request):
+        return sum(QUOTA_UNITS.get(r.methodId, 1) for r in request._requests.values())
+    return QUOTA_UNITS.get(getattr(request, 'methodId', None), 1)
+
+
+class RequestGovernor:
+    """
+    Runs Google API calls under per-API rate limits, retries and circuit breakers.
+
+    Args:
+        rate_limits (dict): api -> (quota units per second, burst size).
+        max_retries (int): Retries after the first attempt of a call.
+        base_delay (float): First backoff delay in seconds; it doubles per retry.
+        max_delay (float): Upper bound of a single backoff delay.
+        breaker_threshold (int): Consecutive failures that open an API's circuit.
+        breaker_reset (float): Seconds an open circuit rejects calls.
+    """
+
+    def __init__(self, rate_limits=None, max_retries=5, base_delay=0.5, max_delay=32.0,
+                 breaker_threshold=5, breaker_reset=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.set_rate_limits(rate_limits or {})
+        self._breaker_settings = (breaker_threshold, breaker_reset)
+        self._breakers = {}
+        self._stats = {'calls': 0, 'retries': 0, 'throttled_seconds': 0.0,
+                       'failures': 0, 'rejected': 0}
+        # Replaceable for tests, so retries do not actually sleep.
+        self.sleep = time.sleep
+
+    def set_rate_limits(self, rate_limits):
+        """Replaces the rate limits: api -> (quota units per second, burst). APIs left out are unlimited."""
+        with self._lock:
+            self._rate_limits = dict(rate_limits)
+            self._buckets = {}
+
+    def bucket(self, api, mailbox=None):
+        """
+        Returns the token bucket of an API for a mailbox (by default the current one),
+        or None if the API is not rate limited. Quotas are per user, so every
+        mailbox has its own buckets.
+        """
+        key = (mailbox if mailbox is not None else current_mailbox(), api)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                limits = self._rate_limits.get(api)
+                if limits is None:
+                    return None
+                bucket = self._buckets[key] = TokenBucket(*limits)
+            return bucket
+
+    def reset(self):
+        """Closes every circuit breaker and clears the counters."""
+        with self._lock:
+            self._breakers.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def breaker(self, api):
+        with self._lock:
+            if api not in self._breakers:
+                self._breakers[api] = CircuitBreaker(*self._breaker_settings)
+            return self._breakers[api]
+
+    def backoff_delay(self, attempt, error=None):
+        """
+        Returns how long to wait before retry number `attempt` (1-based).
+
+        Uses "full jitter" (a random delay up to the exponential bound), so
+        clients that failed together do not retry together. A Retry-After sent
+        by the server is always respected.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, api, func, cost=1, idempotent=True, method=None):
+        """
+        Calls func() for the given API, with rate limiting, retries and the circuit breaker.
+
+        Args:
+            api (str): The API name ('gmail', 'calendar', 'drive').
+            func (callable): Performs one attempt of the call.
+            cost (int): Quota units charged against the API's rate limit per attempt.
+            idempotent (bool): If False, the call is only retried after explicit rate limiting.
+            method (str, optional): The endpoint, e.g. 'gmail.users.messages.get', for metrics.
+
+        Returns:
+            The result of func().
+
+        Raises:
+            CircuitOpenError: If the API's circuit breaker is open.
+            TransportError: If the API could not be reached, once retries are exhausted.
+            The last error raised by func() once retries are exhausted or it is not retryable.
+        """
+        breaker = self.breaker(api)
+        bucket = self.bucket(api)
+        method = method or api
+        attempt = 0
+        while True:
+            try:
+                if attempt:
+                    breaker.before_retry(api)
+                else:
+                    breaker.before_call(api)
+            except CircuitOpenError:
+                self._count('rejected')
+                raise
+            if bucket is not None:
+                waited = bucket.acquire(cost)
+                if waited:
+                    self._count('throttled_seconds', waited)
+
+            self._count('calls')
+            started = time.perf_counter()
+            try:
+                result = func()
+            except Exception as error:
+                _observe_call(api, method, started, error)
+                retryable = is_retryable(error)
+                if not retryable:
+                    if isinstance(error, HttpError) and error.resp.status < 500:
+                        # The API is healthy; the request itself was bad.
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                    self._count('failures')
+                    raise
+
+                rate_limited = isinstance(error, HttpError) and _is_rate_limited(error)
+                attempt += 1
+                delay = None
+                if attempt <= self.max_retries and (idempotent or rate_limited):
+                    delay = self.backoff_delay(attempt, error)
+                if delay is None or delay > MAX_RETRY_AFTER_SECONDS:
+                    # Retries are exhausted: the call as a whole has failed.
+                    breaker.record_failure()
+                    self._count('failures')
+                    if isinstance(error, HttpError):
+                        raise
+                    raise TransportError(api, error) from error
+                self._count('retries')
+                if rate_limited and bucket is not None:
+                    # Every caller of this API backs off, not just this one; the
+                    # wait happens in bucket.acquire() on the next attempt.
+                    bucket.pause(delay)
+                else:
+                    self.sleep(delay)
+                continue
+
+            _observe_call(api, method, started)
+            breaker.record_success()
+            return result
+
+    def execute(self, request, api=None):
+        """
+        Executes a googleapiclient request (or BatchHttpRequest) through the governor.
+
+        Args:
+            request: An HttpRequest or BatchHttpRequest.
+            api (str, optional): The API name; by default taken from the request's method ID.
+
+        Returns:
+            The response of request.execute().
+        """
+        method_id = _method_id(request)
+        api = api or (method_id or '').split('.', 1)[0]
+        method = 'batch' if _is_batch(request) else method_id
+        return self.call(api, request.execute, cost=request_cost(request),
+                         idempotent=method_id not in NON_IDEMPOTENT_METHODS, method=method)
+
+    def stats(self):
+        """Returns counters: calls, retries, throttled_seconds, failures, rejected."""
+        with self._lock:
+            return dict(self._stats)
+
+
+# The governor shared by all integrations.
+governor = RequestGovernor(
+    rate_limits=API_RATE_LIMITS,
+    max_retries=API_MAX_RETRIES,
+    breaker_threshold=CIRCUIT_BREAKER_THRESHOLD,
+    breaker_reset=CIRCUIT_BREAKER_RESET_SECONDS,
+)
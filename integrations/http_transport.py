@@ -0,0 +1,228 @@
+# integrations/http_transport.py
+# A shared HTTP transport for the Google API clients.
+# googleapiclient gives every service object its own httplib2.Http, which is not
+# thread-safe and keeps its own connections, so each thread and API pays its own
+# TLS handshakes. Here all services of the process send their requests through one
+# urllib3 connection pool instead: thread-safe, one pool of kept-alive connections
+# per host, optionally over HTTP/2. Each set of credentials gets a light
+# httplib2-compatible wrapper that adds the Authorization header.
+
+import logging
+import threading
+import weakref
+from config import HTTP2, HTTP_POOL_CONNECTIONS, HTTP_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Response statuses after which the credentials are refreshed and the request sent again.
+REFRESH_STATUS_CODES = (401,)
+MAX_REFRESH_ATTEMPTS = 2
+
+# One lock per credentials object, so that the threads and registries sharing it
+# refresh its token once rather than each on its own.
+_refresh_locks = weakref.WeakKeyDictionary()
+_refresh_locks_lock = threading.Lock()
+
+
+def _refresh_lock(credentials):
+    with _refresh_locks_lock:
+        lock = _refresh_locks.get(credentials)
+        if lock is None:
+            lock = _refresh_locks[credentials] = threading.Lock()
+        return lock
+
+
+def refresh_credentials(credentials, request, needed):
+    """
+    Refreshes credentials, one thread at a time, unless another thread renewed
+    them while this one waited.
+
+    Args:
+        credentials (google.auth.credentials.Credentials): The credentials to refresh.
+        request (google.auth.transport.Request): Sends the token request.
+        needed (callable): Takes the credentials and tells whether they still need
+            a refresh; checked once the lock is held.
+
+    Returns:
+        bool: True if this call refreshed the credentials.
+    """
+    with _refresh_lock(credentials):
+        if not needed(credentials):
+            return False
+        credentials.refresh(request)
+        return True
+
+
+class PooledTransport:
+    """
+    A thread-safe HTTP transport with an httplib2-style `request()` method, so
+    googleapiclient can use it in place of httplib2.Http.
+
+    Connections are kept alive and reused per host, by any thread. Redirects are
+    not followed (resumable uploads need to see the 308 responses), and only
+    failed connection attempts are retried here; everything else is left to the
+    request governor, which knows which calls are safe to repeat.
+
+    Args:
+        maxsize (int): Kept-alive connections per host.
+        timeout (float): Seconds to wait for a connection or a response.
+        http2 (bool): Negotiate HTTP/2 if the h2 package is installed.
+        ca_certs (str, optional): CA bundle to verify servers with; defaults to certifi's.
+    """
+
+    def __init__(self, maxsize=HTTP_POOL_CONNECTIONS, timeout=HTTP_TIMEOUT_SECONDS, http2=HTTP2, ca_certs=None):
+        import urllib3
+
+        if http2:
+            _enable_http2()
+        if ca_certs is None:
+            import certifi
+            ca_certs = certifi.where()
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._pool = urllib3.PoolManager(
+            num_pools=16, maxsize=maxsize, block=False, cert_reqs='CERT_REQUIRED', ca_certs=ca_certs,
+            timeout=urllib3.Timeout(connect=timeout, read=timeout),
+            retries=urllib3.Retry(total=3, connect=2, read=False, redirect=False))
+
+    @property
+    def pool(self):
+        """The underlying urllib3.PoolManager, e.g. for google.auth's urllib3 transport."""
+        return self._pool
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None):
+        """
+        Sends a request like httplib2.Http.request().
+
+        Returns:
+            tuple: (httplib2.Response, content bytes).
+
+        Raises:
+            ConnectionError: If the request could not be sent or no response arrived.
+                Like httplib2's socket errors, it is an OSError, which the callers retry.
+        """
+        import httplib2
+        import urllib3
+
+        with self._lock:
+            self._requests += 1
+        try:
+            response = self._pool.request(method, uri, body=body, headers=headers, redirect=False,
+                                          preload_content=True)
+        except urllib3.exceptions.HTTPError as e:
+            raise ConnectionError(f"{method} {uri} failed: {e}") from e
+        content = response.data
+        info = {name.lower(): response.headers[name] for name in response.headers}
+        # The content was decompressed, as httplib2 does; so must the headers say.
+        if info.pop('content-encoding', None) is not None:
+            info['content-length'] = str(len(content))
+        info['status'] = str(response.status)
+        result = httplib2.Response(info)
+        result.reason = response.reason or ''
+        return result, content
+
+    def stats(self):
+        """
+        Returns the number of requests sent and of connections opened so far, by
+        the pools currently kept (a pool dropped for an unused host takes its count along).
+        """
+        pools = self._pool.pools
+        connections = sum(pools[key].num_connections for key in list(pools.keys()) if key in pools)
+        with self._lock:
+            return {'requests': self._requests, 'connections': connections}
+
+    def close(self):
+        """Closes every kept-alive connection."""
+        self._pool.clear()
+
+
+class AuthorizedHttp:
+    """
+    An httplib2-compatible view of a PooledTransport that authorizes its requests
+    with a set of google-auth credentials. Cheap to create; any number of them
+    can share one transport. Refreshes the credentials when they have expired,
+    or when a request is rejected with 401, and sends the request again.
+
+    Args:
+        credentials (google.auth.credentials.Credentials): The credentials to send.
+        transport (PooledTransport): Where the requests go.
+    """
+
+    def __init__(self, credentials, transport):
+        self.credentials = credentials
+        self.transport = transport
+        self._auth_request = None
+
+    def _refresh_request(self):
+        # Token refreshes go through the same connection pool.
+        if self._auth_request is None:
+            from google.auth.transport.urllib3 import Request
+            self._auth_request = Request(self.transport.pool)
+        return self._auth_request
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=None, connection_type=None,
+                _refresh_attempt=0):
+        request_headers = dict(headers or {})
+        # Expired credentials are refreshed here, under their lock, so that
+        # before_request only adds the header.
+        if not self.credentials.valid:
+            refresh_credentials(self.credentials, self._refresh_request(), lambda creds: not creds.valid)
+        self.credentials.before_request(self._refresh_request(), method, uri, request_headers)
+        sent_token = self.credentials.token
+        # A streamed body must be rewound before the request is sent again.
+        body_position = body.tell() if hasattr(body, 'tell') else None
+
+        response, content = self.transport.request(uri, method, body=body, headers=request_headers)
+
+        if response.status in REFRESH_STATUS_CODES and _refresh_attempt < MAX_REFRESH_ATTEMPTS:
+            # Another request rejected with the same token may have renewed it already.
+            if refresh_credentials(self.credentials, self._refresh_request(),
+                                   lambda creds: creds.token == sent_token):
+                logger.info("Refreshed credentials after a %d response.", response.status)
+            if body_position is not None:
+                body.seek(body_position)
+            return self.request(uri, method, body, headers, redirections, connection_type, _refresh_attempt + 1)
+        return response, content
+
+    def close(self):
+        # The connections belong to the shared transport; googleapiclient calls this
+        # when a service object is closed.
+        pass
+
+
+_http2_enabled = False
+
+
+def _enable_http2():
+    """Switches urllib3's HTTPS connections to HTTP/2, process-wide. Needs urllib3 2.3+ and h2 4."""
+    global _http2_enabled
+    if _http2_enabled:
+        return
+    try:
+        import urllib3.http2
+        urllib3.http2.inject_into_urllib3()
+        _http2_enabled = True
+        logger.info("HTTP/2 enabled for the API transport.")
+    except (ImportError, AttributeError) as e:
+        logger.warning("HTTP/2 is not available (%s); using HTTP/1.1 with keep-alive.", e)
+
+
+# The transport shared by every registry, mailbox and thread of the process, created on first use.
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def shared_transport():
+    """Returns the process-wide PooledTransport."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = PooledTransport()
+    return _transport
+
+
+def authorized_http(credentials):
+    """Returns an httplib2-compatible object sending `credentials` over the shared transport."""
+    return AuthorizedHttp(credentials, shared_transport())
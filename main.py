@@ -1,17 +1,37 @@
 # main.py
 # This is the main entry point for the Intelligent Agent application.
+#
+# Run with: python main.py          (poll for new emails until stopped)
+#           python main.py --once   (run a single cycle and exit, e.g. from cron)
+#
+# The agent modules are imported only after the arguments are parsed, so
+# `--help` and argument errors return at once.
 
-def run_agent():
+import argparse
+
+
+def run_agent(argv=None):
     """
-    The main function to run the agent's core loop.
+    Parses the command line and runs the agent's core loop, or a single cycle.
+
+    Returns:
+        int: The process exit code.
     """
-    print("Intelligent Agent is starting...")
-    # In the future, this function will initialize and run the main agent loop.
-    # For now, we just print a message.
-    print("Agent setup complete. Ready for development.")
+    parser = argparse.ArgumentParser(description="Run the Intelligent Agent.")
+    parser.add_argument('--once', action='store_true',
+                        help="check for new emails once, act on them and exit")
+    args = parser.parse_args(argv)
+
+    if args.once:
+        from agent_core.main_agent import run_once
+        run_once()
+    else:
+        from agent_core.main_agent import run_main_loop
+        run_main_loop()
+    return 0
 
 
 if __name__ == "__main__":
     # The __name__ == "__main__" block ensures that the code inside
     # only runs when the script is executed directly.
-    run_agent()
+    raise SystemExit(run_agent())
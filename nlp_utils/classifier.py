@@ -0,0 +1,259 @@
+# nlp_utils/classifier.py
+# A small trainable email classifier: Bernoulli naive Bayes over hashed word
+# features, built on NumPy. It is trained offline from labelled JSONL, saved as
+# a single flat file that is memory-mapped at load time, and scores emails in
+# vectorised batches. The agent uses it as a fallback for emails that none of
+# the classification rules matched.
+#
+# Train with:    python -m nlp_utils.classifier train labelled.jsonl model.bin
+# Evaluate with: python -m nlp_utils.classifier evaluate labelled.jsonl model.bin
+#
+# Each training line is an email with its category, e.g.
+# {"sender": "a@example.com", "subject": "Lunch?", "body": "...", "label": "NORMAL"}
+
+import json
+import string
+import sys
+import zlib
+from collections import namedtuple
+import numpy as np
+
+# Number of hash buckets. 2**16 buckets x 4 categories of float32 is a 1 MB model.
+DEFAULT_FEATURES = 2 ** 16
+
+# Only the start of the body is read; it carries most of the signal and keeps
+# scoring time flat for very long emails.
+MAX_BODY_CHARS = 2000
+
+# Maps every ASCII byte that cannot be part of a word to a space, so splitting
+# the translated bytes yields the words. Bytes of non-ASCII characters are kept.
+_WORD_BYTES = set((string.ascii_letters + string.digits + "'$%").encode('ascii'))
+_TOKEN_TABLE = bytes(c if c in _WORD_BYTES or c >= 128 else 32 for c in range(256))
+
+# Model file layout: magic, a 4-byte header length, a JSON header, padding to a
+# 64-byte boundary, then the float32 weight matrix in C order.
+MAGIC = b"AGNB"
+_ALIGNMENT = 64
+
+# The result of scoring one email.
+Prediction = namedtuple('Prediction', ['category', 'confidence'])
+
+# Token -> bucket cache shared by all models of the same size; email vocabulary
+# is small enough that most tokens are hashed only once.
+_MAX_CACHED_TOKENS = 200_000
+_bucket_caches = {}
+
+
+def _bucket_cache(n_features):
+    return _bucket_caches.setdefault(n_features, {})
+
+
+def _words(text):
+    # Byte-level tokenising is several times faster than a regex; only ASCII is case-folded.
+    return text.encode('utf-8').lower().translate(_TOKEN_TABLE).split()
+
+
+def email_tokens(email_data):
+    """
+    Returns the set of features of an email, as bytes.
+
+    Subject words are kept apart from body words (an "s:" prefix), and the
+    sender's domain is one extra feature.
+    """
+    sender = (email_data.get('sender') or '').lower()
+    at = sender.rfind('@')
+    domain = sender[at + 1:].strip('> ') if at != -1 else ''
+
+    features = set(_words((email_data.get('body') or '')[:MAX_BODY_CHARS]))
+    features.update(b's:' + word for word in _words(email_data.get('subject') or ''))
+    if domain:
+        features.add(b'd:' + domain.encode('utf-8'))
+    return features
+
+
+def feature_indices(email_data, n_features):
+    """Hashes an email's features into bucket indices (each bucket at most once)."""
+    cache = _bucket_cache(n_features)
+    tokens = email_tokens(email_data)
+    missing = tokens.difference(cache)
+    if not missing:
+        return set(map(cache.__getitem__, tokens))
+    if len(cache) < _MAX_CACHED_TOKENS:
+        cache.update((token, zlib.crc32(token) % n_features) for token in missing)
+        return set(map(cache.__getitem__, tokens))
+    # The cache is full; hash the new tokens without remembering them.
+    return {cache[token] if token in cache else zlib.crc32(token) % n_features for token in tokens}
+
+
+class HashedNaiveBayes:
+    """
+    Bernoulli naive Bayes over hashed, binary word features.
+
+    The weights are a (n_features + 1, n_classes) matrix: row f holds the
+    log-odds of feature f being present in each class, and the last row the
+    log prior plus the log-probability of every feature being absent. Scoring
+    an email is then just a sum of the rows of its features, so a whole batch
+    is one gather and one reduceat.
+
+    Args:
+        classes (list): The category names, in column order.
+        weights (ndarray): The weight matrix, e.g. a read-only memory map.
+    """
+
+    def __init__(self, classes, weights):
+        self.classes = list(classes)
+        self.weights = weights
+        self.n_features = weights.shape[0] - 1
+
+    @classmethod
+    def train(cls, emails, labels, n_features=DEFAULT_FEATURES, alpha=1.0):
+        """
+        Fits a model.
+
+        Args:
+            emails (list): Email dictionaries with 'sender', 'subject' and 'body'.
+            labels (list): The category of each email.
+            n_features (int): Number of hash buckets.
+            alpha (float): Additive (Laplace) smoothing.
+
+        Returns:
+            HashedNaiveBayes: The trained model.
+        """
+        classes = sorted(set(labels))
+        column = {label: i for i, label in enumerate(classes)}
+        # Per class: in how many emails each feature occurs, and how many emails there are.
+        counts = np.zeros((n_features, len(classes)), dtype=np.float64)
+        totals = np.zeros(len(classes), dtype=np.float64)
+        for email_data, label in zip(emails, labels):
+            indices = np.fromiter(feature_indices(email_data, n_features), dtype=np.int64)
+            counts[indices, column[label]] += 1
+            totals[column[label]] += 1
+
+        present = (counts + alpha) / (totals + 2 * alpha)
+        # Buckets no training email used say nothing about the class; they are left
+        # out entirely, or their smoothed absence would penalise the smaller classes.
+        present[counts.sum(axis=1) == 0] = 0.0
+        weights = np.zeros((n_features + 1, len(classes)), dtype=np.float32)
+        seen = present > 0
+        weights[:-1][seen] = (np.log(present[seen]) - np.log1p(-present[seen]))
+        weights[-1] = np.log(totals / totals.sum()) + np.log1p(-present).sum(axis=0)
+        return cls(classes, weights)
+
+    def save(self, path):
+        """Writes the model as a single file that load() can memory-map."""
+        header = json.dumps({'classes': self.classes, 'shape': list(self.weights.shape),
+                             'dtype': 'float32', 'max_body_chars': MAX_BODY_CHARS}).encode('utf-8')
+        prefix = len(MAGIC) + 4 + len(header)
+        padding = -prefix % _ALIGNMENT
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(4, 'little'))
+            f.write(header)
+            f.write(b' ' * padding)
+            f.write(np.ascontiguousarray(self.weights, dtype=np.float32).tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Opens a saved model. The weights are memory-mapped read-only, so loading
+        is instant and processes sharing a model share its pages.
+
+        Raises:
+            ValueError: If the file is not a model file.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a classifier model file.")
+            header_length = int.from_bytes(f.read(4), 'little')
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        offset = len(MAGIC) + 4 + header_length
+        offset += -offset % _ALIGNMENT
+        weights = np.memmap(path, dtype=np.dtype(header['dtype']), mode='r', offset=offset,
+                            shape=tuple(header['shape']))
+        return cls(header['classes'], weights)
+
+    def scores(self, emails):
+        """
+        Computes the log-probability of every class for a batch of emails.
+
+        Returns:
+            ndarray: A (len(emails), n_classes) array.
+        """
+        n_features = self.n_features
+        indices = []
+        starts = []
+        for email_data in emails:
+            starts.append(len(indices))
+            # The prior row doubles as a sentinel, so no email has an empty segment.
+            indices.append(n_features)
+            indices.extend(feature_indices(email_data, n_features))
+        if not starts:
+            return np.empty((0, len(self.classes)), dtype=np.float32)
+        rows = self.weights[np.asarray(indices, dtype=np.intp)]
+        return np.add.reduceat(rows, np.asarray(starts, dtype=np.intp), axis=0)
+
+    def predict_many(self, emails):
+        """
+        Classifies a batch of emails.
+
+        Returns:
+            list: One Prediction (category, confidence) per email; the confidence
+                is the posterior probability of the predicted category.
+        """
+        scores = self.scores(emails)
+        if not len(scores):
+            return []
+        best = scores.argmax(axis=1)
+        # Softmax of the winning class: 1 / sum(exp(score - best_score)).
+        shifted = scores - scores[np.arange(len(scores)), best][:, None]
+        confidence = 1.0 / np.exp(shifted).sum(axis=1)
+        classes = self.classes
+        return [Prediction(classes[i], float(c)) for i, c in zip(best.tolist(), confidence.tolist())]
+
+    def predict(self, email_data):
+        """Classifies one email. See predict_many()."""
+        return self.predict_many([email_data])[0]
+
+
+def load_labelled(path):
+    """
+    Reads labelled emails from a JSONL file.
+
+    Returns:
+        tuple: (emails, labels)
+    """
+    emails, labels = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            labels.append(record.pop('label'))
+            emails.append(record)
+    return emails, labels
+
+
+def accuracy(model, emails, labels):
+    """The fraction of emails the model labels correctly."""
+    if not emails:
+        return 0.0
+    predictions = model.predict_many(emails)
+    return sum(1 for p, label in zip(predictions, labels) if p.category == label) / len(labels)
+
+
+# Command-line training and evaluation.
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] not in ('train', 'evaluate'):
+        print("Usage: python -m nlp_utils.classifier train|evaluate LABELLED.jsonl MODEL.bin")
+        sys.exit(2)
+    command, data_path, model_path = sys.argv[1:]
+    emails, labels = load_labelled(data_path)
+    if command == 'train':
+        model = HashedNaiveBayes.train(emails, labels)
+        model.save(model_path)
+        print(f"Trained on {len(emails)} emails ({', '.join(model.classes)}); saved to {model_path}.")
+        print(f"Training accuracy: {accuracy(model, emails, labels):.3f}")
+    else:
+        model = HashedNaiveBayes.load(model_path)
+        print(f"Accuracy on {len(emails)} emails: {accuracy(model, emails, labels):.3f}")
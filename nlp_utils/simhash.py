@@ -0,0 +1,118 @@
+# nlp_utils/simhash.py
+# SimHash fingerprints for spotting near-duplicate texts, and an index that finds
+# the stored fingerprints within a few bits of a new one without comparing
+# against all of them. Two texts that share most of their word shingles get
+# fingerprints that differ in only a few of their 64 bits.
+
+import hashlib
+import string
+
+BITS = 64
+
+# Shingles of three consecutive words. Shorter shingles make unrelated texts look alike.
+SHINGLE_WORDS = 3
+
+# Only the start of a text is fingerprinted, as the classifier reads only the
+# start of a body; it keeps the cost flat for very long emails.
+MAX_TEXT_CHARS = 2000
+
+# Maps every ASCII byte that cannot be part of a word to a space (see nlp_utils.classifier).
+_WORD_BYTES = set((string.ascii_letters + string.digits + "'$%").encode('ascii'))
+_TOKEN_TABLE = bytes(c if c in _WORD_BYTES or c >= 128 else 32 for c in range(256))
+
+# Adding up the bits of many hashes one bit at a time is slow in Python. Instead,
+# each hash is "spread" into one big integer with a 16-bit counter per bit, built
+# from a lookup table per byte, so summing the spread integers counts all 64 bit
+# positions at once. The counters cannot overflow below 65536 shingles.
+_FIELD = 16
+_FIELD_MASK = (1 << _FIELD) - 1
+_SPREAD = [sum(((byte >> i) & 1) << (_FIELD * i) for i in range(8)) for byte in range(256)]
+
+
+def words(text):
+    """Returns the lower-cased words of a text, as bytes."""
+    return text[:MAX_TEXT_CHARS].encode('utf-8').lower().translate(_TOKEN_TABLE).split()
+
+
+def _spread(value):
+    spread = 0
+    shift = 0
+    while value:
+        spread |= _SPREAD[value & 0xFF] << shift
+        value >>= 8
+        shift += 8 * _FIELD
+    return spread
+
+
+def simhash(text):
+    """
+    Computes the 64-bit SimHash of a text.
+
+    Returns:
+        tuple: (fingerprint, shingle count). Fingerprints of texts with only a few
+            shingles are unreliable; callers should ignore them below some count.
+    """
+    tokens = words(text)
+    if len(tokens) < SHINGLE_WORDS:
+        shingles = [b' '.join(tokens)] if tokens else []
+    else:
+        shingles = {b' '.join(tokens[i:i + SHINGLE_WORDS]) for i in range(len(tokens) - SHINGLE_WORDS + 1)}
+    if not shingles:
+        return 0, 0
+
+    total = sum(_spread(int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), 'little'))
+                for shingle in shingles)
+    # Bit i is set when more than half of the shingle hashes have it set.
+    half = len(shingles) / 2
+    fingerprint = 0
+    for i in range(BITS):
+        if (total >> (_FIELD * i)) & _FIELD_MASK > half:
+            fingerprint |= 1 << i
+    return fingerprint, len(shingles)
+
+
+def distance(a, b):
+    """The number of bits in which two fingerprints differ."""
+    return bin(a ^ b).count('1')
+
+
+class SimHashIndex:
+    """
+    Finds stored fingerprints within `max_distance` bits of a query.
+
+    The 64 bits are cut into max_distance + 1 bands. Two fingerprints that differ
+    in at most max_distance bits agree exactly on at least one band, so only the
+    entries sharing a band with the query have to be compared.
+
+    Args:
+        max_distance (int): The largest bit difference that counts as near.
+    """
+
+    def __init__(self, max_distance=10):
+        self.max_distance = max_distance
+        self._bands = max_distance + 1
+        self._width = BITS // self._bands
+        self._mask = (1 << self._width) - 1
+        self._buckets = {}
+
+    def _keys(self, fingerprint):
+        width, mask = self._width, self._mask
+        return [(band, (fingerprint >> (band * width)) & mask) for band in range(self._bands)]
+
+    def add(self, fingerprint, value):
+        """Stores a (hashable) value under a fingerprint."""
+        for key in self._keys(fingerprint):
+            self._buckets.setdefault(key, []).append((fingerprint, value))
+
+    def near(self, fingerprint):
+        """
+        Returns the values stored under fingerprints within max_distance bits, each value once.
+        """
+        found = []
+        seen = set()
+        for key in self._keys(fingerprint):
+            for candidate, value in self._buckets.get(key, ()):
+                if value not in seen and distance(candidate, fingerprint) <= self.max_distance:
+                    seen.add(value)
+                    found.append(value)
+        return found
@@ -0,0 +1,118 @@
+"""CalendarCache and EventInsertQueue: incremental sync, duplicate and conflict checks."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from integrations.calendar_service import (
+    CONFLICT, CREATED, DUPLICATE, FAILED, CalendarCache, EventInsertQueue,
+)
+from integrations.fake_transport import FakeCalendarHttp, build_fake_service
+from integrations.governor import governor
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(governor, 'sleep', lambda seconds: None)
+    governor.reset()
+    yield
+    governor.reset()
+
+
+@pytest.fixture
+def calendar():
+    return FakeCalendarHttp()
+
+
+@pytest.fixture
+def cache(calendar):
+    return CalendarCache(service=build_fake_service('calendar', 'v3', calendar))
+
+
+@pytest.fixture
+def queue(cache):
+    return EventInsertQueue(cache)
+
+
+@pytest.fixture
+def tomorrow(cache):
+    """10:00 tomorrow, naive, in the calendar's time zone."""
+    return (datetime.now(cache.tz) + timedelta(days=1)).replace(hour=10, minute=0, second=0,
+                                                                microsecond=0, tzinfo=None)
+
+
+def _event(cache, start, hours=1, **fields):
+    start = start.replace(tzinfo=cache.tz)
+    return dict({'summary': 'Busy', 'start': {'dateTime': start.isoformat()},
+                 'end': {'dateTime': (start + timedelta(hours=hours)).isoformat()}}, **fields)
+
+
+def test_sync_applies_changes_incrementally(calendar, cache, tomorrow):
+    calendar.put_event('primary', _event(cache, tomorrow, id='a'))
+    assert cache.refresh()
+    assert not cache.is_free(tomorrow, tomorrow + timedelta(minutes=30))
+
+    calendar.cancel_event('primary', 'a')
+    requests = calendar.request_count
+    cache.sync()
+    # One listing with the sync token, which reports the cancellation.
+    assert calendar.request_count - requests == 1
+    assert len(cache) == 0
+
+
+def test_expired_sync_token_falls_back_to_a_full_sync(calendar, cache, tomorrow):
+    cache.sync()
+    calendar.put_event('primary', _event(cache, tomorrow, id='a'))
+    calendar.expire_sync_tokens()
+    cache.sync()
+    assert len(cache) == 1
+
+
+def test_past_events_are_not_kept(calendar, cache, tomorrow):
+    calendar.put_event('primary', _event(cache, tomorrow - timedelta(days=5), id='old'))
+    calendar.put_event('primary', _event(cache, tomorrow, id='new'))
+    cache.sync()
+    assert len(cache) == 1
+
+
+def test_same_request_twice_is_created_once(calendar, queue, tomorrow):
+    end = tomorrow + timedelta(hours=1)
+    queue.queue('m1', 'Roadmap', 'From an email.', tomorrow, end, ['peer@example.com'])
+    queue.queue('m1-again', 'Roadmap', 'From an email.', tomorrow, end, ['Peer@example.com'])
+    results = queue.flush()
+    assert results['m1'].status == CREATED
+    assert results['m1-again'].status == DUPLICATE
+    assert len(calendar.inserted) == 1
+
+    # Also in a later cycle, once the event exists on the calendar.
+    queue.queue('m1-later', 'Roadmap', 'From an email.', tomorrow, end, ['peer@example.com'])
+    assert queue.flush()['m1-later'] == (DUPLICATE, results['m1'].link)
+
+
+def test_default_summaries_from_different_senders_are_not_duplicates(calendar, queue, tomorrow):
+    end = tomorrow + timedelta(hours=1)
+    queue.queue('m1', 'Meeting', 'From an email.', tomorrow, end, ['a@example.com'])
+    queue.queue('m2', 'Meeting', 'From an email.', tomorrow, end, ['b@example.com'])
+    results = queue.flush()
+    assert results['m1'].status == CREATED
+    # The second request wants the same slot: a conflict, not a duplicate of the first.
+    assert results['m2'].status == CONFLICT
+    assert len(calendar.inserted) == 1
+
+
+def test_conflicts_are_skipped_unless_allowed(calendar, cache, tomorrow):
+    calendar.put_event('primary', _event(cache, tomorrow, hours=2))
+    queue = EventInsertQueue(cache)
+    queue.queue('m1', 'Review', '', tomorrow + timedelta(minutes=30), tomorrow + timedelta(hours=1))
+    assert queue.flush()['m1'].status == CONFLICT
+
+    queue = EventInsertQueue(cache, allow_conflicts=True)
+    queue.queue('m1', 'Review', '', tomorrow + timedelta(minutes=30), tomorrow + timedelta(hours=1))
+    assert queue.flush()['m1'].status == CREATED
+
+
+def test_unreachable_calendar_fails_every_queued_event(calendar, queue, tomorrow):
+    calendar.inject_errors(403)
+    queue.queue('m1', 'Review', '', tomorrow, tomorrow + timedelta(hours=1))
+    assert queue.flush() == {'m1': (FAILED, None)}
+    assert calendar.inserted == []
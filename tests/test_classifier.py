@@ -0,0 +1,74 @@
+"""HashedNaiveBayes: training, the memory-mapped model file, and its use as the rules' fallback."""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from agent_core import decision_maker
+from nlp_utils.classifier import HashedNaiveBayes, accuracy, email_tokens
+
+INVOICES = [
+    {'sender': f"billing@vendor{i}.com", 'subject': 'Invoice attached',
+     'body': f"Please find invoice {i} attached, payment due in 30 days."}
+    for i in range(20)
+]
+NEWSLETTERS = [
+    {'sender': f"news@letters{i}.com", 'subject': 'Weekly digest',
+     'body': f"This week in tech, issue {i}: new gadgets and unsubscribe link."}
+    for i in range(20)
+]
+
+
+@pytest.fixture(scope='module')
+def model():
+    return HashedNaiveBayes.train(INVOICES + NEWSLETTERS, ['INVOICE'] * 20 + ['NEWSLETTER'] * 20,
+                                  n_features=2 ** 12)
+
+
+def test_tokens_keep_subject_body_and_domain_apart():
+    tokens = email_tokens({'sender': 'Ann <ann@Example.com>', 'subject': 'Hello there', 'body': "It's done."})
+    assert {b's:hello', b's:there', b"it's", b'done', b'd:example.com'} <= tokens
+    assert b'hello' not in tokens
+
+
+def test_trained_model_separates_the_classes(model):
+    assert model.classes == ['INVOICE', 'NEWSLETTER']
+    assert accuracy(model, INVOICES + NEWSLETTERS, ['INVOICE'] * 20 + ['NEWSLETTER'] * 20) == 1.0
+
+    prediction = model.predict({'sender': 'ap@newvendor.com', 'subject': 'Invoice',
+                                'body': 'Invoice 99 attached, payment due soon.'})
+    assert prediction.category == 'INVOICE'
+    assert prediction.confidence > 0.9
+    assert model.predict_many([]) == []
+
+
+def test_saved_model_loads_memory_mapped_with_the_same_scores(model, tmp_path):
+    path = str(tmp_path / 'model.bin')
+    model.save(path)
+    loaded = HashedNaiveBayes.load(path)
+
+    assert isinstance(loaded.weights, np.memmap)
+    assert loaded.classes == model.classes
+    np.testing.assert_allclose(loaded.scores(NEWSLETTERS[:3]), model.scores(NEWSLETTERS[:3]), rtol=1e-6)
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'not-a-model.bin'
+    path.write_bytes(b'hello world')
+    with pytest.raises(ValueError):
+        HashedNaiveBayes.load(str(path))
+
+
+def test_model_only_decides_what_no_rule_matched(model, tmp_path):
+    path = str(tmp_path / 'model.bin')
+    model.save(path)
+    decision_maker.load_model(path)
+    try:
+        undecided = {'sender': 'billing@vendor3.com', 'subject': 'Invoice attached',
+                     'body': 'Please find invoice 7 attached, payment due in 30 days.'}
+        spam = {'sender': 'x@example.com', 'subject': 'You are a winner', 'body': 'Invoice attached.'}
+        first, second = decision_maker.classify_many([undecided, spam])
+        assert first.category == 'INVOICE' and first.rule.startswith('model:')
+        assert second == ('SPAM', 'spam:winner')
+    finally:
+        decision_maker.load_model(None)
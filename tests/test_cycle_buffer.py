@@ -0,0 +1,80 @@
+"""CycleBuffer: emails stored column-wise in one arena, and read back record by record."""
+
+import pytest
+
+from agent_core import decision_maker
+from agent_core.cycle_buffer import CycleBuffer
+from integrations.email_message import EmailRecord
+from integrations.fake_transport import make_fake_message
+
+EMAILS = [
+    {'id': 'm1', 'threadId': 't1', 'sender': 'ann@example.com', 'recipient': 'me@example.com',
+     'subject': 'Café menu ☕', 'body': 'Grüße aus Köln', 'labelIds': ['INBOX', 'UNREAD']},
+    {'id': 'm2', 'sender': 'bob@example.com', 'subject': '', 'body': 'Lone surrogate \udcff kept',
+     'labelIds': ['INBOX', 'UNREAD']},
+    {'id': 'm3', 'threadId': 't3', 'sender': 'x@example.com', 'subject': 'You are a winner', 'body': 'Claim now.'},
+]
+
+
+@pytest.fixture
+def buffer():
+    return CycleBuffer(EMAILS)
+
+
+def test_records_read_back_with_the_stored_fields(buffer):
+    assert len(buffer) == 3
+    first = buffer[0]
+    assert isinstance(first, EmailRecord)
+    assert first['id'] == 'm1' and first['threadId'] == 't1'
+    assert first['subject'] == 'Café menu ☕'
+    assert first['body'] == 'Grüße aus Köln'
+    assert first['labelIds'] == ('INBOX', 'UNREAD')
+
+    second = buffer[1]
+    assert second['body'] == 'Lone surrogate \udcff kept'
+    # Missing optional fields come back as None, not as empty strings.
+    assert second['threadId'] is None and second['snippet'] is None
+    assert second['recipient'] == ''
+
+
+def test_emails_with_the_same_labels_share_one_tuple(buffer):
+    assert buffer[0]['labelIds'] is buffer[1]['labelIds']
+    assert buffer[2]['labelIds'] == ()
+
+
+def test_indexing_follows_sequence_rules(buffer):
+    assert buffer[-1]['id'] == 'm3'
+    with pytest.raises(IndexError):
+        buffer[3]
+    with pytest.raises(IndexError):
+        buffer[-4]
+    assert [email['id'] for email in buffer] == ['m1', 'm2', 'm3']
+
+
+def test_column_reads_one_field_without_records(buffer):
+    assert list(buffer.column('id')) == ['m1', 'm2', 'm3']
+    assert list(buffer.column('body'))[0] == 'Grüße aus Köln'
+    with pytest.raises(ValueError):
+        list(buffer.column('labelIds'))
+
+
+def test_gmail_records_are_stored_decoded():
+    record = EmailRecord(make_fake_message('g1', 'Cat <cat@example.com>', 'Report', 'Numbers attached.'))
+    buffer = CycleBuffer()
+    buffer.append(record)
+    stored = buffer[0]
+    assert stored['body'] == 'Numbers attached.'
+    assert stored['sender'] == record['sender']
+    assert stored['labelIds'] == ('INBOX', 'UNREAD')
+
+
+def test_nbytes_grows_with_the_arena():
+    empty = CycleBuffer()
+    assert len(empty) == 0 and list(empty) == []
+    before = empty.nbytes
+    empty.append(EMAILS[0])
+    assert empty.nbytes > before + len('Grüße aus Köln')
+
+
+def test_classify_many_reads_a_buffer_like_a_list(buffer):
+    assert decision_maker.classify_many(buffer) == decision_maker.classify_many(EMAILS)
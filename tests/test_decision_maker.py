@@ -0,0 +1,77 @@
+"""RuleEngine: the classification cascade, and sender matching through SenderIndex."""
+
+import pytest
+
+from agent_core.rule_engine import DEFAULT_CLASSIFICATION, KeywordMatcher, RuleEngine, SenderIndex
+
+
+@pytest.fixture
+def engine():
+    return RuleEngine(
+        important_senders=['boss@example.com', 'partner.org'],
+        important_keywords=['urgent', 'action required'],
+        meeting_keywords=['meeting', 'zoom link'],
+        spam_keywords=['winner', 'click here'],
+        blocked_senders=['@spam.test', 'pest@example.com'],
+    )
+
+
+def _email(sender='someone@example.com', subject='', body=''):
+    return {'sender': sender, 'subject': subject, 'body': body}
+
+
+def test_sender_index_matches_addresses_exactly():
+    index = SenderIndex(['Boss@Example.com'])
+    assert index.lookup('The Boss <boss@example.com>') == 'boss@example.com'
+    assert index.lookup('boss@example.com.evil.test') is None
+    assert index.lookup('other@example.com') is None
+
+
+def test_sender_index_matches_domains_and_subdomains():
+    index = SenderIndex(['example.com', '@partner.org', ''])
+    assert len(index) == 2
+    assert index.lookup('a@example.com') == 'example.com'
+    assert index.lookup('Ops <ops@mail.corp.example.com>') == 'example.com'
+    assert index.lookup('b@partner.org') == 'partner.org'
+    assert index.lookup('c@notexample.com') is None
+    assert index.lookup('') is None
+
+
+def test_keyword_matcher_gives_the_same_answer_with_and_without_the_regex():
+    keywords = ['alpha', 'alphabet', 'beta', 'gamma ray']
+    text = 'the gamma ray hit the alphabet'
+    small = KeywordMatcher(keywords)
+    compiled = KeywordMatcher(keywords, threshold=0)
+    assert small.search(text) == 'alpha'
+    assert compiled.search(text) in keywords
+    assert small.search('nothing here') is compiled.search('nothing here') is None
+
+
+def test_important_sender_comes_first(engine):
+    result = engine.classify(_email('Boss <boss@example.com>', 'You are a winner', 'click here'))
+    assert result == ('IMPORTANT', 'sender:boss@example.com')
+
+
+def test_blocked_sender_is_spam(engine):
+    assert engine.classify(_email('x@spam.test', 'urgent')) == ('SPAM', 'blocked:spam.test')
+    assert engine.classify(_email('pest@example.com')) == ('SPAM', 'blocked:pest@example.com')
+
+
+def test_keyword_rules_in_priority_order(engine):
+    assert engine.classify(_email(subject='URGENT: meeting')) == ('IMPORTANT', 'subject:urgent')
+    # Important keywords only count in the subject.
+    assert engine.classify(_email(body='urgent')) is DEFAULT_CLASSIFICATION
+    assert engine.classify(_email(body='Here is the Zoom link, winner')) == ('MEETING_REQUEST', 'meeting:zoom link')
+    assert engine.classify(_email(body='You are a WINNER')) == ('SPAM', 'spam:winner')
+    assert engine.classify(_email(subject='Notes', body='Nothing special')) is DEFAULT_CLASSIFICATION
+
+
+def test_classify_headers_leaves_body_rules_undecided(engine):
+    assert engine.classify_headers(_email('b@partner.org')) == ('IMPORTANT', 'sender:partner.org')
+    assert engine.classify_headers(_email(subject='Team meeting')) == ('MEETING_REQUEST', 'meeting:meeting')
+    assert engine.classify_headers(_email(body='you are a winner')) is None
+
+
+def test_classify_many_keeps_the_order(engine):
+    emails = [_email(body='click here'), _email(subject='urgent'), _email()]
+    assert [c.category for c in engine.classify_many(emails)] == ['SPAM', 'IMPORTANT', 'NORMAL']
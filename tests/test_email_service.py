@@ -0,0 +1,92 @@
+"""LabelChangeQueue: label changes merged per message and applied in batches."""
+
+import pytest
+
+from integrations import email_service
+from integrations.email_service import LabelChangeQueue
+from integrations.fake_transport import FakeGmailHttp, build_fake_service, make_fake_message
+from integrations.governor import governor
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(governor, 'sleep', lambda seconds: None)
+    governor.reset()
+    yield
+    governor.reset()
+
+
+@pytest.fixture
+def gmail():
+    return FakeGmailHttp([make_fake_message(f"m{i}", 'a@example.com', 'Hello', 'Hi.') for i in range(6)])
+
+
+@pytest.fixture
+def label_queue(gmail):
+    return LabelChangeQueue(service=build_fake_service('gmail', 'v1', gmail))
+
+
+def _labels(gmail, message_id):
+    return set(gmail.messages[message_id]['labelIds'])
+
+
+def test_same_changes_go_out_in_one_request(gmail, label_queue):
+    for message_id in ('m0', 'm1', 'm2'):
+        email_service.mark_as_read(message_id, label_queue)
+    email_service.move_to_spam('m3', label_queue)
+    assert len(label_queue) == 4
+
+    requests = gmail.request_count
+    results = label_queue.flush()
+    # One batchModify for the three read messages, one for the spam.
+    assert gmail.request_count - requests == 2
+    assert results == dict.fromkeys(['m0', 'm1', 'm2', 'm3'], True)
+    assert _labels(gmail, 'm0') == {'INBOX'}
+    assert _labels(gmail, 'm3') == {'INBOX', 'UNREAD', 'SPAM'}
+    assert len(label_queue) == 0
+    assert label_queue.flush() == {}
+
+
+def test_changes_queued_twice_are_merged(gmail, label_queue):
+    label_queue.queue('m0', labels_to_add=['STARRED'], labels_to_remove=['UNREAD'])
+    label_queue.queue('m0', labels_to_remove=['STARRED'])
+    assert len(label_queue) == 1
+    label_queue.flush()
+    assert _labels(gmail, 'm0') == {'INBOX'}
+
+
+def test_large_groups_are_split(monkeypatch, gmail, label_queue):
+    monkeypatch.setattr(email_service, 'MAX_BATCH_MODIFY_IDS', 4)
+    for i in range(6):
+        email_service.mark_as_read(f"m{i}", label_queue)
+    requests = gmail.request_count
+    assert all(label_queue.flush().values())
+    assert gmail.request_count - requests == 2
+
+
+def test_held_and_discarded_changes(gmail, label_queue):
+    for message_id in ('m0', 'm1', 'm2'):
+        email_service.mark_as_read(message_id, label_queue)
+    label_queue.discard(['m2'])
+
+    assert set(label_queue.flush(hold=['m1'])) == {'m0'}
+    assert 'UNREAD' in _labels(gmail, 'm1')
+    assert set(label_queue.flush()) == {'m1'}
+    assert 'UNREAD' not in _labels(gmail, 'm1')
+    assert 'UNREAD' in _labels(gmail, 'm2')
+
+
+def test_failed_request_is_reported_per_message(gmail, label_queue):
+    email_service.mark_as_read('m0', label_queue)
+    gmail.inject_errors(400)
+    assert label_queue.flush() == {'m0': False}
+    assert 'UNREAD' in _labels(gmail, 'm0')
+
+
+def test_unreachable_api_is_reported_per_message(monkeypatch, gmail, label_queue):
+    def refuse(*args, **kwargs):
+        raise ConnectionError('connection refused')
+
+    email_service.mark_as_read('m0', label_queue)
+    monkeypatch.setattr(gmail, 'request', refuse)
+    assert label_queue.flush() == {'m0': False}
@@ -0,0 +1,93 @@
+"""MailboxSync: history deltas, and retries of messages a cycle could not finish."""
+
+import pytest
+
+from agent_core.state_store import StateStore
+from integrations.email_sync import HISTORY_STATE_KEY, RETRY_STATE_KEY, MailboxSync
+from integrations.fake_transport import FakeGmailHttp, build_fake_service, make_fake_message
+
+
+@pytest.fixture
+def gmail():
+    return FakeGmailHttp()
+
+
+@pytest.fixture
+def sync(gmail, tmp_path):
+    return MailboxSync(StateStore(str(tmp_path / 'state.json')),
+                       service=build_fake_service('gmail', 'v1', gmail), retry_cycles=2)
+
+
+def _deliver(gmail, *message_ids):
+    for message_id in message_ids:
+        gmail.add_message(make_fake_message(message_id, 'a@example.com', 'Hello', 'Hi there.'))
+
+
+def _poll_ids(sync):
+    return [email['id'] for email in sync.poll()]
+
+
+def test_commit_advances_past_polled_messages(gmail, sync):
+    _deliver(gmail, 'm1', 'm2')
+    assert _poll_ids(sync) == ['m1', 'm2']
+    sync.commit()
+    assert sync.state_store.get(HISTORY_STATE_KEY) is not None
+
+    _deliver(gmail, 'm3')
+    assert _poll_ids(sync) == ['m3']
+
+
+def test_unfinished_messages_are_fetched_again_first(gmail, sync):
+    _deliver(gmail, 'm1', 'm2')
+    _poll_ids(sync)
+    sync.commit(unfinished=['m2'])
+
+    _deliver(gmail, 'm3')
+    assert _poll_ids(sync) == ['m2', 'm3']
+    assert sync.listed_ids == ['m2', 'm3']
+    sync.commit()
+    assert _poll_ids(sync) == []
+
+
+def test_unfinished_message_is_dropped_after_retry_cycles(gmail, sync):
+    _deliver(gmail, 'm1')
+    _poll_ids(sync)
+    sync.commit(unfinished=['m1'])
+    for _ in range(sync.retry_cycles):
+        assert _poll_ids(sync) == ['m1']
+        sync.commit(unfinished=['m1'])
+
+    assert sync.state_store.get(RETRY_STATE_KEY) == {}
+    assert _poll_ids(sync) == []
+
+
+def test_failed_poll_keeps_the_sync_position(gmail, sync):
+    _deliver(gmail, 'm1')
+    _poll_ids(sync)
+    sync.commit()
+    position = sync.state_store.get(HISTORY_STATE_KEY)
+
+    _deliver(gmail, 'm2')
+    gmail.inject_errors(400)
+    assert _poll_ids(sync) == []
+    sync.commit()
+    assert sync.state_store.get(HISTORY_STATE_KEY) == position
+    assert _poll_ids(sync) == ['m2']
+
+
+def test_retries_survive_a_poll_that_never_listed_them(monkeypatch, gmail, sync):
+    _deliver(gmail, 'm1')
+    _poll_ids(sync)
+    sync.commit(unfinished=['m1'])
+
+    # No Gmail service this cycle (e.g. the token could not be refreshed).
+    monkeypatch.setattr(sync, '_service', None)
+    monkeypatch.setattr('integrations.email_sync.get_google_api_service', lambda *args: None)
+    assert _poll_ids(sync) == []
+    sync.commit(unfinished=[])
+    assert sync.retry_ids == ['m1']
+
+    monkeypatch.undo()
+    assert _poll_ids(sync) == ['m1']
+    sync.commit()
+    assert sync.retry_ids == []
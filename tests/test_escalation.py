@@ -0,0 +1,97 @@
+"""EscalationQueue: one digest per thread or near-duplicate cluster, and held follow-ups."""
+
+import pytest
+
+from agent_core import escalation
+from agent_core.escalation import EscalationQueue
+from agent_core.state_store import StateStore
+
+BLAST = ("Our payment gateway is down for all customers in every region since this morning, "
+         "orders are failing and the support queue is growing quickly, please advise urgently.")
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+
+    def send_email(to, subject, body_text):
+        sent.append((to, subject, body_text))
+        return {'id': f"sent-{len(sent)}"}
+
+    monkeypatch.setattr(escalation, 'send_email', send_email)
+    return sent
+
+
+@pytest.fixture
+def state_store(tmp_path):
+    return StateStore(str(tmp_path / 'state.json'))
+
+
+def _email(message_id, thread_id, body, sender='a@example.com', subject='Urgent'):
+    return {'id': message_id, 'threadId': thread_id, 'sender': sender, 'subject': subject, 'body': body}
+
+
+def _queue_all(queue, *emails):
+    for email in emails:
+        queue.queue(email['id'], email)
+
+
+def test_unrelated_emails_are_escalated_alone(sent, state_store):
+    queue = EscalationQueue('boss@example.com', state_store, window_seconds=600)
+    _queue_all(queue, _email('m1', 't1', 'The server room is flooding.'),
+               _email('m2', 't2', 'The quarterly report is due tomorrow.'))
+    assert queue.flush(now=1000) == {'m1': True, 'm2': True}
+    assert len(sent) == 2
+    assert all(to == 'boss@example.com' for to, _, _ in sent)
+
+
+def test_same_thread_and_near_duplicates_become_one_digest(sent, state_store):
+    queue = EscalationQueue('boss@example.com', state_store, window_seconds=600)
+    _queue_all(queue,
+               _email('m1', 't1', 'First reply in the thread.'),
+               _email('m2', 't1', 'Second reply in the thread.'),
+               _email('m3', 't2', BLAST, sender='x@example.com'),
+               _email('m4', 't3', BLAST.replace('urgently', 'soon'), sender='y@example.com'))
+    assert queue.flush(now=1000) == dict.fromkeys(['m1', 'm2', 'm3', 'm4'], True)
+    assert len(sent) == 2
+    assert all('2 related emails' in subject for _, subject, _ in sent)
+
+
+def test_matches_within_the_window_are_held_then_sent_together(sent, state_store):
+    queue = EscalationQueue('boss@example.com', state_store, window_seconds=600)
+    _queue_all(queue, _email('m1', 't1', 'Thread start.'))
+    queue.flush(now=1000)
+
+    _queue_all(queue, _email('m2', 't1', 'A reply.'), _email('m3', 't1', 'Another reply.'))
+    assert queue.flush(now=1100) == {'m2': True, 'm3': True}
+    assert len(sent) == 1
+    assert queue.held == 2
+
+    # A restart keeps the held emails, which go out once the window has passed.
+    restarted = EscalationQueue('boss@example.com', state_store, window_seconds=600)
+    assert restarted.held == 2
+    assert restarted.flush(now=1700) == {}
+    assert len(sent) == 2
+    assert '2 more related emails' in sent[1][1]
+    assert restarted.held == 0
+
+
+def test_failed_send_is_reported_and_opens_no_window(monkeypatch, state_store):
+    monkeypatch.setattr(escalation, 'send_email', lambda **kwargs: None)
+    queue = EscalationQueue('boss@example.com', state_store, window_seconds=600)
+    _queue_all(queue, _email('m1', 't1', 'Thread start.'))
+    assert queue.flush(now=1000) == {'m1': False}
+    assert queue.held == 0
+
+
+def test_already_escalated_emails_are_skipped(sent, state_store, tmp_path):
+    from agent_core.ledger import ProcessedLedger
+
+    ledger = ProcessedLedger(str(tmp_path / 'ledger.sqlite3'))
+    ledger.record('m1', 'escalation')
+    queue = EscalationQueue('boss@example.com', state_store, ledger=ledger)
+    _queue_all(queue, _email('m1', 't1', 'Thread start.'))
+    assert len(queue) == 0
+    assert queue.flush(now=1000) == {}
+    assert sent == []
+    ledger.close()
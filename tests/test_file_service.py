@@ -0,0 +1,90 @@
+"""BulkUploader: chunked resumable uploads, dedup by checksum, and resuming interrupted sessions."""
+
+import hashlib
+
+import pytest
+
+from integrations.fake_transport import FakeDriveHttp, build_fake_service
+from integrations.file_service import CHUNK_ALIGNMENT, BulkUploader
+from integrations.governor import governor
+
+FOLDER = 'folder1'
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(governor, 'sleep', lambda seconds: None)
+    governor.reset()
+    yield
+    governor.reset()
+
+
+@pytest.fixture
+def drive():
+    return FakeDriveHttp()
+
+
+def _uploader(drive, tmp_path, **options):
+    return BulkUploader(FOLDER, chunksize=CHUNK_ALIGNMENT, sessions_file=str(tmp_path / 'sessions.json'),
+                        service=build_fake_service('drive', 'v3', drive), **options)
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_large_file_is_sent_in_chunks(drive, tmp_path):
+    data = bytes(range(256)) * 2500  # 640,000 bytes: three 256 KB chunks
+    path = _write(tmp_path, 'big.bin', data)
+    file_id = _uploader(drive, tmp_path).upload([path])[path]
+
+    assert drive.content[file_id] == data
+    assert drive.chunk_count == 3
+    assert drive.files[file_id]['parents'] == [FOLDER]
+
+
+def test_content_already_in_the_folder_is_not_uploaded(drive, tmp_path):
+    data = b'quarterly report'
+    drive.files['existing'] = {'id': 'existing', 'name': 'report.txt', 'parents': [FOLDER],
+                               'md5Checksum': hashlib.md5(data).hexdigest()}
+    path = _write(tmp_path, 'report-copy.txt', data)
+    assert _uploader(drive, tmp_path).upload([path]) == {path: 'existing'}
+    assert drive.chunk_count == 0
+
+
+def test_twins_in_one_run_are_uploaded_once(drive, tmp_path):
+    paths = [_write(tmp_path, f"copy{i}.txt", b'same content') for i in range(4)]
+    paths.append(_write(tmp_path, 'other.txt', b'other content'))
+    results = _uploader(drive, tmp_path, max_workers=4).upload(paths)
+
+    assert len(drive.content) == 2
+    assert len({results[path] for path in paths[:4]}) == 1
+    assert results[paths[4]] != results[paths[0]]
+
+
+def test_interrupted_upload_resumes_where_it_stopped(drive, tmp_path):
+    data = b'x' * (4 * CHUNK_ALIGNMENT)
+    path = _write(tmp_path, 'video.bin', data)
+    drive.interrupt_after_chunks = 2
+    assert _uploader(drive, tmp_path).upload([path]) == {path: None}
+    assert drive.bytes_received == 2 * CHUNK_ALIGNMENT
+
+    drive.interrupt_after_chunks = None
+    file_id = _uploader(drive, tmp_path).upload([path])[path]
+    assert drive.content[file_id] == data
+    # The confirmed bytes were not sent again.
+    assert drive.bytes_received == len(data)
+
+
+def test_expired_session_starts_over(drive, tmp_path):
+    data = b'y' * (3 * CHUNK_ALIGNMENT)
+    path = _write(tmp_path, 'archive.bin', data)
+    drive.interrupt_after_chunks = 1
+    _uploader(drive, tmp_path).upload([path])
+
+    drive.interrupt_after_chunks = None
+    drive.expire_sessions()
+    file_id = _uploader(drive, tmp_path).upload([path])[path]
+    assert drive.content[file_id] == data
@@ -0,0 +1,146 @@
+"""RequestGovernor: retries with backoff, and the per-API circuit breaker."""
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from integrations.governor import CircuitBreaker, CircuitOpenError, RequestGovernor, TransportError
+
+
+def _http_error(status, content=b'', retry_after=None):
+    headers = {'status': str(status)}
+    if retry_after is not None:
+        headers['retry-after'] = str(retry_after)
+    return HttpError(httplib2.Response(headers), content)
+
+
+class FlakyCall:
+    """Raises the given errors in turn, then returns 'ok'."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    def __call__(self):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+@pytest.fixture
+def governor():
+    governor = RequestGovernor(max_retries=3, breaker_threshold=2, breaker_reset=60.0)
+    governor.delays = []
+    governor.sleep = governor.delays.append
+    return governor
+
+
+def test_retryable_errors_are_retried_until_success(governor):
+    call = FlakyCall(_http_error(503), ConnectionError('reset'))
+    assert governor.call('gmail', call) == 'ok'
+    assert call.attempts == 3
+    assert len(governor.delays) == 2
+    assert governor.stats()['retries'] == 2
+    assert governor.breaker('gmail').state == CircuitBreaker.CLOSED
+
+
+def test_client_errors_are_not_retried(governor):
+    call = FlakyCall(_http_error(404))
+    with pytest.raises(HttpError):
+        governor.call('gmail', call)
+    assert call.attempts == 1
+    assert governor.delays == []
+    assert governor.stats()['failures'] == 1
+
+
+def test_exhausted_connection_failures_raise_transport_error(governor):
+    call = FlakyCall(*[ConnectionError('reset')] * 4)
+    with pytest.raises(TransportError) as raised:
+        governor.call('gmail', call)
+    assert call.attempts == 4
+    assert raised.value.api == 'gmail'
+    assert isinstance(raised.value.__cause__, ConnectionError)
+
+    # A non-idempotent call is not retried after a connection failure, but fails the same way.
+    call = FlakyCall(OSError('broken pipe'))
+    with pytest.raises(TransportError):
+        governor.call('gmail', call, idempotent=False)
+    assert call.attempts == 1
+
+
+def test_retry_after_is_respected(governor):
+    call = FlakyCall(_http_error(503, retry_after=7))
+    governor.call('gmail', call)
+    assert governor.delays == [7.0]
+
+
+def test_non_idempotent_calls_are_only_retried_when_rate_limited(governor):
+    call = FlakyCall(_http_error(503))
+    with pytest.raises(HttpError):
+        governor.call('gmail', call, idempotent=False)
+    assert call.attempts == 1
+
+    call = FlakyCall(_http_error(403, b'{"reason": "rateLimitExceeded"}'))
+    assert governor.call('gmail', call, idempotent=False) == 'ok'
+    assert call.attempts == 2
+
+
+def test_breaker_counts_a_retried_call_once(governor):
+    # Four failed attempts of one call, the last after its retries are exhausted.
+    call = FlakyCall(*[_http_error(503)] * 4)
+    with pytest.raises(HttpError):
+        governor.call('calendar', call)
+    assert call.attempts == 4
+    assert governor.breaker('calendar').state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_and_rejects_calls(governor):
+    for _ in range(2):
+        with pytest.raises(HttpError):
+            governor.call('drive', FlakyCall(*[_http_error(500)] * 4))
+    assert governor.breaker('drive').state == CircuitBreaker.OPEN
+
+    call = FlakyCall()
+    with pytest.raises(CircuitOpenError):
+        governor.call('drive', call)
+    assert call.attempts == 0
+    assert governor.stats()['rejected'] == 1
+    # Other APIs are not affected.
+    assert governor.call('gmail', FlakyCall()) == 'ok'
+
+
+def test_breaker_lets_one_trial_call_through_after_the_timeout(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('integrations.governor.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30.0)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call('gmail')
+
+    now[0] += 31
+    breaker.before_call('gmail')
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call('gmail')
+
+    # The trial failed: the circuit opens again.
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    now[0] += 31
+    breaker.before_call('gmail')
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_stops_when_the_circuit_opened_meanwhile(governor):
+    breaker = governor.breaker('gmail')
+
+    def fail_and_open():
+        # Other calls open the circuit while this one is backing off.
+        for _ in range(breaker.threshold):
+            breaker.record_failure()
+        raise _http_error(503)
+
+    with pytest.raises(CircuitOpenError):
+        governor.call('gmail', fail_and_open)
@@ -0,0 +1,153 @@
+"""PooledTransport and AuthorizedHttp: kept-alive connections, and credentials refreshed once under a lock."""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from integrations.auth_service import ServiceRegistry
+from integrations.http_transport import AuthorizedHttp, PooledTransport, refresh_credentials
+
+GOOD_TOKEN = 'good'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/private' and self.headers.get('Authorization') != f"Bearer {GOOD_TOKEN}":
+            self._reply(401, b'unauthorized')
+        else:
+            self._reply(200, b'hello')
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply(200, body)
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transport():
+    transport = PooledTransport(maxsize=4, timeout=5, http2=False)
+    yield transport
+    transport.close()
+
+
+class FakeCredentials:
+    """Credentials whose refresh is slow and counted, holding `token` until then."""
+
+    def __init__(self, token, valid=True):
+        self.token = token
+        self.valid = valid
+        self.refreshes = 0
+
+    def refresh(self, request):
+        time.sleep(0.05)
+        self.refreshes += 1
+        self.token = GOOD_TOKEN
+        self.valid = True
+
+    def before_request(self, request, method, url, headers):
+        headers['Authorization'] = f"Bearer {self.token}"
+
+
+def test_requests_reuse_one_kept_alive_connection(server, transport):
+    for _ in range(3):
+        response, content = transport.request(f"{server}/public")
+        assert response.status == 200 and content == b'hello'
+    response, content = transport.request(f"{server}/echo", 'PUT', body=b'data')
+    assert content == b'data'
+    assert transport.stats() == {'requests': 4, 'connections': 1}
+
+
+def test_unreachable_host_raises_connection_error(transport):
+    with pytest.raises(ConnectionError):
+        transport.request('http://127.0.0.1:9/')
+
+
+def test_rejected_token_is_refreshed_and_the_request_sent_again(server, transport):
+    credentials = FakeCredentials('stale')
+    response, content = AuthorizedHttp(credentials, transport).request(f"{server}/private")
+    assert response.status == 200 and content == b'hello'
+    assert credentials.refreshes == 1
+
+
+def _in_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_rejections_refresh_the_token_once(server, transport):
+    credentials = FakeCredentials('revoked')
+    statuses = []
+    _in_threads(8, lambda: statuses.append(
+        AuthorizedHttp(credentials, transport).request(f"{server}/private")[0].status))
+    assert statuses == [200] * 8
+    assert credentials.refreshes == 1
+
+
+def test_expired_credentials_are_refreshed_once(server, transport):
+    credentials = FakeCredentials('expired', valid=False)
+    http = AuthorizedHttp(credentials, transport)
+    _in_threads(8, lambda: http.request(f"{server}/private"))
+    assert credentials.refreshes == 1
+
+
+def test_refresh_is_skipped_when_another_thread_renewed_the_token():
+    credentials = FakeCredentials('stale')
+    assert refresh_credentials(credentials, None, lambda creds: creds.token == 'stale')
+    assert not refresh_credentials(credentials, None, lambda creds: creds.token == 'stale')
+    assert credentials.refreshes == 1
+
+
+def test_registry_shares_the_refresh_lock_with_the_transport(tmp_path):
+    from google.oauth2.credentials import Credentials
+
+    class SlowCredentials(Credentials):
+        refreshes = 0
+
+        def refresh(self, request):
+            time.sleep(0.2)
+            SlowCredentials.refreshes += 1
+            self.token = GOOD_TOKEN
+            self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=1)
+    credentials = SlowCredentials('old', refresh_token='refresh', expiry=expiry)
+    registry = ServiceRegistry(token_file=str(tmp_path / 'token.json'), http_transport='httplib2')
+    scopes = ('scope',)
+    registry._credentials[scopes] = credentials
+
+    # A request thread is renewing the token while the registry checks it.
+    renewing = threading.Thread(target=refresh_credentials, args=(credentials, None, lambda creds: True))
+    renewing.start()
+    time.sleep(0.05)
+    assert registry._get_credentials(scopes) is credentials
+    renewing.join()
+
+    assert SlowCredentials.refreshes == 1
+    assert registry.stats()['refreshes'] == 0
@@ -0,0 +1,105 @@
+"""KnowledgeIndex: similar past emails and replies from the FTS5 index, and their use in escalations."""
+
+import pytest
+
+from agent_core import escalation
+from agent_core.escalation import EscalationQueue
+from agent_core.knowledge_index import MESSAGE, REPLY, KnowledgeIndex
+
+PAST = [
+    {'id': 'p1', 'threadId': 't1', 'sender': 'ann@example.com', 'subject': 'VPN certificate expired',
+     'body': 'My VPN certificate expired and the client refuses to connect from home.'},
+    {'id': 'p2', 'threadId': 't2', 'sender': 'bob@example.com', 'subject': 'Lunch order',
+     'body': 'Who wants pizza for the team lunch on Friday?'},
+    {'id': 'p3', 'threadId': 't3', 'sender': 'cat@example.com', 'subject': 'Printer jam',
+     'body': 'The third floor printer is jammed again.'},
+]
+NEW = {'id': 'n1', 'threadId': 't9', 'sender': 'dan@example.com', 'subject': 'VPN will not connect',
+       'body': 'The VPN client says my certificate expired. I cannot connect.'}
+
+
+class LazyEmail(dict):
+    """A dict whose body has not been decoded yet, like an unread EmailRecord."""
+
+    body_loaded = False
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KnowledgeIndex(str(tmp_path / 'knowledge.sqlite3'))
+    if not index.enabled:
+        pytest.skip('this SQLite build has no FTS5')
+    index.add_many(PAST, categories=['NORMAL'] * len(PAST))
+    index.add_reply('r1', 't1', 'Renew it from the self-service portal, then restart the client.',
+                    subject='Re: VPN certificate expired', sender='me@example.com')
+    yield index
+    index.close()
+
+
+def test_similar_finds_the_related_email(index):
+    matches = index.similar(NEW)
+    assert matches[0].message_id == 'p1'
+    assert matches[0].kind == MESSAGE
+    assert 'p2' not in [m.message_id for m in matches]
+    # Replies are only returned when asked for.
+    assert 'r1' in [m.message_id for m in index.similar(NEW, kind=None)]
+    assert [m.message_id for m in index.similar(NEW, kind=REPLY)] == ['r1']
+
+
+def test_an_email_never_matches_itself(index):
+    assert 'p1' not in [m.message_id for m in index.similar(PAST[0])]
+
+
+def test_find_reply_returns_the_answer_of_the_closest_other_thread(index):
+    reply = index.find_reply(NEW)
+    assert reply.message_id == 'r1'
+    assert reply.snippet.startswith('Renew it')
+    # Not the reply of the email's own thread.
+    assert index.find_reply(dict(NEW, threadId='t1')) is None
+
+
+def test_emails_are_indexed_once_and_survive_a_restart(index, tmp_path):
+    assert index.add_many(PAST) == 0
+    assert len(index) == 4
+    index.close()
+
+    reopened = KnowledgeIndex(str(tmp_path / 'knowledge.sqlite3'))
+    assert len(reopened) == 4
+    assert reopened.similar(NEW)[0].message_id == 'p1'
+    reopened.close()
+
+
+def test_undecoded_bodies_are_only_indexed_on_request(index):
+    lazy = LazyEmail(id='l1', threadId='t5', sender='eve@example.com', subject='Quarterly figures',
+                     body='Spreadsheet with revenue numbers attached.')
+    index.add_many([lazy])
+    assert index.similar({'subject': '', 'body': 'revenue spreadsheet'}) == []
+
+    index.add_many([LazyEmail(lazy, id='l2')], decode=True)
+    assert [m.message_id for m in index.similar({'subject': '', 'body': 'revenue spreadsheet'})] == ['l2']
+
+
+def test_compact_drops_expired_documents(tmp_path):
+    index = KnowledgeIndex(str(tmp_path / 'old.sqlite3'), retention_days=0)
+    if not index.enabled:
+        pytest.skip('this SQLite build has no FTS5')
+    index.add_many(PAST)
+    assert index.compact() == 3
+    assert len(index) == 0
+    assert index.similar(NEW) == []
+    index.close()
+
+
+def test_escalations_carry_similar_emails_and_the_earlier_reply(index, monkeypatch):
+    sent = []
+    monkeypatch.setattr(escalation, 'send_email',
+                        lambda to, subject, body_text: sent.append(body_text) or {'id': 'sent-1'})
+    queue = EscalationQueue('boss@example.com', knowledge=index)
+    queue.queue(NEW['id'], NEW)
+    assert queue.flush(now=1000) == {'n1': True}
+
+    body = sent[0]
+    assert '--- Similar earlier emails ---' in body
+    assert 'VPN certificate expired (from ann@example.com, NORMAL)' in body
+    assert '--- Reply given to a similar earlier email ---' in body
+    assert 'self-service portal' in body
@@ -0,0 +1,58 @@
+"""ProcessedLedger: recorded outcomes, and their replay from disk after a restart."""
+
+import pytest
+
+from agent_core.ledger import FAILED, ProcessedLedger
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'ledger' / 'ledger.sqlite3')
+
+
+def test_record_and_has(path):
+    ledger = ProcessedLedger(path)
+    ledger.record('m1', 'escalation')
+    ledger.record_many(['m1', 'm2'], 'handled')
+    ledger.record('m3', 'calendar_event', FAILED)
+
+    assert ledger.has('m1', 'escalation')
+    assert not ledger.has('m2', 'escalation')
+    assert ledger.has('m2', 'handled')
+    assert not ledger.has('m3', 'calendar_event')
+    assert len(ledger) == 3
+    ledger.close()
+
+
+def test_entries_are_replayed_after_a_restart(path):
+    ledger = ProcessedLedger(path)
+    ledger.record_many(['m1', 'm2'], 'handled')
+    ledger.record('m3', 'handled', FAILED)
+    ledger.close()
+
+    reopened = ProcessedLedger(path)
+    assert reopened.has('m1', 'handled') and reopened.has('m2', 'handled')
+    assert not reopened.has('m3', 'handled')
+    assert len(reopened) == 2
+    reopened.close()
+
+
+def test_a_later_failure_replaces_a_success(path):
+    ledger = ProcessedLedger(path)
+    ledger.record('m1', 'handled')
+    ledger.record('m1', 'handled', FAILED)
+    assert not ledger.has('m1', 'handled')
+    ledger.close()
+
+    reopened = ProcessedLedger(path)
+    assert not reopened.has('m1', 'handled')
+    reopened.close()
+
+
+def test_compact_drops_expired_entries(path):
+    ledger = ProcessedLedger(path, retention_days=0)
+    ledger.record_many(['m1', 'm2'], 'handled')
+    assert ledger.compact() == 2
+    assert not ledger.has('m1', 'handled')
+    assert len(ledger) == 0
+    ledger.close()
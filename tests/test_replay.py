@@ -0,0 +1,98 @@
+"""End-to-end cycles of the agent over the offline replay environment."""
+
+import os
+
+import pytest
+
+from agent_core.main_agent import Agent
+from agent_core.replay import ReplayEnvironment, replay, synthetic_fixtures
+from integrations.governor import governor
+
+FIXTURES = [
+    {'cycle': 1, 'id': 'normal', 'from': 'friend@example.com', 'subject': 'Notes', 'body': 'Some notes.'},
+    {'cycle': 1, 'id': 'spam', 'from': 'promo@example.com', 'subject': 'You are a winner',
+     'body': 'Claim your prize, click here.'},
+    {'cycle': 1, 'id': 'urgent', 'from': 'client@example.com', 'subject': 'URGENT: outage',
+     'body': 'Everything is down.'},
+    {'cycle': 1, 'id': 'meeting', 'from': 'peer@example.com', 'subject': 'Meeting request',
+     'body': 'Can we have a meeting about the roadmap tomorrow at 10am for 30 minutes?'},
+]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Retries happen at once; the fake endpoints need no backoff."""
+    monkeypatch.setattr(governor, 'sleep', lambda seconds: None)
+    governor.reset()
+    yield
+    governor.reset()
+
+
+def _agent(state_dir):
+    return Agent(state_file=os.path.join(state_dir, 'state.json'),
+                 ledger_file=os.path.join(state_dir, 'ledger.sqlite3'),
+                 knowledge_file=os.path.join(state_dir, 'knowledge.sqlite3'))
+
+
+def _labels(environment, message_id):
+    return set(environment.gmail.messages[message_id]['labelIds'])
+
+
+def test_one_cycle_acts_on_every_message(tmp_path):
+    with ReplayEnvironment(FIXTURES) as environment:
+        environment.deliver(1)
+        agent = _agent(tmp_path)
+        try:
+            agent.run_cycle()
+            assert all(agent.ledger.has(message_id, 'handled') for message_id in environment.message_ids)
+        finally:
+            agent.close()
+
+    assert 'UNREAD' not in _labels(environment, 'normal')
+    assert 'SPAM' in _labels(environment, 'spam')
+    assert len(environment.gmail.sent) == 1
+    assert len(environment.calendar.inserted) == 1
+
+
+def test_failed_cycle_leaves_messages_unread_and_the_next_one_finishes_them(tmp_path):
+    with ReplayEnvironment(FIXTURES) as environment:
+        environment.deliver(1)
+        agent = _agent(tmp_path)
+        try:
+            # The calendar is down for the first cycle: the meeting request cannot be handled.
+            environment.calendar.set_error_rate(1.0, 503)
+            agent.run_cycle()
+            assert agent.ledger.has('urgent', 'handled')
+            assert not agent.ledger.has('meeting', 'handled')
+            assert 'UNREAD' in _labels(environment, 'meeting')
+            assert agent.mailbox_sync.retry_ids
+
+            environment.calendar.set_error_rate(0.0)
+            agent.run_cycle()
+            assert all(agent.ledger.has(message_id, 'handled') for message_id in environment.message_ids)
+        finally:
+            agent.close()
+
+    assert 'UNREAD' not in _labels(environment, 'meeting')
+    assert len(environment.calendar.inserted) == 1
+    assert len(environment.gmail.sent) == 1
+
+
+def test_clean_replay_handles_every_message(tmp_path):
+    report = replay(synthetic_fixtures(300, cycles=5), state_dir=str(tmp_path))
+
+    assert report.handled == report.messages == 300
+    assert report.cycles == 5
+    assert report.emails_sent == 7
+    assert report.events_created == 23
+
+
+def test_failed_messages_are_retried_in_later_cycles(tmp_path):
+    # With 30% of API calls failing, escalations, events and label changes fail
+    # in some cycles; the messages concerned are fetched again until they are done.
+    fixtures = synthetic_fixtures(300, cycles=5)
+    report = replay(fixtures, error_rate=0.3, seed=0, state_dir=str(tmp_path))
+
+    assert report.handled == report.messages == 300
+    assert report.events_created == 23
+    assert report.emails_sent == 7
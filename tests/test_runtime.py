@@ -0,0 +1,109 @@
+"""MailboxRuntime: the mailboxes file, and fair, failure-isolated cycles of many mailboxes."""
+
+import json
+import threading
+import time
+
+import pytest
+
+from agent_core.runtime import MailboxRuntime, load_mailboxes
+
+
+def _write_mailboxes(tmp_path, entries):
+    path = tmp_path / 'mailboxes.json'
+    path.write_text(json.dumps({'mailboxes': entries}))
+    return str(path)
+
+
+def test_load_mailboxes_fills_in_per_mailbox_defaults(tmp_path):
+    path = _write_mailboxes(tmp_path, [
+        {'name': 'support', 'supervisor': 'lead@example.com'},
+        {'name': 'sales', 'token_file': 'sales.json', 'state_dir': str(tmp_path / 'sales')},
+    ])
+    support, sales = load_mailboxes(path)
+    assert support.name == 'support' and support.supervisor == 'lead@example.com'
+    assert support.token_file.endswith('support.json')
+    assert support.state_dir.endswith('support')
+    assert sales.token_file == 'sales.json'
+    assert sales.state_dir == str(tmp_path / 'sales')
+
+
+@pytest.mark.parametrize('entries', [
+    [{'name': '../escape'}],
+    [{}],
+    [{'name': 'a'}, {'name': 'a'}],
+])
+def test_load_mailboxes_rejects_bad_names(tmp_path, entries):
+    with pytest.raises(ValueError):
+        load_mailboxes(_write_mailboxes(tmp_path, entries))
+
+
+class StubAgent:
+    """Stands in for an Agent: records its cycles, and can be made to fail."""
+
+    def __init__(self, name, log, fail=False):
+        self.name = name
+        self.log = log
+        self.fail = fail
+
+    def run_cycle(self):
+        self.log.append(self.name)
+        if self.fail:
+            raise RuntimeError('cycle failed')
+        return 0
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def runtime(tmp_path):
+    names = ['a', 'b', 'c']
+    mailboxes = load_mailboxes(_write_mailboxes(
+        tmp_path, [{'name': name, 'state_dir': str(tmp_path / name)} for name in names]))
+    runtime = MailboxRuntime(mailboxes, workers=2, action_workers=2)
+    for agent in runtime.agents.values():
+        agent.close()
+    runtime.log = []
+    runtime.agents = {name: StubAgent(name, runtime.log, fail=name == 'b') for name in names}
+    yield runtime
+    runtime.close()
+
+
+def _run_until(runtime, condition, timeout=5.0):
+    thread = threading.Thread(target=runtime.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        runtime.stop()
+        thread.join(timeout)
+    assert not thread.is_alive()
+
+
+def test_every_mailbox_runs_and_a_failed_cycle_does_not_stop_the_others(runtime):
+    _run_until(runtime, lambda: len(runtime.log) >= 3)
+    assert sorted(runtime.log) == ['a', 'b', 'c']
+    # The failed mailbox is scheduled again like the others.
+    now = time.monotonic()
+    assert all(due > now for due in runtime._due.values())
+    assert not runtime._running
+
+
+def test_batches_respect_the_worker_limit_and_take_the_longest_due_first(runtime):
+    runtime._due.update({'a': 3.0, 'b': 1.0, 'c': 2.0})
+    assert runtime._next_batch() == ['b', 'c']
+    runtime._run_one('c')
+    assert runtime._next_batch() == ['a']
+
+
+def test_wake_makes_a_mailbox_due_at_once(runtime):
+    _run_until(runtime, lambda: len(runtime.log) >= 3)
+    runtime._stopping = False
+    runtime.wake('new mail', mailbox='a')
+    assert runtime._due['a'] == 0.0
+    assert runtime.schedulers['a'].interval == runtime.schedulers['a'].min_interval
+    _run_until(runtime, lambda: len(runtime.log) >= 4)
+    assert runtime.log[3:] == ['a']
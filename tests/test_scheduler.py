@@ -0,0 +1,67 @@
+"""PollScheduler and WakeupListener: the adaptive poll interval and early wake-ups."""
+
+import threading
+import time
+
+import pytest
+
+from agent_core.scheduler import PollScheduler, WakeupListener, send_wakeup
+
+
+def test_interval_shrinks_with_mail_and_grows_when_idle():
+    scheduler = PollScheduler(min_interval=1, max_interval=60, initial_interval=16, backoff=2)
+    assert scheduler.record(5) == 8
+    assert [scheduler.record(3) for _ in range(4)] == [4, 2, 1, 1]
+    assert scheduler.record(0) == 2
+    assert [scheduler.record(0) for _ in range(6)][-1] == 60
+
+
+def test_initial_interval_defaults_to_the_longest():
+    assert PollScheduler(min_interval=1, max_interval=30).interval == 30
+    assert PollScheduler(min_interval=5, max_interval=30, initial_interval=1).interval == 5
+
+
+def test_wait_runs_out_without_a_wake_up():
+    scheduler = PollScheduler(min_interval=0.01, max_interval=0.05, initial_interval=0.01)
+    assert scheduler.wait() is None
+
+
+def test_wake_ends_the_wait_and_switches_to_the_short_interval():
+    scheduler = PollScheduler(min_interval=0.5, max_interval=60)
+    threading.Timer(0.05, scheduler.wake, args=('test',)).start()
+    started = time.monotonic()
+    assert scheduler.wait() == 'test'
+    assert time.monotonic() - started < 5
+    assert scheduler.interval == 0.5
+
+
+def test_wake_before_wait_is_not_lost():
+    scheduler = PollScheduler(min_interval=0.5, max_interval=60)
+    scheduler.wake('early')
+    assert scheduler.wait() == 'early'
+    # The wake-up is used up.
+    scheduler.interval = 0.01
+    assert scheduler.wait() is None
+
+
+@pytest.fixture
+def listener():
+    listener = WakeupListener(PollScheduler(min_interval=0.5, max_interval=60), port=0)
+    listener.start()
+    yield listener
+    listener.stop()
+
+
+def test_listener_wakes_the_scheduler(listener):
+    port = listener.address[1]
+    assert send_wakeup(port, message='new mail')
+    assert listener.scheduler.wait() == 'new mail'
+
+    assert send_wakeup(port, message={'emailAddress': 'me@example.com', 'historyId': 1234})
+    assert listener.scheduler.wait() == 'push notification (historyId 1234)'
+
+
+def test_send_wakeup_reports_an_unreachable_agent(listener):
+    port = listener.address[1]
+    listener.stop()
+    assert not send_wakeup(port, timeout=1.0)
@@ -0,0 +1,89 @@
+"""MeetingExtractor: dates, times, ranges and durations in free text."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from agent_core.text_parser import MeetingExtractor
+
+# A Wednesday.
+NOW = datetime(2026, 4, 15, 9, 30)
+
+
+@pytest.fixture
+def extractor():
+    return MeetingExtractor(clock=lambda: NOW, day_first=True)
+
+
+def test_relative_day_time_and_duration(extractor):
+    details = extractor.extract("Can we have a meeting about 'Budget review' tomorrow at 2pm for 30 minutes?")
+    assert details == {
+        'summary': 'Budget review',
+        'start_time': datetime(2026, 4, 16, 14, 0),
+        'end_time': datetime(2026, 4, 16, 14, 30),
+    }
+
+
+def test_weekday_and_range(extractor):
+    details = extractor.extract("Sync next Wednesday 2-3pm")
+    assert details['summary'] == 'Meeting'
+    assert details['start_time'] == datetime(2026, 4, 22, 14, 0)
+    assert details['end_time'] == datetime(2026, 4, 22, 15, 0)
+
+    details = extractor.extract("Call on friday, 11 to 1pm")
+    assert details['start_time'] == datetime(2026, 4, 17, 11, 0)
+    assert details['end_time'] == datetime(2026, 4, 17, 13, 0)
+
+
+def test_explicit_dates(extractor):
+    assert extractor.extract("2026-06-11 at 14:30")['start_time'] == datetime(2026, 6, 11, 14, 30)
+    assert extractor.extract("June 11th at noon")['start_time'] == datetime(2026, 6, 11, 12, 0)
+    assert extractor.extract("11 June 2027, 9am")['start_time'] == datetime(2027, 6, 11, 9, 0)
+    # A date that has passed this year means next year's.
+    assert extractor.extract("March 3rd at 10am")['start_time'] == datetime(2027, 3, 3, 10, 0)
+
+
+def test_numeric_dates_follow_day_first():
+    text = "11/06 at 10am"
+    assert MeetingExtractor(clock=lambda: NOW, day_first=True).extract(text)['start_time'] == datetime(2026, 6, 11, 10)
+    assert MeetingExtractor(clock=lambda: NOW, day_first=False).extract(text)['start_time'] == datetime(2026, 11, 6, 10)
+
+
+@pytest.mark.parametrize('text, start', [
+    ("Lunch on May 5 at 1pm", datetime(2026, 5, 5, 13, 0)),
+    ("Review, 5th of May at 1pm", datetime(2026, 5, 5, 13, 0)),
+    ("May 5th, 1pm", datetime(2026, 5, 5, 13, 0)),
+    ("May 5, 2026 at 1pm", datetime(2026, 5, 5, 13, 0)),
+    ("Meeting May 5 at 3pm", datetime(2026, 5, 5, 15, 0)),
+    ("Sync May 5 3pm", datetime(2026, 5, 5, 15, 0)),
+    ("Call May 5, 14:30", datetime(2026, 5, 5, 14, 30)),
+    ("May 5 meeting, 10am", datetime(2026, 5, 5, 10, 0)),
+    ("Planning Mar 3 @ 9am", datetime(2027, 3, 3, 9, 0)),
+])
+def test_ambiguous_month_names_with_context_are_dates(extractor, text, start):
+    assert extractor.extract(text)['start_time'] == start
+
+
+@pytest.mark.parametrize('text', [
+    "We may 5 people bring at 1pm",
+    "Scratches may mar 3 cars, see you at 5pm",
+    "It may 2 of us join at 4pm",
+])
+def test_ambiguous_month_names_as_words_are_not_dates(extractor, text):
+    assert extractor.extract(text) is None
+
+
+def test_end_time_past_midnight_moves_to_the_next_day(extractor):
+    details = extractor.extract("Release today 11pm-1am")
+    assert details['start_time'] == datetime(2026, 4, 15, 23, 0)
+    assert details['end_time'] == datetime(2026, 4, 16, 1, 0)
+
+
+def test_default_duration_and_missing_details():
+    extractor = MeetingExtractor(clock=lambda: NOW, default_duration=timedelta(minutes=45))
+    details = extractor.extract("today at 4pm")
+    assert details['end_time'] - details['start_time'] == timedelta(minutes=45)
+    # A bare "1-2" is not a time, and a date without a time is not enough.
+    assert extractor.extract("Score was 1-2 today") is None
+    assert extractor.extract("See you tomorrow") is None
+    assert extractor.extract_many(["today at 4pm", "nothing"])[1] is None
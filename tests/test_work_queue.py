@@ -0,0 +1,65 @@
+"""PriorityWorkQueue: most urgent first, with aging so waiting work is not starved."""
+
+import pytest
+
+from agent_core.work_queue import PriorityWorkQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_most_urgent_first_and_fifo_within_a_level(clock):
+    queue = PriorityWorkQueue(levels=3, aging_seconds=None, clock=clock)
+    for item, level in [('bulk1', 2), ('urgent1', 0), ('normal', 1), ('urgent2', 0), ('bulk2', 2)]:
+        queue.push(item, level)
+    assert len(queue) == 5
+    assert queue.pop_many(10) == ['urgent1', 'urgent2', 'normal', 'bulk1', 'bulk2']
+    assert len(queue) == 0
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_levels_are_clamped(clock):
+    queue = PriorityWorkQueue(levels=2, aging_seconds=None, clock=clock)
+    queue.push('low', 9)
+    queue.push('high', -3)
+    assert queue.pop_many(2) == ['high', 'low']
+
+
+def test_waiting_work_ages_past_newer_urgent_work(clock):
+    queue = PriorityWorkQueue(levels=4, aging_seconds=5.0, clock=clock)
+    queue.push('housekeeping', 3)
+
+    # Urgent mail keeps arriving; after 3 levels' worth of waiting (15s) plus one
+    # more second, the housekeeping item outranks a fresh urgent one.
+    clock.now = 16.0
+    queue.push('urgent', 0)
+    assert queue.pop() == 'housekeeping'
+    assert queue.pop() == 'urgent'
+
+
+def test_without_enough_waiting_urgent_work_still_goes_first(clock):
+    queue = PriorityWorkQueue(levels=4, aging_seconds=5.0, clock=clock)
+    queue.push('housekeeping', 3)
+    clock.now = 10.0
+    queue.push('urgent', 0)
+    assert queue.pop() == 'urgent'
+
+
+def test_equal_effective_levels_favour_the_longest_waiting(clock):
+    queue = PriorityWorkQueue(levels=2, aging_seconds=5.0, clock=clock)
+    queue.push('older', 1)
+    clock.now = 5.0
+    queue.push('newer', 0)
+    # Both are at effective level 0; the older item has waited longer.
+    assert queue.pop() == 'older'